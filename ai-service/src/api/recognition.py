@@ -2,7 +2,7 @@
 手语识别API路由
 """
 
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request
 from fastapi.responses import JSONResponse
 from typing import List, Dict, Any
 import cv2
@@ -11,14 +11,19 @@ from PIL import Image
 import io
 
 from src.services.recognition_service import RecognitionService
-from src.utils.exceptions import CustomException, InvalidInputException, ProcessingException
+from src.utils.exceptions import (
+    CustomException, InvalidInputException, ProcessingException, ModelNotLoadedException
+)
 
 router = APIRouter()
 
 # 依赖注入
-def get_recognition_service() -> RecognitionService:
-    """获取识别服务实例"""
-    return RecognitionService()
+def get_recognition_service(request: Request) -> RecognitionService:
+    """获取启动时创建的全局识别服务实例"""
+    model_manager = getattr(request.app.state, "model_manager", None)
+    if model_manager is None or not model_manager.is_ready():
+        raise ModelNotLoadedException("recognition_service")
+    return model_manager.get_recognition_service()
 
 @router.post("/detect-hands")
 async def detect_hands(
@@ -172,3 +177,21 @@ async def get_supported_signs(
         
     except Exception as e:
         raise ProcessingException(f"获取支持的手语列表失败: {str(e)}")
+
+@router.get("/pool-stats")
+async def get_pool_stats(
+    service: RecognitionService = Depends(get_recognition_service)
+):
+    """
+    获取手部检测实例池占用指标
+    
+    进程模式（INFERENCE_EXECUTOR_MODE=process）下工作进程自建MediaPipe实例，
+    主进程实例池保持空闲，返回中 main_pool_idle 为 true
+    
+    Returns:
+        实例池指标
+    """
+    return JSONResponse(content={
+        "success": True,
+        "data": service.get_pool_metrics()
+    })
@@ -0,0 +1,180 @@
+"""
+MediaPipe手部检测图实例池
+在服务启动时一次性创建固定数量的 Hands 图实例，供所有请求复用
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator, List
+import cv2
+import numpy as np
+import mediapipe as mp
+from loguru import logger
+
+# 进程池模式下，每个工作进程各自持有的 Hands 图实例
+_process_local_hands = None
+
+def parse_hand_results(results: Any) -> List[Dict[str, Any]]:
+    """
+    将 MediaPipe 输出转换为可序列化的手部数据
+    
+    Args:
+        results: Hands.process 的返回值
+        
+    Returns:
+        手部数据列表
+    """
+    hands_data = []
+    if results.multi_hand_landmarks:
+        for idx, hand_landmarks in enumerate(results.multi_hand_landmarks):
+            # 获取手部信息
+            hand_info = {
+                "hand_id": idx,
+                "handedness": results.multi_handedness[idx].classification[0].label,
+                "confidence": results.multi_handedness[idx].classification[0].score,
+                "landmarks": []
+            }
+            
+            # 提取关键点坐标
+            for landmark in hand_landmarks.landmark:
+                hand_info["landmarks"].append({
+                    "x": landmark.x,
+                    "y": landmark.y,
+                    "z": landmark.z
+                })
+            
+            hands_data.append(hand_info)
+    return hands_data
+
+def detect_hands_in_process(image: np.ndarray, hands_kwargs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    在进程池工作进程中执行手部检测，图实例在进程内首次调用时创建并复用
+    
+    Args:
+        image: BGR 图像
+        hands_kwargs: 传递给 mp.solutions.hands.Hands 的参数
+        
+    Returns:
+        手部数据列表
+    """
+    global _process_local_hands
+    if _process_local_hands is None:
+        _process_local_hands = mp.solutions.hands.Hands(**hands_kwargs)
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return parse_hand_results(_process_local_hands.process(rgb_image))
+
+class HandDetectorPool:
+    """有界的 MediaPipe Hands 图实例池"""
+
+    def __init__(self, size: int = 2, acquire_timeout: float = 30.0, **hands_kwargs):
+        """
+        Args:
+            size: 池中图实例数量，即可同时执行的手部检测数
+            acquire_timeout: 获取实例的默认等待时间（秒）
+            hands_kwargs: 传递给 mp.solutions.hands.Hands 的参数
+        """
+        if size < 1:
+            raise ValueError("手部检测池大小必须大于0")
+
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.hands_kwargs = hands_kwargs
+        self._instances = []
+        self._available: "queue.Queue[Any]" = queue.Queue(maxsize=size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # 占用统计
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._total_acquisitions = 0
+        self._total_wait_time = 0.0
+        self._timeouts = 0
+
+    def initialize(self):
+        """预先创建所有图实例"""
+        logger.info(f"创建 {self.size} 个 MediaPipe Hands 图实例...")
+        for _ in range(self.size):
+            hands = mp.solutions.hands.Hands(**self.hands_kwargs)
+            self._instances.append(hands)
+            self._available.put(hands)
+        logger.info("✅ MediaPipe Hands 图实例池创建完成")
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """
+        借出一个图实例，使用完毕后自动归还
+
+        Args:
+            timeout: 等待空闲实例的最长时间（秒），默认使用 acquire_timeout
+
+        Raises:
+            TimeoutError: 等待超时
+        """
+        if self._closed:
+            raise RuntimeError("手部检测池已关闭")
+
+        wait_start = time.perf_counter()
+        try:
+            hands = self._available.get(
+                timeout=self.acquire_timeout if timeout is None else timeout
+            )
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise TimeoutError("等待手部检测实例超时")
+
+        with self._lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            self._total_acquisitions += 1
+            self._total_wait_time += time.perf_counter() - wait_start
+
+        try:
+            yield hands
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._available.put(hands)
+
+    def detect(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        借出图实例执行一次手部检测（阻塞调用，应在工作线程中执行）
+        
+        Args:
+            image: BGR 图像
+            
+        Returns:
+            手部数据列表
+        """
+        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        with self.acquire() as hands:
+            results = hands.process(rgb_image)
+        return parse_hand_results(results)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取池占用指标"""
+        with self._lock:
+            acquisitions = self._total_acquisitions
+            return {
+                "pool_size": self.size,
+                "in_use": self._in_use,
+                "available": self.size - self._in_use,
+                "occupancy": self._in_use / self.size,
+                "peak_in_use": self._peak_in_use,
+                "total_acquisitions": acquisitions,
+                "average_wait_ms": (self._total_wait_time / acquisitions * 1000) if acquisitions else 0.0,
+                "timeouts": self._timeouts
+            }
+
+    def close(self):
+        """关闭所有图实例"""
+        self._closed = True
+        for hands in self._instances:
+            try:
+                hands.close()
+            except Exception as e:
+                logger.warning(f"关闭 MediaPipe Hands 实例失败: {e}")
+        self._instances.clear()
@@ -0,0 +1,160 @@
+"""
+推理执行器
+所有CPU密集的模型调用都通过该执行器在线程池/进程池中执行，避免阻塞事件循环
+"""
+
+import os
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, Callable, Optional
+from loguru import logger
+
+from src.utils.exceptions import ServiceOverloadedException, InferenceTimeoutException
+
+class InferenceExecutor:
+    """带排队上限、超时和背压控制的推理执行器"""
+
+    def __init__(
+        self,
+        mode: str = "thread",
+        max_workers: int = 4,
+        max_queue_size: int = 16,
+        timeout: float = 30.0,
+        retry_after: int = 1
+    ):
+        """
+        Args:
+            mode: 执行模式，thread 或 process
+            max_workers: 工作线程/进程数
+            max_queue_size: 正在等待执行的任务上限，超过后直接拒绝
+            timeout: 单次调用的默认超时时间（秒）
+            retry_after: 拒绝请求时建议客户端重试的间隔（秒）
+        """
+        if mode not in ("thread", "process"):
+            raise ValueError(f"不支持的执行模式: {mode}")
+
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+
+        if mode == "process":
+            self._executor: Executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="inference"
+            )
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._failed = 0
+        self._total_run_time = 0.0
+
+    @classmethod
+    def from_env(cls) -> "InferenceExecutor":
+        """根据环境变量创建执行器"""
+        return cls(
+            mode=os.getenv("INFERENCE_EXECUTOR_MODE", "thread"),
+            max_workers=int(os.getenv("MAX_WORKERS", "4")),
+            max_queue_size=int(os.getenv("INFERENCE_QUEUE_SIZE", "16")),
+            timeout=float(os.getenv("REQUEST_TIMEOUT", "30")),
+            retry_after=int(os.getenv("INFERENCE_RETRY_AFTER", "1"))
+        )
+
+    @property
+    def capacity(self) -> int:
+        """可同时容纳的任务数（执行中 + 排队中）"""
+        return self.max_workers + self.max_queue_size
+
+    async def run(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None
+    ) -> Any:
+        """
+        在工作池中执行阻塞调用
+
+        Args:
+            func: 阻塞函数，进程模式下必须可被 pickle
+            args: 函数参数
+            timeout: 超时时间（秒），默认使用执行器配置
+
+        Returns:
+            函数返回值
+
+        Raises:
+            ServiceOverloadedException: 排队任务已满
+            InferenceTimeoutException: 执行超时
+        """
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._rejected += 1
+                raise ServiceOverloadedException(retry_after=self.retry_after)
+            self._pending += 1
+
+        submitted_at = time.perf_counter()
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._release(submitted_at, failed=True)
+            raise
+
+        # 以底层任务真正结束为准释放名额，超时返回的调用仍占用工作线程
+        future.add_done_callback(
+            lambda f: self._release(submitted_at, failed=f.cancelled() or f.exception() is not None)
+        )
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future),
+                timeout=self.timeout if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            future.cancel()
+            logger.warning(f"推理调用超时: {getattr(func, '__name__', func)}")
+            raise InferenceTimeoutException(self.timeout if timeout is None else timeout)
+
+    def _release(self, submitted_at: float, failed: bool = False):
+        """任务结束后释放排队名额"""
+        with self._lock:
+            self._pending -= 1
+            if failed:
+                self._failed += 1
+            else:
+                self._completed += 1
+                self._total_run_time += time.perf_counter() - submitted_at
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取执行器指标"""
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "max_workers": self.max_workers,
+                "max_queue_size": self.max_queue_size,
+                "pending": self._pending,
+                "queue_depth": max(0, self._pending - self.max_workers),
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "average_latency_ms": (self._total_run_time / self._completed * 1000) if self._completed else 0.0
+            }
+
+    def shutdown(self, wait: bool = True):
+        """
+        关闭工作池，取消排队中的任务
+        
+        Args:
+            wait: 是否等待正在执行的任务完成
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -12,6 +12,10 @@ import cv2
 import numpy as np
 from loguru import logger
 
+from src.services.hand_detector_pool import HandDetectorPool
+from src.services.inference_executor import InferenceExecutor
+from src.services.recognition_service import RecognitionService
+
 class ModelManager:
     """模型管理器类"""
     
@@ -19,12 +23,17 @@ class ModelManager:
         self.models: Dict[str, Any] = {}
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.is_ready_flag = False
+        self.recognition_service: Optional[RecognitionService] = None
+        self.inference_executor: Optional[InferenceExecutor] = None
         
     async def initialize_models(self):
         """初始化所有模型"""
         try:
             logger.info("开始初始化AI模型...")
             
+            # 创建推理执行器，所有CPU密集的模型调用都在其中执行
+            self.inference_executor = InferenceExecutor.from_env()
+            
             # 初始化MediaPipe手部检测模型
             await self._load_hand_detection_model()
             
@@ -34,6 +43,13 @@ class ModelManager:
             # 初始化手语生成模型
             await self._load_sign_generation_model()
             
+            # 创建全局共享的识别服务
+            self.recognition_service = RecognitionService(
+                hand_detector_pool=self.models['hand_detection'],
+                sign_recognition_model=self.models['sign_recognition'],
+                inference_executor=self.inference_executor
+            )
+            
             self.is_ready_flag = True
             logger.info("✅ 所有模型初始化完成")
             
@@ -46,13 +62,18 @@ class ModelManager:
         try:
             logger.info("加载MediaPipe手部检测模型...")
             
-            # 初始化MediaPipe手部检测
-            self.models['hand_detection'] = mp.solutions.hands.Hands(
-                static_image_mode=False,
+            # 初始化MediaPipe手部检测实例池
+            # 各请求的图像互不相关，使用静态图像模式避免跨请求的跟踪状态
+            pool = HandDetectorPool(
+                size=int(os.getenv("HAND_DETECTOR_POOL_SIZE", os.getenv("MAX_WORKERS", "4"))),
+                acquire_timeout=float(os.getenv("HAND_DETECTOR_POOL_TIMEOUT", "30")),
+                static_image_mode=True,
                 max_num_hands=2,
                 min_detection_confidence=0.7,
                 min_tracking_confidence=0.5
             )
+            pool.initialize()
+            self.models['hand_detection'] = pool
             
             # 初始化绘制工具
             self.models['hand_drawing'] = mp.solutions.drawing_utils
@@ -136,6 +157,12 @@ class ModelManager:
             raise ValueError(f"模型 {model_name} 未找到")
         return self.models[model_name]
     
+    def get_recognition_service(self) -> RecognitionService:
+        """获取全局共享的识别服务实例"""
+        if self.recognition_service is None:
+            raise ValueError("识别服务未初始化")
+        return self.recognition_service
+    
     def is_ready(self) -> bool:
         """检查模型是否准备就绪"""
         return self.is_ready_flag
@@ -145,6 +172,11 @@ class ModelManager:
         try:
             logger.info("清理模型资源...")
             
+            # 先关闭推理执行器并等待执行中的任务完成，避免任务使用已关闭的MediaPipe实例
+            if self.inference_executor is not None:
+                await asyncio.to_thread(self.inference_executor.shutdown, True)
+                self.inference_executor = None
+            
             # 清理MediaPipe模型
             if 'hand_detection' in self.models:
                 self.models['hand_detection'].close()
@@ -155,6 +187,7 @@ class ModelManager:
                     model.cpu()
             
             self.models.clear()
+            self.recognition_service = None
             self.is_ready_flag = False
             
             logger.info("✅ 模型资源清理完成")
@@ -164,10 +197,13 @@ class ModelManager:
     
     def get_model_info(self) -> Dict[str, Any]:
         """获取模型信息"""
+        pool = self.models.get('hand_detection')
         return {
             "device": str(self.device),
             "models_loaded": list(self.models.keys()),
             "is_ready": self.is_ready_flag,
+            "hand_detector_pool": pool.get_metrics() if pool is not None else None,
+            "inference_executor": self.inference_executor.get_metrics() if self.inference_executor else None,
             "cuda_available": torch.cuda.is_available(),
             "cuda_device_count": torch.cuda.device_count() if torch.cuda.is_available() else 0
         }
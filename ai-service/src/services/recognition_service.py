@@ -2,19 +2,32 @@
 手语识别服务
 """
 
-import cv2
 import numpy as np
-import mediapipe as mp
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 import asyncio
 from loguru import logger
 
+from src.services.hand_detector_pool import HandDetectorPool, detect_hands_in_process
+from src.services.inference_executor import InferenceExecutor
+
 class RecognitionService:
     """手语识别服务类"""
     
-    def __init__(self):
-        self.hand_detection = None
-        self.sign_recognition_model = None
+    def __init__(
+        self,
+        hand_detector_pool: Optional[HandDetectorPool] = None,
+        sign_recognition_model: Any = None,
+        inference_executor: Optional[InferenceExecutor] = None
+    ):
+        """
+        Args:
+            hand_detector_pool: 共享的手部检测图实例池，由 ModelManager 在启动时创建
+            sign_recognition_model: 手语识别模型
+            inference_executor: 执行模型调用的工作池，由 ModelManager 在启动时创建
+        """
+        self.hand_detector_pool = hand_detector_pool
+        self.inference_executor = inference_executor
+        self.sign_recognition_model = sign_recognition_model
         self.supported_signs = [
             "你好", "谢谢", "再见", "对不起", "没关系",
             "请", "不客气", "是的", "不是", "好的",
@@ -34,41 +47,26 @@ class RecognitionService:
             检测结果
         """
         try:
-            # 初始化MediaPipe手部检测（如果未初始化）
-            if self.hand_detection is None:
-                self.hand_detection = mp.solutions.hands.Hands(
+            # 未注入实例池时（例如脱离服务单独使用），创建单实例池
+            if self.hand_detector_pool is None:
+                self.hand_detector_pool = HandDetectorPool(
+                    size=1,
                     static_image_mode=True,
                     max_num_hands=2,
                     min_detection_confidence=0.7,
                     min_tracking_confidence=0.5
                 )
+                self.hand_detector_pool.initialize()
+            if self.inference_executor is None:
+                self.inference_executor = InferenceExecutor(max_workers=1)
             
-            # 转换颜色空间
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
-            # 检测手部
-            results = self.hand_detection.process(rgb_image)
-            
-            hands_data = []
-            if results.multi_hand_landmarks:
-                for idx, hand_landmarks in enumerate(results.multi_hand_landmarks):
-                    # 获取手部信息
-                    hand_info = {
-                        "hand_id": idx,
-                        "handedness": results.multi_handedness[idx].classification[0].label,
-                        "confidence": results.multi_handedness[idx].classification[0].score,
-                        "landmarks": []
-                    }
-                    
-                    # 提取关键点坐标
-                    for landmark in hand_landmarks.landmark:
-                        hand_info["landmarks"].append({
-                            "x": landmark.x,
-                            "y": landmark.y,
-                            "z": landmark.z
-                        })
-                    
-                    hands_data.append(hand_info)
+            # 在工作池中检测手部，避免阻塞事件循环
+            if self.inference_executor.mode == "process":
+                hands_data = await self.inference_executor.run(
+                    detect_hands_in_process, image, self.hand_detector_pool.hands_kwargs
+                )
+            else:
+                hands_data = await self.inference_executor.run(self.hand_detector_pool.detect, image)
             
             return {
                 "hands_detected": len(hands_data),
@@ -266,6 +264,26 @@ class RecognitionService:
         
         return analysis
     
+    def get_pool_metrics(self) -> Dict[str, Any]:
+        """
+        获取手部检测实例池占用及推理执行器指标
+        
+        Returns:
+            实例池及执行器指标
+        """
+        metrics = (
+            self.hand_detector_pool.get_metrics()
+            if self.hand_detector_pool is not None
+            else {"pool_size": 0, "in_use": 0, "available": 0}
+        )
+        if self.inference_executor is not None:
+            metrics["executor"] = self.inference_executor.get_metrics()
+            if self.inference_executor.mode == "process":
+                # 进程模式下各工作进程通过 detect_hands_in_process 自建MediaPipe实例，主进程实例池保持空闲
+                metrics["main_pool_idle"] = True
+                metrics["note"] = "进程模式下主进程实例池不参与检测，占用指标恒为空闲"
+        return metrics
+    
     async def get_supported_signs(self) -> List[str]:
         """
         获取支持的手语列表
@@ -16,11 +16,13 @@ class CustomException(Exception):
         self,
         message: str,
         status_code: int = 500,
-        details: Optional[Dict[str, Any]] = None
+        details: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None
     ):
         self.message = message
         self.status_code = status_code
         self.details = details or {}
+        self.headers = headers
         super().__init__(self.message)
 
 class ModelNotLoadedException(CustomException):
@@ -63,6 +65,27 @@ class ResourceNotFoundException(CustomException):
             details={"resource_type": resource_type, "resource_id": resource_id}
         )
 
+class ServiceOverloadedException(CustomException):
+    """服务过载异常"""
+    
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            message="服务繁忙，请稍后重试",
+            status_code=503,
+            details={"retry_after": retry_after},
+            headers={"Retry-After": str(retry_after)}
+        )
+
+class InferenceTimeoutException(CustomException):
+    """推理超时异常"""
+    
+    def __init__(self, timeout: float):
+        super().__init__(
+            message=f"推理超时（{timeout}秒）",
+            status_code=504,
+            details={"timeout": timeout}
+        )
+
 async def custom_exception_handler(request: Request, exc: CustomException) -> JSONResponse:
     """自定义异常处理器"""
     
@@ -82,7 +105,8 @@ async def custom_exception_handler(request: Request, exc: CustomException) -> JS
             "error": exc.message,
             "details": exc.details,
             "path": request.url.path
-        }
+        },
+        headers=exc.headers
     )
 
 async def http_exception_handler(request: Request, exc: HTTPException) -> JSONResponse:
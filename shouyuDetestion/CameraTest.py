@@ -1,6 +1,6 @@
 #coding:utf-8
 import cv2
-from ultralytics import YOLO
+from model_registry import get_model
 import Config
 
 
@@ -8,7 +8,7 @@ import Config
 path = Config.model_path
 
 # Load the YOLOv8 model
-model = YOLO(path)
+model = get_model(path)
 
 ID = 0
 while(ID<10):
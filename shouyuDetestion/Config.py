@@ -5,6 +5,13 @@ pro_name = 'shouyushibie'
 #数据集路径
 data_ymal_path = 'datasets/'+pro_name+'_DATASET/data.yaml'
 
+# 训练图片尺寸
+train_imgsz = 640
+# 训练数据集预处理缓存目录（按训练尺寸缩放后的图片缓存文件与清单）
+dataset_cache_dir = 'datasets/'+pro_name+'_DATASET/cache/'
+# 数据集预处理（标注检查、图片解码缩放）使用的进程数
+dataset_prepare_workers = 4
+
 # 项目保存路径
 project_path = "./runs/detect/"+pro_name+"_pro"
 
@@ -13,6 +20,11 @@ save_path = 'save_data/'+pro_name+'_result/'
 
 # 使用的模型路径
 model_path = 'models/shouyushibie_0921best.pt'
+# 推理后端 torch / onnx / openvino / onnx_int8（quantize_model.py 生成的INT8模型），onnx 与 openvino 适合只有CPU的环境，模型不存在时由 model_path 自动导出
+inference_backend = 'torch'
+# INT8量化: 校准使用的训练图片数、允许的验证集 mAP50-95 下降（超过时不发布量化模型）
+quant_calib_images = 200
+quant_max_map_drop = 0.01
 
 # 测试图片文件夹路径
 test_images_path = 'TestFiles/'+pro_name+'_test_images/'
@@ -26,6 +38,62 @@ test_video_path = 'TestFiles/'+pro_name+'_test_images/2.mp4'
 #测试label保存路径
 yolo_file_path = 'save_data/'+pro_name+'labels/'
 
+# WebSocket 实时检测服务地址；websocket_in_flask 为 True 时随 Flask 接口在同一进程中启动，共用一个模型
+websocket_host = 'localhost'
+websocket_port = 8765
+websocket_in_flask = False
+
+# 后端微批处理：单批最多图片数、收到第一张图片后最多等待的毫秒数
+batch_max_size = 8
+batch_max_wait_ms = 10
+
+# 模型预热：实际输入图片尺寸 (宽, 高) 列表（摄像头画面、上传图片）、批大小列表（单张与微批处理最大批）、
+# 每种组合的运行次数（第一次记为首次延迟，其余取中位数记为稳定延迟）
+warmup_image_sizes = [(640, 480), (1280, 720)]
+warmup_batch_sizes = [1, batch_max_size]
+warmup_runs = 3
+
+# 检测接口送入模型的图片最长边（请求可用 max_size / imgsz 参数覆盖，0 表示不限制）；
+# 原图远大于该尺寸时在解码阶段直接缩小，检测框坐标换算回原图尺寸
+detect_max_size = 1280
+
+# 检测接口返回缩略图时的最长边和JPEG质量
+thumbnail_max_size = 320
+thumbnail_jpeg_quality = 70
+
+# 视频抽帧检测: all 每帧检测, stride 每隔 video_sample_stride 帧检测,
+# adaptive 帧差超过 video_sample_threshold 或连续跳过 video_sample_max_skip 帧时检测
+video_sample_mode = 'all'
+video_sample_stride = 3
+video_sample_threshold = 0.08
+video_sample_max_skip = 15
+# 是否同时检测被跳过的帧，统计抽帧相对逐帧检测的准确率差异（用于评估，不会加速）
+video_sample_evaluate = False
+
+# 视频后台检测任务: 任务数据库及输入输出视频的保存目录、同时处理的视频数
+video_job_dir = 'save_data/video_jobs/'
+video_job_workers = 1
+
+# 界面检测结果表格: 最多保留的记录数、批量刷新间隔（毫秒）、完整历史的保存路径（None 不保存）及格式（csv/parquet）
+detect_log_capacity = 5000
+detect_log_flush_ms = 100
+detect_log_spill_path = None
+detect_log_spill_format = 'csv'
+
+# 界面图片文件夹检测: 单次推理的图片数、解码线程数、界面刷新间隔（毫秒）
+folder_batch_size = 8
+folder_decode_workers = 4
+folder_update_interval_ms = 100
+# 保存文件夹检测结果时写图片的线程数
+save_write_workers = 4
+
+# 界面导出检测结果视频: 编码格式（XVID/MJPG 输出avi，mp4v/avc1/H264 输出mp4）、是否尝试硬件编码、
+# 单次推理的帧数、进度刷新间隔（毫秒）
+export_codec = 'XVID'
+export_hw_accel = False
+export_batch_size = 8
+export_progress_interval_ms = 250
+
 names = {  0: 'time',
   1: 'you/your/this',
   2: 'morning',
@@ -1,22 +1,30 @@
 # -*- coding: utf-8 -*-
 import time
 from PyQt5.QtWidgets import QApplication , QMainWindow, QFileDialog, \
-    QMessageBox,QWidget,QHeaderView,QTableWidgetItem, QAbstractItemView
+    QMessageBox,QWidget,QHeaderView, QAbstractItemView, QTableView
 import sys
 import os
 from PIL import ImageFont
-from ultralytics import YOLO
 sys.path.append('UIProgram')
 from UIProgram.UiMain import Ui_MainWindow
 import sys
-from PyQt5.QtCore import QTimer, Qt, QThread, pyqtSignal,QCoreApplication
+from PyQt5.QtCore import QTimer, Qt, QThread, pyqtSignal
 import detect_tools as tools
 import cv2
 import Config
 from UIProgram.QssLoader import QSSLoader
 from UIProgram.precess_bar import ProgressBar
-import numpy as np
 from ultralytics.engine.results import Results
+from frame_sampler import FrameSampler
+from stream_workers import DetectionStream
+from detection_log import DetectionLogModel
+from folder_detector import FolderDetectThread, list_images
+from result_cache import DetectionResultCache
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from video_export import VideoExporter, export_save_path
+from model_registry import get_model
+from PyQt5.QtGui import QPixmap
 # import torch
 
 class MainWindow(QMainWindow):
@@ -43,7 +51,7 @@ class MainWindow(QMainWindow):
         self.ui.CapBtn.clicked.connect(self.camera_show)
         self.ui.CapBtn_1.clicked.connect(self.camera_show)
         self.ui.SaveBtn.clicked.connect(self.save_detect_video)
-        self.ui.ExitBtn.clicked.connect(QCoreApplication.quit)
+        self.ui.ExitBtn.clicked.connect(self.close)
         self.ui.FilesBtn.clicked.connect(self.detact_batch_imgs)
         self.ui.FilesBtn_1.clicked.connect(self.detact_batch_imgs)
         self.ui.zhixindudoubleSpinBox.valueChanged.connect(self.zhixinduSpinBoxchange)
@@ -75,39 +83,55 @@ class MainWindow(QMainWindow):
 
         self.is_camera_open = False
         self.cap = None
+        # 视频/摄像头检测流水线（采集、推理、绘制线程）
+        self.stream = None
+        # 图片文件夹检测线程
+        self.folder_thread = None
+        # 本次运行中的检测结果缓存，保存文件夹结果时复用
+        self.result_cache = DetectionResultCache()
 
         # self.device = 0 if torch.cuda.is_available() else 'cpu'
 
         # 加载检测模型
-        self.model = YOLO(Config.model_path, task='detect')
-        self.model(np.zeros((48, 48, 3)))  #预先加载推理模型
+        # 从注册表获取已预热的模型
+        self.model = get_model()
         self.fontC = ImageFont.truetype("Font/platech.ttf", 25, 0)
 
         # 用于绘制不同颜色矩形框
         self.colors = tools.Colors()
 
-        # 更新视频图像
-        self.timer_camera = QTimer()
-
         # 更新检测信息表格
         # self.timer_info = QTimer()
         # 保存视频
         self.timer_save_video = QTimer()
 
-        # 表格
-        self.ui.tableWidget.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
-        self.ui.tableWidget.verticalHeader().setDefaultSectionSize(40)
-        self.ui.tableWidget.setColumnWidth(0, 80)  # 设置列宽
-        self.ui.tableWidget.setColumnWidth(1, 200)
-        self.ui.tableWidget.setColumnWidth(2, 150)
-        self.ui.tableWidget.setColumnWidth(3, 90)
-        self.ui.tableWidget.setColumnWidth(4, 230)
-        # self.ui.tableWidget.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)  # 表格铺满
-        # self.ui.tableWidget.horizontalHeader().setSectionResizeMode(0, QHeaderView.Interactive)
-        # self.ui.tableWidget.setEditTriggers(QAbstractItemView.NoEditTriggers)  # 设置表格不可编辑
-        self.ui.tableWidget.setSelectionBehavior(QAbstractItemView.SelectRows)  # 设置表格整行选中
-        self.ui.tableWidget.verticalHeader().setVisible(False)  # 隐藏列标题
-        self.ui.tableWidget.setAlternatingRowColors(True)  # 表格背景交替
+        # 表格：用 QTableView + 模型替换界面中的 QTableWidget，只保留最近的记录
+        self.log_model = DetectionLogModel(Config.detect_log_capacity, Config.detect_log_spill_path,
+                                          Config.detect_log_spill_format)
+        self.tableView = QTableView(self.ui.groupBox_3)
+        self.tableView.setGeometry(self.ui.tableWidget.geometry())
+        self.tableView.setFont(self.ui.tableWidget.font())
+        self.tableView.setObjectName("tableView")
+        self.ui.tableWidget.hide()
+        self.ui.tableWidget.deleteLater()
+        self.tableView.setModel(self.log_model)
+        self.tableView.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.tableView.verticalHeader().setDefaultSectionSize(40)
+        self.tableView.setColumnWidth(0, 80)  # 设置列宽
+        self.tableView.setColumnWidth(1, 200)
+        self.tableView.setColumnWidth(2, 150)
+        self.tableView.setColumnWidth(3, 90)
+        self.tableView.setColumnWidth(4, 230)
+        # self.tableView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)  # 表格铺满
+        self.tableView.setSelectionBehavior(QAbstractItemView.SelectRows)  # 设置表格整行选中
+        self.tableView.verticalHeader().setVisible(False)  # 隐藏列标题
+        self.tableView.setAlternatingRowColors(True)  # 表格背景交替
+        self.tableView.show()
+
+        # 定时把新的检测记录批量插入表格
+        self.timer_log = QTimer()
+        self.timer_log.timeout.connect(self.flush_detection_log)
+        self.timer_log.start(Config.detect_log_flush_ms)
 
         # 设置主页背景图片border-image: url(:/icons/ui_imgs/icons/camera.png)
         # self.setStyleSheet("#MainWindow{background-image:url(:/bgs/ui_imgs/bg3.jpg)}")
@@ -128,6 +152,7 @@ class MainWindow(QMainWindow):
 
     # 打开图片
     def open_img(self):
+        self.stop_folder_detect()
         if self.cap:
             # 打开图片前关闭摄像头
             self.video_stop()
@@ -211,12 +236,12 @@ class MainWindow(QMainWindow):
             self.ui.label_ymax.setText('')
 
         # # 删除表格所有行
-        self.ui.tableWidget.setRowCount(0)
-        self.ui.tableWidget.clearContents()
+        self.log_model.clear()
         self.tabel_info_show(self.location_list, self.cls_list, self.conf_list,path=self.org_path)
 
     # 打开图片文件夹
     def detact_batch_imgs(self):
+        self.stop_folder_detect()
         if self.cap:
             # 打开图片前关闭摄像头
             self.video_stop()
@@ -229,74 +254,80 @@ class MainWindow(QMainWindow):
         if not  directory:
             return
         self.org_path = directory
-        img_suffix = ['jpg','png','jpeg','bmp']
-        for file_name in os.listdir(directory):
-            full_path = os.path.join(directory,file_name)
-            if os.path.isfile(full_path) and file_name.split('.')[-1].lower() in img_suffix:
-                # self.ui.comboBox.setDisabled(False)
-                img_path = full_path
-                self.org_img = tools.img_cvread(img_path)
-                # 目标检测
-                t1 = time.time()
-                self.results = self.model(img_path)[0]
-                t2 = time.time()
-                take_time_str = '{:.3f} s'.format(t2 - t1)
-                self.ui.time_lb.setText(take_time_str)
-
-                self.results = self.result_guolv(self.results, self.zhixindu)
-
-                location_list = self.results.boxes.xyxy.tolist()
-                self.location_list = [list(map(int, e)) for e in location_list]
-                cls_list = self.results.boxes.cls.tolist()
-                self.cls_list = [int(i) for i in cls_list]
-                self.conf_list = self.results.boxes.conf.tolist()
-                self.conf_list = ['%.2f %%' % (each * 100) for each in self.conf_list]
-
-                now_img = self.results.plot()
-
-                self.draw_img = now_img
-                # 获取缩放后的图片尺寸
-                self.img_width, self.img_height = self.get_resize_size(now_img)
-                resize_cvimg = cv2.resize(now_img, (self.img_width, self.img_height))
-                pix_img = tools.cvimg_to_qpiximg(resize_cvimg)
-                self.ui.label_show.setPixmap(pix_img)
-                self.ui.label_show.setAlignment(Qt.AlignCenter)
-                # 设置路径显示
-                #self.ui.PiclineEdit.setText(img_path)
-
-                # 目标数目
-                target_nums = len(self.cls_list)
-                self.ui.label_nums.setText(str(target_nums))
-
-                # 设置目标选择下拉框
-                choose_list = ['全部']
-                target_names = [Config.names[id] + '_' + str(index) for index, id in enumerate(self.cls_list)]
-                choose_list = choose_list + target_names
-
-                self.ui.comboBox.clear()
-                self.ui.comboBox.addItems(choose_list)
-
-                if target_nums >= 1:
-                    self.ui.label_conf.setText(str(self.conf_list[0]))
-                    #   默认显示第一个目标框坐标
-                    #   设置坐标位置值
-                    self.ui.label_xmin.setText(str(self.location_list[0][0]))
-                    self.ui.label_ymin.setText(str(self.location_list[0][1]))
-                    self.ui.label_xmax.setText(str(self.location_list[0][2]))
-                    self.ui.label_ymax.setText(str(self.location_list[0][3]))
-                else:
-                    self.ui.label_conf.setText('')
-                    self.ui.label_xmin.setText('')
-                    self.ui.label_ymin.setText('')
-                    self.ui.label_xmax.setText('')
-                    self.ui.label_ymax.setText('')
-
-                # # 删除表格所有行
-                # self.ui.tableWidget.setRowCount(0)
-                # self.ui.tableWidget.clearContents()
-                self.tabel_info_show(self.location_list, self.cls_list, self.conf_list, path=img_path)
-                self.ui.tableWidget.scrollToBottom()
-                QApplication.processEvents()  #刷新页面
+        # 解码、批量推理在后台线程中进行，界面按固定间隔批量更新
+        self.folder_thread = FolderDetectThread(directory, self.model, self.result_guolv, lambda: self.zhixindu,
+                                                (self.show_width, self.show_height),
+                                                batch_size=Config.folder_batch_size,
+                                                decode_workers=Config.folder_decode_workers,
+                                                update_interval_ms=Config.folder_update_interval_ms)
+        self.folder_thread.update_ui_signal.connect(self.update_batch_imgs)
+        self.folder_thread.finished.connect(self.folder_detect_finished)
+        self.folder_thread.start()
+
+    def update_batch_imgs(self, items, stats):
+        if self.sender() is not self.folder_thread:
+            # 已被停止的旧任务
+            return
+        for item in items:
+            self.tabel_info_show(item['location_list'], item['cls_list'], item['conf_list'], path=item['path'])
+            self.result_cache.put(item['path'], item['conf'], item['boxes'])
+
+        if items:
+            # 只显示本次汇总的最后一张图片
+            last = items[-1]
+            self.results = last['results']
+            self.location_list = last['location_list']
+            self.cls_list = last['cls_list']
+            self.conf_list = last['conf_list']
+            self.draw_img = last['draw_img']
+            self.img_width, self.img_height = last['img_width'], last['img_height']
+            self.ui.label_show.setPixmap(QPixmap.fromImage(last['qimg']))
+            self.ui.label_show.setAlignment(Qt.AlignCenter)
+
+            # 目标数目
+            target_nums = len(self.cls_list)
+            self.ui.label_nums.setText(str(target_nums))
+
+            # 设置目标选择下拉框
+            choose_list = ['全部']
+            target_names = [Config.names[id] + '_' + str(index) for index, id in enumerate(self.cls_list)]
+            choose_list = choose_list + target_names
+
+            self.ui.comboBox.clear()
+            self.ui.comboBox.addItems(choose_list)
+
+            if target_nums >= 1:
+                self.ui.label_conf.setText(str(self.conf_list[0]))
+                #   默认显示第一个目标框坐标
+                #   设置坐标位置值
+                self.ui.label_xmin.setText(str(self.location_list[0][0]))
+                self.ui.label_ymin.setText(str(self.location_list[0][1]))
+                self.ui.label_xmax.setText(str(self.location_list[0][2]))
+                self.ui.label_ymax.setText(str(self.location_list[0][3]))
+            else:
+                self.ui.label_conf.setText('')
+                self.ui.label_xmin.setText('')
+                self.ui.label_ymin.setText('')
+                self.ui.label_xmax.setText('')
+                self.ui.label_ymax.setText('')
+
+        # 显示处理速度
+        self.ui.time_lb.setText('{:.1f} 张/s'.format(stats['images_per_sec']))
+        if stats['finished']:
+            print('[INFO] 文件夹检测完成：{}张，用时{}s，{}张/s'.format(
+                stats['done'], stats['elapsed'], stats['images_per_sec']))
+
+    def folder_detect_finished(self):
+        # run() 返回后才释放线程对象，避免销毁仍在运行的 QThread
+        if self.sender() is self.folder_thread:
+            self.folder_thread = None
+
+    def stop_folder_detect(self):
+        # 停止文件夹检测线程，之后才能在GUI线程中使用模型
+        if self.folder_thread is not None:
+            self.folder_thread.stop()
+            self.folder_thread.wait()
+            self.folder_thread = None
 
     def draw_rect_and_tabel(self, results, img):
         now_img = img.copy()
@@ -307,11 +338,8 @@ class MainWindow(QMainWindow):
         self.conf_list = results.boxes.conf.tolist()
         self.conf_list = ['%.2f %%' % (each * 100) for each in self.conf_list]
 
-        for loacation, type_id, conf in zip(self.location_list, self.cls_list, self.conf_list):
-            type_id = int(type_id)
-            color = self.colors(int(type_id), True)
-            # cv2.rectangle(now_img, (int(x1), int(y1)), (int(x2), int(y2)), colors(int(type_id), True), 3)
-            now_img = tools.drawRectBox(now_img, loacation, Config.CH_names[type_id], self.fontC, color)
+        # 一次绘制所有检测框，类别名称使用缓存的字形
+        now_img = tools.drawRectBoxes(now_img, self.location_list, self.cls_list, self.fontC, self.colors)
 
         # 获取缩放后的图片尺寸
         self.img_width, self.img_height = self.get_resize_size(now_img)
@@ -339,8 +367,7 @@ class MainWindow(QMainWindow):
             self.ui.label_ymax.setText('')
 
         # 删除表格所有行
-        self.ui.tableWidget.setRowCount(0)
-        self.ui.tableWidget.clearContents()
+        self.log_model.clear()
         self.tabel_info_show(self.location_list, self.cls_list, self.conf_list, path=self.org_path)
         return now_img
 
@@ -380,74 +407,73 @@ class MainWindow(QMainWindow):
 
     def video_start(self):
         # 删除表格所有行
-        self.ui.tableWidget.setRowCount(0)
-        self.ui.tableWidget.clearContents()
+        self.log_model.clear()
 
         # 清空下拉框
         self.ui.comboBox.clear()
 
-        # 定时器开启，每隔一段时间，读取一帧
-        self.timer_camera.start(1)
-        self.timer_camera.timeout.connect(self.open_frame)
+        # 采集、推理、绘制在工作线程中进行，GUI线程只显示最新一帧
+        self.stream = DetectionStream(self.cap, self.model, self.result_guolv, lambda: self.zhixindu,
+                                      (self.show_width, self.show_height), drop_frames=self.is_camera_open)
+        self.stream.frame_ready.connect(self.open_frame)
+        self.stream.finished.connect(self.video_finished)
+        self.stream.start()
 
     def tabel_info_show(self, locations, clses, confs, path=None):
-        path = path
-        for location, cls, conf in zip(locations, clses, confs):
-            row_count = self.ui.tableWidget.rowCount()  # 返回当前行数(尾部)
-            self.ui.tableWidget.insertRow(row_count)  # 尾部插入一行
-            item_id = QTableWidgetItem(str(row_count+1))  # 序号
-            item_id.setTextAlignment(Qt.AlignHCenter | Qt.AlignVCenter)  # 设置文本居中
-            item_path = QTableWidgetItem(str(path))  # 路径
-            # item_path.setTextAlignment(Qt.AlignHCenter | Qt.AlignVCenter)
-
-            item_cls = QTableWidgetItem(str(Config.CH_names[cls]))
-            item_cls.setTextAlignment(Qt.AlignHCenter | Qt.AlignVCenter)  # 设置文本居中
-
-            item_conf = QTableWidgetItem(str(conf))
-            item_conf.setTextAlignment(Qt.AlignHCenter | Qt.AlignVCenter)  # 设置文本居中
-
-            item_location = QTableWidgetItem(str(location)) # 目标框位置
-            # item_location.setTextAlignment(Qt.AlignHCenter | Qt.AlignVCenter)  # 设置文本居中
-
-            self.ui.tableWidget.setItem(row_count, 0, item_id)
-            self.ui.tableWidget.setItem(row_count, 1, item_path)
-            self.ui.tableWidget.setItem(row_count, 2, item_cls)
-            self.ui.tableWidget.setItem(row_count, 3, item_conf)
-            self.ui.tableWidget.setItem(row_count, 4, item_location)
-        self.ui.tableWidget.scrollToBottom()
+        # 记录先暂存，由定时器批量插入表格
+        self.log_model.append(locations, clses, confs, path=path)
+
+    def flush_detection_log(self):
+        if self.log_model.flush():
+            self.tableView.scrollToBottom()
+
+    def stop_stream(self):
+        # 停止流水线线程，之后才能在GUI线程中使用模型
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream = None
 
     def video_stop(self):
+        self.stop_stream()
         self.cap.release()
-        self.timer_camera.stop()
         # self.timer_info.stop()
 
-    #打开摄像头
+    def video_finished(self):
+        # 视频播放结束，忽略已被替换的旧流水线发出的信号
+        if self.sender() is self.stream:
+            self.video_stop()
+
+    def closeEvent(self, event):
+        self.stop_stream()
+        self.stop_folder_detect()
+        self.log_model.flush()
+        self.log_model.close()
+        super(MainWindow, self).closeEvent(event)
+
+    #显示流水线输出的最新一帧
     def open_frame(self):
-        ret, now_img = self.cap.read()
-        if ret:
-            # 目标检测
-            t1 = time.time()
-            results = self.model(now_img)[0]
-            t2 = time.time()
-            take_time_str = '{:.3f} s'.format(t2 - t1)
+        latest = self.stream.take_latest() if self.stream is not None else None
+        if latest is not None:
+            qimg, info = latest
+            take_time_str = '{:.3f} s'.format(info['infer_time'])
             self.ui.time_lb.setText(take_time_str)
-            results = self.result_guolv(results, self.zhixindu)
 
-            location_list = results.boxes.xyxy.tolist()
-            self.location_list = [list(map(int, e)) for e in location_list]
-            cls_list = results.boxes.cls.tolist()
-            self.cls_list = [int(i) for i in cls_list]
-            self.conf_list = results.boxes.conf.tolist()
-            self.conf_list = ['%.2f %%' % (each * 100) for each in self.conf_list]
+            self.location_list = info['location_list']
+            self.cls_list = info['cls_list']
+            self.conf_list = info['conf_list']
 
-            now_img = results.plot()
-
-            # 获取缩放后的图片尺寸
-            self.img_width, self.img_height = self.get_resize_size(now_img)
-            resize_cvimg = cv2.resize(now_img, (self.img_width, self.img_height))
-            pix_img = tools.cvimg_to_qpiximg(resize_cvimg)
+            # 缩放与格式转换已在绘制线程完成，转换为QPixmap后归还显示缓冲区
+            self.img_width, self.img_height = info['img_width'], info['img_height']
+            t1 = time.time()
+            pix_img = QPixmap.fromImage(qimg)
+            self.stream.frame_displayed()
             self.ui.label_show.setPixmap(pix_img)
             self.ui.label_show.setAlignment(Qt.AlignCenter)
+            # 各阶段耗时（鼠标悬停在用时上查看）
+            timing = info['timing']
+            self.ui.time_lb.setToolTip('采集: {:.1f} ms\n推理: {:.1f} ms\n绘制: {:.1f} ms\n缩放转换: {:.1f} ms\n界面显示: {:.1f} ms'.format(
+                timing['capture'] * 1000, timing['infer'] * 1000, timing['plot'] * 1000,
+                timing['display'] * 1000, (time.time() - t1) * 1000))
 
             # 目标数目
             target_nums = len(self.cls_list)
@@ -480,19 +506,16 @@ class MainWindow(QMainWindow):
                 self.ui.label_ymax.setText('')
 
 
-            # 删除表格所有行
-            # self.ui.tableWidget.setRowCount(0)
-            # self.ui.tableWidget.clearContents()
             self.tabel_info_show(self.location_list, self.cls_list, self.conf_list, path=self.org_path)
 
-        else:
-            self.cap.release()
-            self.timer_camera.stop()
-
     def vedio_show(self):
+        self.stop_folder_detect()
         if self.is_camera_open:
             self.is_camera_open = False
             #self.ui.CaplineEdit.setText('摄像头未开启')
+        if self.cap:
+            # 打开新视频前停止正在进行的检测
+            self.video_stop()
 
         video_path = self.get_video_path()
         if not video_path:
@@ -505,6 +528,9 @@ class MainWindow(QMainWindow):
         self.is_camera_open = not self.is_camera_open
         if self.is_camera_open:
             #self.ui.CaplineEdit.setText('摄像头开启')
+            self.stop_folder_detect()
+            if self.cap:
+                self.video_stop()
             self.cap = cv2.VideoCapture(0)
             self.video_start()
             self.ui.comboBox.setDisabled(True)
@@ -512,23 +538,17 @@ class MainWindow(QMainWindow):
             #self.ui.CaplineEdit.setText('摄像头未开启')
             self.ui.label_show.setText('')
             if self.cap:
-                self.cap.release()
+                self.video_stop()
                 cv2.destroyAllWindows()
             self.ui.label_show.clear()
 
     def get_resize_size(self, img):
-        _img = img.copy()
-        img_height, img_width , depth= _img.shape
-        ratio = img_width / img_height
-        if ratio >= self.show_width / self.show_height:
-            self.img_width = self.show_width
-            self.img_height = int(self.img_width / ratio)
-        else:
-            self.img_height = self.show_height
-            self.img_width = int(self.img_height * ratio)
+        # 只需读取尺寸，不复制图像
+        self.img_width, self.img_height = tools.fit_size(img.shape, self.show_width, self.show_height)
         return self.img_width, self.img_height
 
     def save_detect_video(self):
+        self.stop_folder_detect()
         if self.cap is None and not self.org_path:
             QMessageBox.about(self, '提示', '当前没有可保存信息，请先打开图片或视频！')
             return
@@ -542,9 +562,12 @@ class MainWindow(QMainWindow):
             if res == QMessageBox.Yes:
                 self.video_stop()
                 com_text = self.ui.comboBox.currentText()
-                self.btn2Thread_object = btn2Thread(self.org_path, self.model, com_text)
-                self.btn2Thread_object.start()
+                self.btn2Thread_object = btn2Thread(self.org_path, self.model, com_text, self.zhixindu)
                 self.btn2Thread_object.update_ui_signal.connect(self.update_process_bar)
+                self.btn2Thread_object.failed_signal.connect(self.export_failed)
+                self.progress_bar = ProgressBar(self)
+                self.progress_bar.show()
+                self.btn2Thread_object.start()
             else:
                 return
         else:
@@ -557,27 +580,44 @@ class MainWindow(QMainWindow):
                 cv2.imwrite(save_img_path, self.draw_img)
                 QMessageBox.about(self, '提示', '图片保存成功!\n文件路径:{}'.format(save_img_path))
             else:
-                img_suffix = ['jpg', 'png', 'jpeg', 'bmp']
-                for file_name in os.listdir(self.org_path):
-                    full_path = os.path.join(self.org_path, file_name)
-                    if os.path.isfile(full_path) and file_name.split('.')[-1].lower() in img_suffix:
-                        name, end_name = file_name.split('.')
-                        save_name = name + '_detect_result.' + end_name
-                        save_img_path = os.path.join(Config.save_path, save_name)
-                        results = self.model(full_path)[0]
-
-                        results = self.result_guolv(results, self.zhixindu)
-                        now_img = results.plot()
-                        # 保存图片
-                        cv2.imwrite(save_img_path, now_img)
-
+                reused = self.save_folder_results()
+                print('[INFO] 保存文件夹检测结果，复用缓存{}张'.format(reused))
                 QMessageBox.about(self, '提示', '图片保存成功!\n文件路径:{}'.format(Config.save_path))
 
+    def save_folder_results(self):
+        # 已检测过的图片复用缓存的检测框，只对未命中的图片推理；读图、绘制、写文件在线程池中并行
+        reused = 0
+        futures = deque()
+        with ThreadPoolExecutor(max_workers=Config.save_write_workers) as pool:
+            for full_path in list_images(self.org_path):
+                name, end_name = os.path.splitext(os.path.basename(full_path))
+                save_name = name + '_detect_result' + end_name
+                save_img_path = os.path.join(Config.save_path, save_name)
+                boxes = self.result_cache.get(full_path, self.zhixindu)
+                if boxes is not None:
+                    reused += 1
+                    futures.append(pool.submit(self.save_cached_result, full_path, boxes, save_img_path))
+                else:
+                    results = self.model(full_path)[0]
+                    results = self.result_guolv(results, self.zhixindu)
+                    self.result_cache.put(full_path, self.zhixindu, results.boxes.data.cpu().numpy())
+                    # 保存图片
+                    futures.append(pool.submit(cv2.imwrite, save_img_path, results.plot()))
+                # 限制排队中的图片数量，避免占用过多内存
+                while len(futures) > Config.save_write_workers * 2:
+                    futures.popleft().result()
+            for future in futures:
+                future.result()
+        return reused
+
+    def save_cached_result(self, img_path, boxes, save_img_path):
+        img = tools.img_cvread(img_path)
+        results = Results(img, path=img_path, names=self.model.names, boxes=boxes)
+        cv2.imwrite(save_img_path, results.plot())
+
 
     def update_process_bar(self,cur_num, total):
-        if cur_num == 1:
-            self.progress_bar = ProgressBar(self)
-            self.progress_bar.show()
+        # 进度信号已在导出线程中节流，无需强制刷新界面
         if cur_num >= total:
             self.progress_bar.close()
             QMessageBox.about(self, '提示', '视频保存成功!\n文件在{}目录下'.format(Config.save_path))
@@ -588,7 +628,11 @@ class MainWindow(QMainWindow):
             return
         value = int(cur_num / total *100)
         self.progress_bar.setValue(cur_num, total, value)
-        QApplication.processEvents()
+
+    def export_failed(self, message):
+        # 导出线程出错时关闭进度条并提示
+        self.progress_bar.close()
+        QMessageBox.about(self, '提示', '视频保存失败!\n{}'.format(message))
 
 
 class btn2Thread(QThread):
@@ -597,62 +641,49 @@ class btn2Thread(QThread):
     """
     # 声明一个信号
     update_ui_signal = pyqtSignal(int,int)
+    # 导出失败信号，参数为错误信息
+    failed_signal = pyqtSignal(str)
 
-    def __init__(self, path, model, com_text):
+    def __init__(self, path, model, com_text, zhixindu=0.5):
         super(btn2Thread, self).__init__()
         self.org_path = path
         self.model = model
         self.com_text = com_text
+        self.zhixindu = zhixindu
         # 用于绘制不同颜色矩形框
         self.colors = tools.Colors()
         self.is_running = True  # 标志位，表示线程是否正在运行
+        self.exporter = None
+        # 抽帧检测，未检测的帧沿用上一次的检测框
+        self.sampler = FrameSampler.from_config()
+
+    def result_guolv(self, result, zhixindu):
+        # 过滤低于置信度阈值的检测框
+        conf_mask = result.boxes.conf >= zhixindu
+        result.boxes = result.boxes[conf_mask]
+        return result
 
     def run(self):
-        # VideoCapture方法是cv2库提供的读取视频方法
-        cap = cv2.VideoCapture(self.org_path)
-        # 设置需要保存视频的格式“xvid”
-        # 该参数是MPEG-4编码类型，文件名后缀为.avi
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        # 设置视频帧频
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        # 设置视频大小
-        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
-        # VideoWriter方法是cv2库提供的保存视频方法
-        # 按照设置的格式来out输出
-        fileName = os.path.basename(self.org_path)
-        name, end_name = fileName.split('.')
-        save_name = name + '_detect_result.avi'
-        save_video_path = os.path.join(Config.save_path, save_name)
-        out = cv2.VideoWriter(save_video_path, fourcc, fps, size)
-
-        prop = cv2.CAP_PROP_FRAME_COUNT
-        total = int(cap.get(prop))
-        print("[INFO] 视频总帧数：{}".format(total))
-        cur_num = 0
-
-        # 确定视频打开并循环读取
-        while (cap.isOpened() and self.is_running):
-            cur_num += 1
-            print('当前第{}帧，总帧数{}'.format(cur_num, total))
-            # 逐帧读取，ret返回布尔值
-            # 参数ret为True 或者False,代表有没有读取到图片
-            # frame表示截取到一帧的图片
-            ret, frame = cap.read()
-            if ret == True:
-                # 检测
-                results = self.model(frame)[0]
-                results = self.result_guolv(results, self.zhixindu)
-                frame = results.plot()
-                out.write(frame)
-                self.update_ui_signal.emit(cur_num, total)
-            else:
-                break
-        # 释放资源
-        cap.release()
-        out.release()
+        # 读帧、批量推理、绘制写入流水线并行处理，进度按固定间隔发送
+        try:
+            save_video_path = export_save_path(self.org_path, Config.export_codec)
+            self.exporter = VideoExporter(self.model, self.org_path, save_video_path, self.result_guolv,
+                                          zhixindu=self.zhixindu, sampler=self.sampler, codec=Config.export_codec,
+                                          hw_accel=Config.export_hw_accel, batch_size=Config.export_batch_size,
+                                          progress_interval_ms=Config.export_progress_interval_ms)
+            if not self.is_running:
+                return
+            self.exporter.run(progress_callback=self.update_ui_signal.emit)
+            print("[INFO] 导出统计：{}".format(self.exporter.summary()))
+        except Exception as e:
+            # 线程中的异常不会传到界面，必须发出失败信号让进度条关闭
+            print("[ERROR] 视频导出失败：{}".format(e))
+            self.failed_signal.emit(str(e))
 
     def stop(self):
         self.is_running = False
+        if self.exporter is not None:
+            self.exporter.stop()
 
 
 if __name__ == "__main__":
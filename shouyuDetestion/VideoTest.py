@@ -1,6 +1,6 @@
 #coding:utf-8
 import cv2
-from ultralytics import YOLO
+from model_registry import get_model
 import Config
 # 所需加载的模型目录
 path = Config.model_path
@@ -8,7 +8,7 @@ path = Config.model_path
 video_path = Config.test_video_path
 
 # Load the YOLOv8 model
-model = YOLO(path)
+model = get_model(path)
 cap = cv2.VideoCapture(video_path)
 # Loop through the video frames
 while cap.isOpened():
@@ -4,20 +4,27 @@
 基于Flask框架，提供RESTful API接口
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
-import cv2
-import numpy as np
 import time
 import os
 import base64
+import json
+import uuid
 from PIL import Image
 import io
-from ultralytics import YOLO
 import sys
+import threading
 import os
 sys.path.append('..')
 import Config
+from batching import MicroBatcher
+from detection_utils import result_filter, process_detection_results, parse_return_image, encode_result_image, \
+    parse_max_size, decode_image
+from video_pipeline import VideoDetectionPipeline
+from video_jobs import VideoJobManager
+from frame_sampler import FrameSampler, SAMPLE_MODES
+from model_registry import get_model, registry
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
@@ -25,237 +32,440 @@ CORS(app)  # 允许跨域请求
 # 全局变量
 model = None
 colors = None
+batcher = None
+job_manager = None
+# 模型加载并预热完成后才开始处理检测请求
+model_ready = threading.Event()
+model_error = None
 
 def init_model():
     """初始化YOLO模型"""
-    global model, colors
+    global model, colors, batcher
     try:
-        # 修复模型路径，指向上级目录的模型文件
-        model_path = os.path.join('..', Config.model_path)
-        model = YOLO(model_path, task='detect')
-        # 预加载模型
-        model(np.zeros((48, 48, 3)))
+        # 从进程内共享的注册表获取（已预热），WebSocket服务在同一进程时共用该模型
+        model = get_model()
+        # 启动微批处理调度器，合并并发请求的推理
+        batcher = MicroBatcher(model, Config.batch_max_size, Config.batch_max_wait_ms)
+        batcher.start()
         print("模型加载成功")
         return True
     except Exception as e:
         print(f"模型加载失败: {e}")
         return False
 
+def load_model_in_background(on_ready=None):
+    """
+    在后台线程中加载并预热模型，服务先启动，/api/health 在预热完成前返回未就绪
+    :param on_ready: 模型就绪后在该线程中执行的回调
+    """
+    def run():
+        global model_error
+        if not init_model():
+            model_error = '模型初始化失败，请检查模型文件路径'
+            print(model_error)
+            return
+        if on_ready is not None:
+            try:
+                on_ready()
+            except Exception as e:
+                # 失败时保持未就绪，/api/health 返回 error 而不是一直预热中
+                model_error = f'后台任务启动失败: {e}'
+                print(model_error)
+                return
+        model_ready.set()
+
+    threading.Thread(target=run, name='model-loader', daemon=True).start()
+
+def init_job_manager():
+    """初始化视频后台任务管理器，重新排队上次未完成的任务"""
+    global job_manager
+    job_dir = os.path.join('..', Config.video_job_dir)
+    job_manager = VideoJobManager(batcher.infer_batch, job_dir, Config.video_job_workers, Config.batch_max_size)
+
+def start_websocket_server():
+    """在后台线程中运行WebSocket实时检测服务，与HTTP接口共用同一个模型"""
+    import asyncio
+    from websocket_handler import websocket_server
+    thread = threading.Thread(target=lambda: asyncio.run(websocket_server()), name='websocket-server', daemon=True)
+    thread.start()
+
 def init_colors():
     """初始化颜色类"""
     global colors
     from detect_tools import Colors
     colors = Colors()
 
-def result_filter(result, confidence_threshold):
-    """过滤检测结果"""
-    conf_threshold = confidence_threshold
-    boxes = result.boxes
-    conf_mask = boxes.conf >= conf_threshold
-    filtered_boxes = boxes[conf_mask]
-    result.boxes = filtered_boxes
-    return result
+# 模型未就绪时也可访问的接口
+NOT_READY_ALLOWED = ('/api/health', '/api/models/info')
 
-def process_detection_results(results, file_path=None):
-    """处理检测结果"""
-    detections = []
-    
-    if results.boxes is not None and len(results.boxes) > 0:
-        location_list = results.boxes.xyxy.tolist()
-        cls_list = results.boxes.cls.tolist()
-        conf_list = results.boxes.conf.tolist()
-        
-        for i, (location, cls, conf) in enumerate(zip(location_list, cls_list, conf_list)):
-            detection = {
-                'index': i,
-                'className': Config.CH_names[int(cls)],
-                'confidence': round(conf * 100, 2),
-                'coordinates': {
-                    'xmin': int(location[0]),
-                    'ymin': int(location[1]),
-                    'xmax': int(location[2]),
-                    'ymax': int(location[3])
-                },
-                'filePath': file_path
-            }
-            detections.append(detection)
-    
-    return detections
+@app.before_request
+def check_model_ready():
+    """模型预热完成前拒绝检测请求"""
+    if request.path.startswith('/api/') and request.path not in NOT_READY_ALLOWED and not model_ready.is_set():
+        return jsonify({'error': model_error or '模型加载预热中，请稍后重试'}), 503
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """健康检查接口"""
+    """健康检查接口，模型加载并预热完成后才返回就绪"""
+    ready = model_ready.is_set()
+    if ready:
+        status, message = 'ok', '手语翻译系统运行正常'
+    elif model_error is not None:
+        status, message = 'error', model_error
+    else:
+        status, message = 'warming_up', '模型加载预热中'
     return jsonify({
-        'status': 'ok',
-        'message': '手语翻译系统运行正常',
-        'model_loaded': model is not None
-    })
+        'status': status,
+        'message': message,
+        'ready': ready,
+        'model_loaded': model is not None,
+        # 各输入尺寸与批大小的首次延迟、稳定延迟
+        'warmup': model.info['warmup'] if model is not None else None
+    }), 200 if ready else 503
+
+def parse_size_params(form):
+    """
+    解析推理尺寸参数
+    max_size / imgsz: 送入模型的图片最长边，默认 Config.detect_max_size，0 表示不限制
+    orig_width / orig_height: 客户端上传前已缩小图片时的原图尺寸，检测框坐标按原图返回
+    :return: (max_size, orig_size)
+    """
+    max_size = parse_max_size(form.get('max_size', form.get('imgsz')), Config.detect_max_size)
+    orig_width = form.get('orig_width', type=int)
+    orig_height = form.get('orig_height', type=int)
+    if orig_width is None and orig_height is None:
+        return max_size, None
+    if not orig_width or not orig_height or orig_width < 0 or orig_height < 0:
+        raise ValueError('orig_width 与 orig_height 需同时指定为正整数')
+    return max_size, (orig_width, orig_height)
 
 @app.route('/api/detect/image', methods=['POST'])
 def detect_image():
-    """图片检测接口"""
+    """
+    图片检测接口
+    return_image: false 只返回检测框坐标; thumbnail 返回缩略图; full（默认）返回标注图（尺寸为送入模型的图片尺寸）
+    max_size / imgsz、orig_width / orig_height 见 parse_size_params，检测框坐标始终对应原图
+    """
     try:
         if 'image' not in request.files:
             return jsonify({'error': '没有上传图片文件'}), 400
         
         file = request.files['image']
         confidence = float(request.form.get('confidence', 0.5))
+        try:
+            return_image = parse_return_image(request.form.get('return_image'))
+            max_size, orig_size = parse_size_params(request.form)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # 读取图片
-        image_bytes = file.read()
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # 读取图片，大图在解码时直接缩小到推理尺寸
+        image, scale = decode_image(file.read(), max_size, orig_size)
         
         if image is None:
             return jsonify({'error': '无法读取图片'}), 400
         
-        # 执行检测
+        # 执行检测（与其他并发请求合并为一批）
         start_time = time.time()
-        results = model(image)[0]
+        results, _ = batcher.infer(image)
         inference_time = time.time() - start_time
         
         # 过滤结果
         results = result_filter(results, confidence)
         
         # 处理检测结果
-        detections = process_detection_results(results, file.filename)
-        
-        # 生成带检测框的图片
-        result_image = results.plot()
+        detections = process_detection_results(results, file.filename, scale)
         
-        # 将结果图片转换为base64
-        _, buffer = cv2.imencode('.jpg', result_image)
-        image_base64 = base64.b64encode(buffer).decode('utf-8')
+        # 按需生成带检测框的图片并转换为base64
+        image_bytes = encode_result_image(results, return_image)
+        image_base64 = base64.b64encode(image_bytes).decode('utf-8') if image_bytes is not None else None
         
+        height, width = image.shape[:2]
         return jsonify({
             'success': True,
             'detections': detections,
             'inference_time': round(inference_time, 3),
+            'image_size': {'width': round(width * scale[0]), 'height': round(height * scale[1])},
+            'infer_size': {'width': width, 'height': height},
             'image': image_base64,
-            'image_format': 'jpg'
+            'image_format': 'jpg' if image_base64 is not None else None
         })
         
     except Exception as e:
         return jsonify({'error': f'检测失败: {str(e)}'}), 500
 
+def create_sampler(form):
+    """
+    根据请求参数创建抽帧器，逐帧检测时返回 None
+    参数: sample_mode (all/stride/adaptive)、sample_stride、sample_threshold
+    """
+    mode = form.get('sample_mode', Config.video_sample_mode)
+    if mode not in SAMPLE_MODES:
+        raise ValueError(f'不支持的抽帧模式: {mode}')
+    if mode == 'all':
+        return None
+    return FrameSampler.from_config(mode,
+                                    form.get('sample_stride', type=int),
+                                    form.get('sample_threshold', type=float))
+
+def save_temp_video(file):
+    """保存上传的视频到临时文件（OpenCV 只能从文件解码）"""
+    temp_video_path = f"temp_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}.mp4"
+    file.save(temp_video_path)
+    return temp_video_path
+
 @app.route('/api/detect/video', methods=['POST'])
 def detect_video():
-    """视频检测接口"""
+    """
+    视频检测接口
+    return_image: false 不输出结果视频; thumbnail 输出缩小的结果视频; full（默认）输出原尺寸结果视频
+    """
     try:
         if 'video' not in request.files:
             return jsonify({'error': '没有上传视频文件'}), 400
         
         file = request.files['video']
         confidence = float(request.form.get('confidence', 0.5))
+        try:
+            sampler = create_sampler(request.form)
+            # false 时不绘制也不输出结果视频; thumbnail 输出缩小的结果视频
+            return_image = parse_return_image(request.form.get('return_image'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        evaluate = request.form.get('sample_evaluate', 'false').lower() == 'true'
         
         # 保存临时视频文件
-        temp_video_path = f"temp_{int(time.time())}.mp4"
-        file.save(temp_video_path)
-        
-        # 打开视频
-        cap = cv2.VideoCapture(temp_video_path)
-        if not cap.isOpened():
-            return jsonify({'error': '无法打开视频文件'}), 400
-        
-        # 获取视频信息
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        
-        # 设置输出视频
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        output_path = f"output_{int(time.time())}.mp4"
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-        
-        all_detections = []
-        frame_detections = []
-        
-        frame_idx = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # 检测当前帧
-            results = model(frame)[0]
-            results = result_filter(results, confidence)
-            
-            # 处理检测结果
-            detections = process_detection_results(results, f"{file.filename}_frame_{frame_idx}")
-            frame_detections.append({
-                'frame': frame_idx,
-                'detections': detections
-            })
-            all_detections.extend(detections)
+        temp_video_path = save_temp_video(file)
+        
+        try:
+            # 解码、推理、绘制、编码流水线并行处理
+            output_path = f"output_{int(time.time())}.mp4" if return_image != 'false' else None
+            pipeline = VideoDetectionPipeline(batcher.infer_batch, temp_video_path, output_path,
+                                              confidence=confidence, batch_size=Config.batch_max_size,
+                                              file_name=file.filename, sampler=sampler, evaluate=evaluate,
+                                              image_mode=return_image)
+            if not pipeline.open():
+                return jsonify({'error': '无法打开视频文件'}), 400
             
-            # 绘制检测框
-            result_frame = results.plot()
-            out.write(result_frame)
-            
-            frame_idx += 1
-        
-        # 释放资源
-        cap.release()
-        out.release()
-        
-        # 清理临时文件
-        os.remove(temp_video_path)
-        
+            all_detections = []
+            frame_detections = []
+            for event in pipeline.run():
+                frame_detections.append({
+                    'frame': event['frame'],
+                    'detections': event['detections']
+                })
+                all_detections.extend(event['detections'])
+        finally:
+            # 清理临时文件
+            os.remove(temp_video_path)
+        
+        summary = pipeline.summary()
         return jsonify({
             'success': True,
-            'total_frames': frame_idx,
-            'fps': fps,
-            'duration': frame_idx / fps,
+            'total_frames': summary['total_frames'],
+            'fps': summary['fps'],
+            'duration': summary['duration'],
             'detections': all_detections,
             'frame_detections': frame_detections,
-            'output_video': output_path
+            'output_video': output_path,
+            'sampling': summary.get('sampling')
         })
         
     except Exception as e:
         return jsonify({'error': f'视频检测失败: {str(e)}'}), 500
 
+@app.route('/api/detect/video/stream', methods=['POST'])
+def detect_video_stream():
+    """
+    视频流式检测接口
+    每处理完一帧就输出一条事件，format=ndjson（默认）逐行输出JSON，format=sse 输出Server-Sent Events
+    事件类型: start（视频信息）、frame（单帧检测结果）、end（统计信息）、error
+    return_image 参数同 /api/detect/video
+    """
+    if 'video' not in request.files:
+        return jsonify({'error': '没有上传视频文件'}), 400
+    
+    file = request.files['video']
+    confidence = float(request.form.get('confidence', 0.5))
+    stream_format = request.form.get('format', 'ndjson')
+    # save_output=false 与 return_image=false 等价
+    default_return_image = 'full' if request.form.get('save_output', 'true').lower() != 'false' else 'false'
+    try:
+        sampler = create_sampler(request.form)
+        return_image = parse_return_image(request.form.get('return_image'), default_return_image)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    evaluate = request.form.get('sample_evaluate', 'false').lower() == 'true'
+    
+    temp_video_path = save_temp_video(file)
+    output_path = f"output_{int(time.time())}.mp4" if return_image != 'false' else None
+    pipeline = VideoDetectionPipeline(batcher.infer_batch, temp_video_path, output_path,
+                                      confidence=confidence, batch_size=Config.batch_max_size,
+                                      file_name=file.filename, sampler=sampler, evaluate=evaluate,
+                                      image_mode=return_image)
+    if not pipeline.open():
+        os.remove(temp_video_path)
+        return jsonify({'error': '无法打开视频文件'}), 400
+    
+    def format_event(event):
+        data = json.dumps(event, ensure_ascii=False)
+        if stream_format == 'sse':
+            return f"event: {event['type']}\ndata: {data}\n\n"
+        return data + '\n'
+    
+    def generate():
+        events = pipeline.run()
+        try:
+            yield format_event({
+                'type': 'start',
+                'fps': pipeline.fps,
+                'total_frames': pipeline.frame_count,
+                'width': pipeline.width,
+                'height': pipeline.height
+            })
+            for event in events:
+                yield format_event(event)
+            end_event = {'type': 'end', 'output_video': output_path}
+            end_event.update(pipeline.summary())
+            yield format_event(end_event)
+        except Exception as e:
+            yield format_event({'type': 'error', 'error': f'视频检测失败: {str(e)}'})
+        finally:
+            # 客户端断开时流水线可能仍在运行：先停止并等待各阶段线程、释放视频文件，再删除临时文件
+            events.close()
+            pipeline.cap.release()
+            try:
+                os.remove(temp_video_path)
+            except OSError as e:
+                print(f"临时文件删除失败: {e}")
+    
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs/video', methods=['POST'])
+def submit_video_job():
+    """
+    提交视频后台检测任务，立即返回任务ID
+    参数同 /api/detect/video，通过 /api/jobs/<job_id> 查询进度
+    """
+    try:
+        if 'video' not in request.files:
+            return jsonify({'error': '没有上传视频文件'}), 400
+        
+        file = request.files['video']
+        try:
+            confidence = float(request.form.get('confidence', 0.5))
+            # 仅校验参数，抽帧器由任务执行时创建
+            create_sampler(request.form)
+            return_image = parse_return_image(request.form.get('return_image'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        params = {
+            'confidence': confidence,
+            'return_image': return_image,
+            'sample_mode': request.form.get('sample_mode', Config.video_sample_mode),
+            'sample_stride': request.form.get('sample_stride', type=int),
+            'sample_threshold': request.form.get('sample_threshold', type=float)
+        }
+        job_id = job_manager.submit(file, params)
+        return jsonify({'success': True, 'job_id': job_id, 'status': 'queued'}), 202
+        
+    except Exception as e:
+        return jsonify({'error': f'提交任务失败: {str(e)}'}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """任务列表接口，按提交时间倒序"""
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({'jobs': job_manager.list(limit)})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """任务状态接口，包含已处理帧数、总帧数、处理速度和预计剩余时间"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """取消排队中或处理中的任务"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job_manager.get(job_id))
+
+@app.route('/api/jobs/<job_id>/output', methods=['GET'])
+def download_job_output(job_id):
+    """下载已完成任务的结果视频"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    output_path = job_manager.get_output_path(job_id)
+    if output_path is None or not os.path.exists(output_path):
+        return jsonify({'error': '结果视频不可用', 'status': job['status']}), 409
+    return send_file(os.path.abspath(output_path), as_attachment=True,
+                     download_name=f"{os.path.splitext(job['file_name'] or job_id)[0]}_result.mp4")
+
+@app.route('/api/jobs/<job_id>/detections', methods=['GET'])
+def get_job_detections(job_id):
+    """获取已完成任务的逐帧检测结果"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    detections_path = job_manager.get_detections_path(job_id)
+    if detections_path is None or not os.path.exists(detections_path):
+        return jsonify({'error': '检测结果不可用', 'status': job['status']}), 409
+    return send_file(os.path.abspath(detections_path), mimetype='application/json')
+
 @app.route('/api/detect/batch', methods=['POST'])
 def detect_batch():
-    """批量图片检测接口"""
+    """
+    批量图片检测接口
+    max_size / imgsz 参数同 /api/detect/image，检测框坐标对应原图
+    """
     try:
         if 'images' not in request.files:
             return jsonify({'error': '没有上传图片文件'}), 400
         
         files = request.files.getlist('images')
         confidence = float(request.form.get('confidence', 0.5))
+        try:
+            return_image = parse_return_image(request.form.get('return_image'))
+            max_size = parse_max_size(request.form.get('max_size', request.form.get('imgsz')), Config.detect_max_size)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         results = []
         
+        # 先解码并提交所有图片，由调度器合并为批量推理
+        pending = []
         for file in files:
             if file.filename == '':
                 continue
             
-            # 读取图片
-            image_bytes = file.read()
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            # 读取图片，大图在解码时直接缩小到推理尺寸
+            image, scale = decode_image(file.read(), max_size)
             
             if image is None:
                 continue
             
-            # 执行检测
-            start_time = time.time()
-            detection_results = model(image)[0]
-            inference_time = time.time() - start_time
+            pending.append((file, scale, batcher.submit(image)))
+        
+        for file, scale, future in pending:
+            # 获取检测结果，耗时为所在批次的推理时间
+            detection_results, inference_time = future.result()
             
             # 过滤结果
             detection_results = result_filter(detection_results, confidence)
             
             # 处理检测结果
-            detections = process_detection_results(detection_results, file.filename)
+            detections = process_detection_results(detection_results, file.filename, scale)
             
-            # 生成带检测框的图片
-            result_image = detection_results.plot()
-            
-            # 将结果图片转换为base64
-            _, buffer = cv2.imencode('.jpg', result_image)
-            image_base64 = base64.b64encode(buffer).decode('utf-8')
+            # 按需生成带检测框的图片并转换为base64
+            image_bytes = encode_result_image(detection_results, return_image)
+            image_base64 = base64.b64encode(image_bytes).decode('utf-8') if image_bytes is not None else None
             
             results.append({
                 'filename': file.filename,
@@ -332,22 +542,31 @@ def get_model_info():
     try:
         return jsonify({
             'model_path': Config.model_path,
+            'backend': Config.inference_backend,
+            'loaded_models': registry.loaded(),
             'class_names': Config.CH_names,
             'num_classes': len(Config.CH_names),
-            'model_loaded': model is not None
+            'model_loaded': model is not None,
+            'batching': batcher.get_stats() if batcher is not None else None
         })
     except Exception as e:
         return jsonify({'error': f'获取模型信息失败: {str(e)}'}), 500
 
+def on_model_ready():
+    """模型就绪后启动依赖模型的后台任务"""
+    init_job_manager()
+    if Config.websocket_in_flask:
+        start_websocket_server()
+
 if __name__ == '__main__':
-    # 初始化模型
-    if not init_model():
-        print("模型初始化失败，请检查模型文件路径")
-        exit(1)
-    
+    debug = True
+    use_reloader = debug
     init_colors()
+    # 启用重载器时父进程只负责监控文件，模型与任务只在实际服务的子进程中加载
+    if not use_reloader or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        load_model_in_background(on_ready=on_model_ready)
     
     print("手语翻译系统API服务启动中...")
     print("API文档: http://localhost:5000/api/health")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=debug, use_reloader=use_reloader)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+动态微批处理调度器
+收集并发请求的图片，等待至多 max_wait_ms 毫秒或凑满 max_batch_size 张后，
+合并为一次批量YOLO推理，再把结果分发回各个调用方
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    def __init__(self, model, max_batch_size=8, max_wait_ms=10, **predict_kwargs):
+        """
+        :param model: YOLO模型
+        :param max_batch_size: 单批最多图片数
+        :param max_wait_ms: 收到第一张图片后最多等待的毫秒数
+        :param predict_kwargs: 透传给模型调用的参数
+        """
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.predict_kwargs = predict_kwargs
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._running = False
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self._total_batches = 0
+        self._total_images = 0
+        self._total_infer_time = 0.0
+        self._max_batch_seen = 0
+
+    def start(self):
+        """启动调度线程"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止调度线程，未处理的请求以异常结束"""
+        self._running = False
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError('微批处理调度器已停止'))
+
+    def submit(self, image):
+        """
+        提交一张图片，返回Future，结果为 (Results, 批推理耗时)
+        """
+        future = Future()
+        if not self._running:
+            future.set_exception(RuntimeError('微批处理调度器未启动'))
+            return future
+        self._queue.put((image, future))
+        return future
+
+    def infer(self, image, timeout=None):
+        """提交图片并阻塞等待结果"""
+        return self.submit(image).result(timeout=timeout)
+
+    def infer_batch(self, images, timeout=None):
+        """提交一组图片并按顺序返回各自的 Results"""
+        futures = [self.submit(image) for image in images]
+        return [future.result(timeout=timeout)[0] for future in futures]
+
+    def _collect_batch(self):
+        """阻塞等待第一张图片，再在等待窗口内尽量凑满一批"""
+        item = self._queue.get()
+        if item is None:
+            return []
+        batch = [item]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._running = False
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect_batch()
+            # 跳过调用方已取消的请求
+            batch = [(image, future) for image, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            images = [image for image, _ in batch]
+            try:
+                t1 = time.perf_counter()
+                results = self.model(images, **self.predict_kwargs)
+                infer_time = time.perf_counter() - t1
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self._total_batches += 1
+                self._total_images += len(batch)
+                self._total_infer_time += infer_time
+                self._max_batch_seen = max(self._max_batch_seen, len(batch))
+
+            for (_, future), result in zip(batch, results):
+                future.set_result((result, infer_time))
+
+    def get_stats(self):
+        """获取批处理统计信息"""
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+                'pending': self._queue.qsize(),
+                'total_batches': self._total_batches,
+                'total_images': self._total_images,
+                'avg_batch_size': round(self._total_images / self._total_batches, 2) if self._total_batches else 0,
+                'max_batch_seen': self._max_batch_seen,
+                'avg_batch_infer_time': round(self._total_infer_time / self._total_batches, 4) if self._total_batches else 0
+            }
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+微批处理吞吐量/延迟基准测试
+模拟多个并发客户端提交测试图片，对比不同 max_batch_size / max_wait_ms 组合的表现
+用法: python benchmark_batching.py --clients 8 --requests 20 --configs 1:0 4:5 8:10 16:20
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import numpy as np
+sys.path.append('..')
+import Config
+from detect_tools import img_cvread
+from batching import MicroBatcher
+from model_registry import get_model
+
+
+def load_images(folder, limit):
+    img_suffix = ['jpg', 'png', 'jpeg', 'bmp']
+    images = []
+    for file_name in sorted(os.listdir(folder)):
+        full_path = os.path.join(folder, file_name)
+        if os.path.isfile(full_path) and file_name.split('.')[-1].lower() in img_suffix:
+            img = img_cvread(full_path)
+            if img is not None:
+                images.append(img)
+        if len(images) >= limit:
+            break
+    return images
+
+
+def run_config(model, images, max_batch_size, max_wait_ms, clients, requests_per_client):
+    batcher = MicroBatcher(model, max_batch_size, max_wait_ms, verbose=False)
+    batcher.start()
+    latencies = []
+    lock = threading.Lock()
+
+    def client(client_id):
+        for i in range(requests_per_client):
+            image = images[(client_id * requests_per_client + i) % len(images)]
+            t1 = time.perf_counter()
+            batcher.infer(image)
+            latency = time.perf_counter() - t1
+            with lock:
+                latencies.append(latency)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    t_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t_start
+    stats = batcher.get_stats()
+    batcher.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'throughput': len(latencies) / elapsed,
+        'p50': float(np.percentile(latencies_ms, 50)),
+        'p95': float(np.percentile(latencies_ms, 95)),
+        'avg_batch': stats['avg_batch_size'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='微批处理基准测试')
+    parser.add_argument('--images', default=os.path.join('..', Config.test_images_path), help='测试图片文件夹')
+    parser.add_argument('--num-images', type=int, default=64, help='加载的测试图片数量')
+    parser.add_argument('--clients', type=int, default=8, help='并发客户端数量')
+    parser.add_argument('--requests', type=int, default=20, help='每个客户端的请求数')
+    parser.add_argument('--configs', nargs='+', default=['1:0', '4:5', '8:10', '16:20'],
+                        help='max_batch_size:max_wait_ms 组合，1:0 相当于不做批处理')
+    args = parser.parse_args()
+
+    model = get_model()
+    images = load_images(args.images, args.num_images)
+    if not images:
+        print('没有找到测试图片: {}'.format(args.images))
+        return
+
+    print('客户端数: {}, 每客户端请求数: {}, 图片数: {}'.format(args.clients, args.requests, len(images)))
+    print('{:>10} {:>10} {:>14} {:>10} {:>10} {:>10}'.format(
+        'max_batch', 'max_wait', 'throughput', 'p50(ms)', 'p95(ms)', 'avg_batch'))
+    for each in args.configs:
+        max_batch_size, max_wait_ms = each.split(':')
+        res = run_config(model, images, int(max_batch_size), float(max_wait_ms), args.clients, args.requests)
+        print('{:>10} {:>10} {:>10.2f} img/s {:>10.1f} {:>10.1f} {:>10.2f}'.format(
+            max_batch_size, max_wait_ms, res['throughput'], res['p50'], res['p95'], res['avg_batch']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+检测结果处理工具
+"""
+
+import io
+import sys
+import cv2
+import numpy as np
+from PIL import Image
+from ultralytics.utils.plotting import colors
+sys.path.append('..')
+import Config
+
+# 结果图片返回方式: false 只返回检测框坐标; thumbnail 返回缩略图; full 返回原尺寸标注图
+RETURN_IMAGE_MODES = ('false', 'thumbnail', 'full')
+
+# 解码时缩小的倍数及对应标志，JPEG 在解码阶段直接按比例缩小，不需要先解码全分辨率
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                        (2, cv2.IMREAD_REDUCED_COLOR_2))
+# EXIF 方向为这些值时图片旋转了90度，显示的宽高与文件头中的宽高互换
+EXIF_TRANSPOSED = (5, 6, 7, 8)
+
+def result_filter(result, confidence_threshold):
+    """过滤检测结果"""
+    conf_threshold = confidence_threshold
+    boxes = result.boxes
+    conf_mask = boxes.conf >= conf_threshold
+    filtered_boxes = boxes[conf_mask]
+    result.boxes = filtered_boxes
+    return result
+
+def parse_max_size(value, default=None):
+    """解析 max_size / imgsz 参数（送入模型的图片最长边），0 表示不限制"""
+    if value is None or value == '':
+        return default
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'max_size 参数必须为整数: {value}')
+    if size == 0:
+        return None
+    if not 32 <= size <= 8192:
+        raise ValueError(f'max_size 参数超出范围 [32, 8192]: {size}')
+    return size
+
+def image_header_size(image_bytes):
+    """只读取图片文件头获取按EXIF方向校正后的 (宽, 高)，无法识别时返回 None"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            width, height = img.size
+            orientation = img.getexif().get(0x0112)
+    except Exception:
+        return None
+    if orientation in EXIF_TRANSPOSED:
+        width, height = height, width
+    return width, height
+
+def decode_image(image_bytes, max_size=None, orig_size=None):
+    """
+    解码图片，最长边超过 max_size 时缩小后再送入模型
+    原图是 max_size 的2倍以上时使用 IMREAD_REDUCED_* 在解码阶段直接缩小
+    :param orig_size: 客户端上传前已缩小图片时传入原图 (宽, 高)，检测框按该尺寸换算
+    :return: (图片, 检测框坐标缩放比例 (x, y))，无法解码时返回 (None, None)
+    """
+    header_size = image_header_size(image_bytes) if max_size else None
+    flag = cv2.IMREAD_COLOR
+    if header_size is not None:
+        for factor, reduced_flag in REDUCED_DECODE_FLAGS:
+            if max(header_size) / factor >= max_size:
+                flag = reduced_flag
+                break
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+    if image is None:
+        return None, None
+    height, width = image.shape[:2]
+    if orig_size is None:
+        orig_size = header_size or (width, height)
+        # 解码时是否按EXIF旋转因 OpenCV 版本而异，以解码结果的方向为准
+        if (orig_size[0] > orig_size[1]) != (width > height) and orig_size[0] != orig_size[1]:
+            orig_size = (orig_size[1], orig_size[0])
+    if max_size and max(width, height) > max_size:
+        ratio = max_size / max(width, height)
+        width, height = max(1, round(width * ratio)), max(1, round(height * ratio))
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    return image, (orig_size[0] / width, orig_size[1] / height)
+
+def scale_location(location, scale=None):
+    """把检测框坐标从送入模型的图片换算回原图"""
+    if scale is None:
+        return [int(v) for v in location[:4]]
+    sx, sy = scale
+    return [int(location[0] * sx), int(location[1] * sy), int(location[2] * sx), int(location[3] * sy)]
+
+def process_detection_results(results, file_path=None, scale=None):
+    """
+    处理检测结果
+    :param scale: decode_image 返回的坐标缩放比例，坐标换算回原图尺寸
+    """
+    detections = []
+    
+    if results.boxes is not None and len(results.boxes) > 0:
+        location_list = [scale_location(location, scale) for location in results.boxes.xyxy.tolist()]
+        cls_list = results.boxes.cls.tolist()
+        conf_list = results.boxes.conf.tolist()
+        
+        for i, (location, cls, conf) in enumerate(zip(location_list, cls_list, conf_list)):
+            detection = {
+                'index': i,
+                'className': Config.CH_names[int(cls)],
+                'confidence': round(conf * 100, 2),
+                'coordinates': {
+                    'xmin': location[0],
+                    'ymin': location[1],
+                    'xmax': location[2],
+                    'ymax': location[3]
+                },
+                'filePath': file_path
+            }
+            detections.append(detection)
+    
+    return detections
+
+def parse_return_image(value, default='full'):
+    """解析 return_image 参数"""
+    if value is None or value == '':
+        return default
+    value = str(value).lower()
+    if value in ('none', 'no', '0'):
+        value = 'false'
+    elif value in ('true', 'yes', '1'):
+        value = 'full'
+    if value not in RETURN_IMAGE_MODES:
+        raise ValueError(f'不支持的 return_image 参数: {value}')
+    return value
+
+def draw_result_image(results, mode, img=None):
+    """
+    按返回方式绘制检测结果
+    :param img: 绘制到指定图片上（如沿用上一帧检测框的视频帧），默认绘制到原图
+    :return: 绘制后的图片，mode 为 false 时返回 None
+    """
+    if mode == 'false':
+        return None
+    if mode == 'full':
+        return results.plot() if img is None else results.plot(img=img)
+    
+    # 缩略图：先缩小再画框，避免在原尺寸图片上绘制和编码
+    src = results.orig_img if img is None else img
+    height, width = src.shape[:2]
+    scale = min(1.0, Config.thumbnail_max_size / max(height, width))
+    if scale < 1.0:
+        thumb = cv2.resize(src, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    else:
+        thumb = src.copy()
+    for location, cls in zip(results.boxes.xyxy.tolist(), results.boxes.cls.tolist()):
+        x1, y1, x2, y2 = [int(v * scale) for v in location]
+        color = colors(int(cls), True)
+        cv2.rectangle(thumb, (x1, y1), (x2, y2), color, 1)
+        cv2.putText(thumb, str(results.names[int(cls)]), (x1, max(y1 - 3, 10)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1, cv2.LINE_AA)
+    return thumb
+
+def encode_result_image(results, mode):
+    """
+    按返回方式生成JPEG字节
+    :return: JPEG字节，mode 为 false 时返回 None
+    """
+    image = draw_result_image(results, mode)
+    if image is None:
+        return None
+    params = [cv2.IMWRITE_JPEG_QUALITY, Config.thumbnail_jpeg_quality] if mode == 'thumbnail' else []
+    _, buffer = cv2.imencode('.jpg', image, params)
+    return buffer.tobytes()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket二进制帧协议
+客户端在连接后发送 {"type": "hello", "protocol": "binary", "codec": "msgpack"|"struct"} 协商二进制模式，
+未协商的连接仍使用原有的 JSON + base64 模式
+
+客户端 -> 服务端（摄像头帧）:
+    16字节头 <4sBBHIf: 魔数 b'SLF1', 版本, 标志位, 推理最长边, 帧ID, 置信度阈值
+    标志位低两位为结果图片返回方式: 0 连接默认, 1 false, 2 thumbnail, 3 full
+    推理最长边为送入模型的图片最长边，0 表示使用连接的默认设置；检测框坐标始终对应原始JPEG
+    其后为原始JPEG字节
+
+服务端 -> 客户端（检测结果）:
+    24字节头 <4sBBHIQI: 魔数 b'SLR1', 版本, 标志位, 保留, 帧ID, 时间戳(毫秒), 检测数据长度
+    其后为检测数据，再之后（若有）为带检测框的原始JPEG字节
+"""
+
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+PROTOCOL_VERSION = 1
+
+FRAME_MAGIC = b'SLF1'
+FRAME_HEADER = struct.Struct('<4sBBHIf')
+
+RESULT_MAGIC = b'SLR1'
+RESULT_HEADER = struct.Struct('<4sBBHIQI')
+
+# struct 编码下的单个检测: 类别ID, 置信度(百分比), xmin, ymin, xmax, ymax
+DETECTION_STRUCT = struct.Struct('<Hf4i')
+
+# 结果标志位
+FLAG_HAS_IMAGE = 0x01
+FLAG_MSGPACK = 0x02
+
+# 帧标志位低两位: 结果图片返回方式，0 表示使用连接的默认设置
+FRAME_RETURN_IMAGE_MASK = 0x03
+FRAME_RETURN_IMAGE_MODES = {1: 'false', 2: 'thumbnail', 3: 'full'}
+
+CODECS = ('msgpack', 'struct')
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def negotiate_codec(requested):
+    """确定二进制模式下检测数据的编码方式，服务端未安装msgpack时退回struct"""
+    if requested == 'msgpack' and msgpack is not None:
+        return 'msgpack'
+    return 'struct'
+
+
+def decode_frame(message):
+    """
+    解析客户端二进制帧
+    :return: (帧ID, 置信度阈值, 标志位, 推理最长边, JPEG字节)
+    """
+    if len(message) < FRAME_HEADER.size:
+        raise ProtocolError('二进制帧长度不足')
+    magic, version, flags, max_size, frame_id, confidence = FRAME_HEADER.unpack_from(message)
+    if magic != FRAME_MAGIC:
+        raise ProtocolError('二进制帧魔数错误')
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError('不支持的协议版本: {}'.format(version))
+    return frame_id, confidence, flags, max_size, memoryview(message)[FRAME_HEADER.size:]
+
+
+def frame_return_image(flags):
+    """从帧标志位取出结果图片返回方式，未指定时返回 None"""
+    return FRAME_RETURN_IMAGE_MODES.get(flags & FRAME_RETURN_IMAGE_MASK)
+
+
+def encode_frame(frame_id, confidence, jpeg_bytes, flags=0, max_size=0):
+    """构造客户端二进制帧（供Python客户端及测试使用）"""
+    return FRAME_HEADER.pack(FRAME_MAGIC, PROTOCOL_VERSION, flags, max_size, frame_id, confidence) + \
+        bytes(jpeg_bytes)
+
+
+def encode_detections(detections, codec):
+    """按协商的编码方式序列化检测结果"""
+    if codec == 'msgpack':
+        return msgpack.packb(detections, use_bin_type=True)
+    return b''.join(
+        DETECTION_STRUCT.pack(
+            each['classId'], each['confidence'],
+            each['coordinates']['xmin'], each['coordinates']['ymin'],
+            each['coordinates']['xmax'], each['coordinates']['ymax'])
+        for each in detections)
+
+
+def encode_result(frame_id, timestamp, detections, codec, image_bytes=None):
+    """构造服务端二进制检测结果"""
+    payload = encode_detections(detections, codec)
+    flags = FLAG_MSGPACK if codec == 'msgpack' else 0
+    if image_bytes is not None:
+        flags |= FLAG_HAS_IMAGE
+    header = RESULT_HEADER.pack(RESULT_MAGIC, PROTOCOL_VERSION, flags, 0, frame_id, timestamp, len(payload))
+    return header + payload + (bytes(image_bytes) if image_bytes is not None else b'')
+
+
+def decode_result(message):
+    """
+    解析服务端二进制检测结果（供Python客户端及测试使用）
+    :return: (帧ID, 时间戳, 检测结果列表, JPEG字节或None)
+    """
+    magic, version, flags, _, frame_id, timestamp, length = RESULT_HEADER.unpack_from(message)
+    if magic != RESULT_MAGIC:
+        raise ProtocolError('检测结果魔数错误')
+    start = RESULT_HEADER.size
+    payload = message[start:start + length]
+    if flags & FLAG_MSGPACK:
+        detections = msgpack.unpackb(payload, raw=False)
+    else:
+        detections = [
+            {'classId': cls_id, 'confidence': round(conf, 2),
+             'coordinates': {'xmin': x1, 'ymin': y1, 'xmax': x2, 'ymax': y2}}
+            for cls_id, conf, x1, y1, x2, y2 in DETECTION_STRUCT.iter_unpack(payload)]
+    image_bytes = message[start + length:] if flags & FLAG_HAS_IMAGE else None
+    return frame_id, timestamp, detections, image_bytes
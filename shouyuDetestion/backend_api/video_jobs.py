@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+视频检测后台任务
+提交后立即返回任务ID，由工作线程池处理视频；任务状态保存在本地SQLite中，服务重启后未完成的任务会重新排队
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from frame_sampler import FrameSampler
+from video_pipeline import VideoDetectionPipeline
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+# 进度写入数据库的最小间隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+
+class JobStore:
+    """基于SQLite的任务存储"""
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS video_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    file_name TEXT,
+                    input_path TEXT NOT NULL,
+                    output_path TEXT,
+                    detections_path TEXT,
+                    params TEXT NOT NULL,
+                    frames_done INTEGER DEFAULT 0,
+                    total_frames INTEGER DEFAULT 0,
+                    processing_fps REAL DEFAULT 0,
+                    summary TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )''')
+
+    def insert(self, job):
+        columns = ', '.join(job.keys())
+        placeholders = ', '.join('?' for _ in job)
+        with self._lock, self._conn:
+            self._conn.execute('INSERT INTO video_jobs ({}) VALUES ({})'.format(columns, placeholders),
+                               list(job.values()))
+
+    def update(self, job_id, **fields):
+        assignments = ', '.join('{} = ?'.format(key) for key in fields)
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE video_jobs SET {} WHERE id = ?'.format(assignments),
+                               list(fields.values()) + [job_id])
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM video_jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list(self, limit=50):
+        with self._lock:
+            rows = self._conn.execute('SELECT * FROM video_jobs ORDER BY created_at DESC LIMIT ?',
+                                      (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def find_by_status(self, statuses):
+        placeholders = ', '.join('?' for _ in statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM video_jobs WHERE status IN ({}) ORDER BY created_at'.format(placeholders),
+                list(statuses)).fetchall()
+        return [dict(row) for row in rows]
+
+
+class VideoJobManager:
+    def __init__(self, infer_batch, job_dir, max_workers=1, batch_size=8):
+        """
+        :param infer_batch: 批量推理函数，见 VideoDetectionPipeline
+        :param job_dir: 保存任务数据库、上传视频和结果的目录
+        :param max_workers: 同时处理的视频数
+        """
+        self.infer_batch = infer_batch
+        self.job_dir = job_dir
+        self.batch_size = batch_size
+        os.makedirs(job_dir, exist_ok=True)
+        self.store = JobStore(os.path.join(job_dir, 'jobs.db'))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='video-job')
+        self._cancel_events = {}
+        self._lock = threading.Lock()
+        self._recover()
+
+    def _recover(self):
+        """服务重启后，重新排队上次未完成的任务"""
+        for job in self.store.find_by_status((QUEUED, RUNNING)):
+            if os.path.exists(job['input_path']):
+                self.store.update(job['id'], status=QUEUED, frames_done=0, started_at=None)
+                self._enqueue(job['id'])
+                print('恢复视频检测任务: {}'.format(job['id']))
+            else:
+                self.store.update(job['id'], status=FAILED, error='输入视频丢失', finished_at=time.time())
+
+    def _enqueue(self, job_id):
+        with self._lock:
+            self._cancel_events[job_id] = threading.Event()
+        self.executor.submit(self._run, job_id)
+
+    def submit(self, file, params):
+        """
+        保存上传的视频并创建任务
+        :param file: 上传的文件对象
+        :param params: 检测参数 confidence / return_image / sample_mode / sample_stride / sample_threshold
+        :return: 任务ID
+        """
+        job_id = uuid.uuid4().hex
+        input_path = os.path.join(self.job_dir, '{}_input.mp4'.format(job_id))
+        file.save(input_path)
+        self.store.insert({
+            'id': job_id,
+            'status': QUEUED,
+            'file_name': file.filename,
+            'input_path': input_path,
+            'params': json.dumps(params),
+            'created_at': time.time(),
+        })
+        self._enqueue(job_id)
+        return job_id
+
+    def cancel(self, job_id):
+        """取消任务，返回取消后的任务信息；任务已结束时不做处理"""
+        job = self.store.get(job_id)
+        if job is None or job['status'] in FINISHED_STATUSES:
+            return job
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+        if job['status'] == QUEUED:
+            self.store.update(job_id, status=CANCELLED, finished_at=time.time())
+        return self.get(job_id)
+
+    def _run(self, job_id):
+        with self._lock:
+            cancel_event = self._cancel_events.get(job_id)
+        job = self.store.get(job_id)
+        if job is None or job['status'] != QUEUED or cancel_event.is_set():
+            self._finish(job_id)
+            return
+
+        params = json.loads(job['params'])
+        return_image = params.get('return_image', 'full')
+        output_path = None
+        if return_image != 'false':
+            output_path = os.path.join(self.job_dir, '{}_output.mp4'.format(job_id))
+        sample_mode = params.get('sample_mode', 'all')
+        sampler = None
+        if sample_mode != 'all':
+            sampler = FrameSampler.from_config(sample_mode, params.get('sample_stride'), params.get('sample_threshold'))
+
+        pipeline = VideoDetectionPipeline(self.infer_batch, job['input_path'], output_path,
+                                          confidence=params.get('confidence', 0.5), batch_size=self.batch_size,
+                                          file_name=job['file_name'], sampler=sampler, image_mode=return_image)
+        try:
+            if not pipeline.open():
+                raise RuntimeError('无法打开视频文件')
+            self.store.update(job_id, status=RUNNING, started_at=time.time(), total_frames=pipeline.frame_count)
+
+            frame_detections = []
+            last_update = 0
+            for event in pipeline.run():
+                frame_detections.append({'frame': event['frame'], 'detections': event['detections']})
+                now = time.time()
+                if now - last_update >= PROGRESS_INTERVAL:
+                    last_update = now
+                    elapsed = now - pipeline.start_time
+                    self.store.update(job_id, frames_done=pipeline.frames_done,
+                                      processing_fps=pipeline.frames_done / elapsed if elapsed > 0 else 0)
+                if cancel_event.is_set():
+                    break
+
+            summary = pipeline.summary()
+            if cancel_event.is_set():
+                self.store.update(job_id, status=CANCELLED, frames_done=pipeline.frames_done,
+                                  finished_at=time.time())
+                self._remove(output_path)
+                return
+
+            detections_path = os.path.join(self.job_dir, '{}_detections.json'.format(job_id))
+            with open(detections_path, 'w', encoding='utf-8') as f:
+                json.dump(frame_detections, f, ensure_ascii=False)
+            self.store.update(job_id, status=COMPLETED, frames_done=pipeline.frames_done,
+                              total_frames=pipeline.frames_done, processing_fps=summary['processing_fps'],
+                              output_path=output_path, detections_path=detections_path,
+                              summary=json.dumps(summary, ensure_ascii=False), finished_at=time.time())
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+            self._remove(output_path)
+        finally:
+            self._finish(job_id)
+
+    @staticmethod
+    def _remove(path):
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+    def _finish(self, job_id):
+        with self._lock:
+            self._cancel_events.pop(job_id, None)
+        job = self.store.get(job_id)
+        # 任务结束后删除上传的视频，重启恢复只需要未完成任务的输入
+        if job is not None and job['status'] in FINISHED_STATUSES:
+            self._remove(job['input_path'])
+
+    def get(self, job_id):
+        """获取任务信息及进度"""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        total = job['total_frames'] or 0
+        done = job['frames_done'] or 0
+        fps = job['processing_fps'] or 0
+        eta = None
+        if job['status'] == RUNNING and fps > 0 and total > done:
+            eta = round((total - done) / fps, 1)
+        return {
+            'job_id': job['id'],
+            'status': job['status'],
+            'file_name': job['file_name'],
+            'params': json.loads(job['params']),
+            'progress': {
+                'frames_done': done,
+                'total_frames': total,
+                'percent': round(done / total * 100, 1) if total else 0,
+                'fps': round(fps, 2),
+                'eta_seconds': eta,
+            },
+            'summary': json.loads(job['summary']) if job['summary'] else None,
+            'has_output': bool(job['output_path']) and job['status'] == COMPLETED,
+            'error': job['error'],
+            'created_at': job['created_at'],
+            'started_at': job['started_at'],
+            'finished_at': job['finished_at'],
+        }
+
+    def list(self, limit=50):
+        return [self.get(job['id']) for job in self.store.list(limit)]
+
+    def get_output_path(self, job_id):
+        """已完成任务的结果视频路径"""
+        job = self.store.get(job_id)
+        if job is None or job['status'] != COMPLETED:
+            return None
+        return job['output_path']
+
+    def get_detections_path(self, job_id):
+        """已完成任务的逐帧检测结果路径"""
+        job = self.store.get(job_id)
+        if job is None or job['status'] != COMPLETED:
+            return None
+        return job['detections_path']
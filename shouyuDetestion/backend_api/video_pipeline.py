@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+流水线式视频检测
+解码 -> 批量推理 -> 绘制 -> 编码 四个阶段分别运行在独立线程中，
+阶段之间通过有界队列连接，逐帧产出检测结果供流式响应使用
+"""
+
+import queue
+import threading
+import time
+import cv2
+from detection_utils import result_filter, process_detection_results, draw_result_image
+
+# 队列结束标记
+_END = object()
+
+
+class VideoDetectionPipeline:
+    def __init__(self, infer_batch, video_path, output_path=None, confidence=0.5,
+                 batch_size=8, queue_size=32, file_name=None, sampler=None, evaluate=False,
+                 image_mode='full'):
+        """
+        :param infer_batch: 批量推理函数，输入帧列表，按顺序返回 Results 列表
+        :param video_path: 输入视频路径
+        :param output_path: 绘制结果的视频保存路径，为 None 时不输出视频
+        :param confidence: 置信度阈值
+        :param batch_size: 单次推理的最大帧数
+        :param queue_size: 各阶段之间队列的容量
+        :param file_name: 用于标记检测结果来源的文件名
+        :param sampler: 抽帧器 FrameSampler，为 None 时每帧都检测
+        :param evaluate: 是否同时检测被跳过的帧，用于统计抽帧相对逐帧检测的准确率差异
+        :param image_mode: 输出视频的绘制方式，full 原尺寸，thumbnail 缩小尺寸
+        """
+        self.infer_batch = infer_batch
+        self.video_path = video_path
+        self.output_path = output_path
+        self.confidence = confidence
+        self.batch_size = max(1, batch_size)
+        self.file_name = file_name or video_path
+        self.sampler = sampler
+        self.evaluate = evaluate
+        self.image_mode = image_mode
+        self._last_result = None
+
+        self.decode_q = queue.Queue(maxsize=queue_size)
+        self.annotate_q = queue.Queue(maxsize=queue_size)
+        self.encode_q = queue.Queue(maxsize=queue_size)
+        self.event_q = queue.Queue(maxsize=queue_size)
+
+        self._stop_event = threading.Event()
+        self._threads = []
+        self.error = None
+
+        self.fps = 0
+        self.frame_count = 0
+        self.width = 0
+        self.height = 0
+        self.frames_done = 0
+
+    def open(self):
+        """打开视频并读取基本信息，失败返回 False"""
+        self.cap = cv2.VideoCapture(self.video_path)
+        if not self.cap.isOpened():
+            return False
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return True
+
+    def stop(self):
+        """请求各阶段尽快退出"""
+        self._stop_event.set()
+
+    def _put(self, q, item):
+        """向有界队列放入数据，停止时放弃"""
+        while not self._stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        """从队列取数据，停止时返回结束标记"""
+        while not self._stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, e):
+        if self.error is None:
+            self.error = e
+        self.stop()
+
+    def _decode_worker(self):
+        try:
+            frame_idx = 0
+            while not self._stop_event.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                if not self._put(self.decode_q, (frame_idx, frame)):
+                    break
+                frame_idx += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self.cap.release()
+            self._put(self.decode_q, _END)
+
+    def _infer_worker(self):
+        try:
+            finished = False
+            while not finished:
+                item = self._get(self.decode_q)
+                if item is _END:
+                    break
+                # 凑一批已解码的帧，不等待未解码的帧
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self.decode_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _END:
+                        finished = True
+                        break
+                    batch.append(item)
+
+                results = self._infer_with_sampling(batch)
+                for (frame_idx, frame), (result, detected) in zip(batch, results):
+                    if not self._put(self.annotate_q, (frame_idx, frame, result, detected)):
+                        return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.annotate_q, _END)
+
+    def _infer_with_sampling(self, batch):
+        """
+        对一批帧推理，返回 [(检测结果, 是否实际检测)]
+        被抽帧跳过的帧沿用前一个检测帧的结果
+        """
+        frames = [frame for _, frame in batch]
+        if self.sampler is None:
+            return [(result_filter(result, self.confidence), True) for result in self.infer_batch(frames)]
+
+        flags = [self.sampler.should_detect(frame) for frame in frames]
+        to_run = [frame for frame, detect in zip(frames, flags) if detect or self.evaluate]
+        run_results = iter(self.infer_batch(to_run) if to_run else [])
+        outputs = []
+        for detect in flags:
+            if detect:
+                self._last_result = result_filter(next(run_results), self.confidence)
+            elif self.evaluate:
+                self.sampler.record_comparison(self._last_result, result_filter(next(run_results), self.confidence))
+            outputs.append((self._last_result, detect))
+        return outputs
+
+    def _annotate_worker(self):
+        try:
+            while True:
+                item = self._get(self.annotate_q)
+                if item is _END:
+                    break
+                frame_idx, frame, result, detected = item
+                detections = process_detection_results(result, '{}_frame_{}'.format(self.file_name, frame_idx))
+                if self.output_path is not None:
+                    # 沿用的检测框画在当前帧上
+                    result_frame = draw_result_image(result, self.image_mode, None if detected else frame)
+                    if not self._put(self.encode_q, result_frame):
+                        break
+                event = {'type': 'frame', 'frame': frame_idx, 'detections': detections, 'detected': detected}
+                if not self._put(self.event_q, event):
+                    break
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.encode_q, _END)
+            self._put(self.event_q, _END)
+
+    def _encode_worker(self):
+        out = None
+        try:
+            while True:
+                item = self._get(self.encode_q)
+                if item is _END:
+                    break
+                if out is None:
+                    # 按首帧尺寸创建输出视频（缩略图模式下尺寸小于原视频）
+                    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+                    out = cv2.VideoWriter(self.output_path, fourcc, self.fps, (item.shape[1], item.shape[0]))
+                out.write(item)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            if out is not None:
+                out.release()
+
+    def run(self):
+        """
+        启动流水线，逐帧产出检测事件:
+        {'type': 'frame', 'frame': 帧序号, 'detections': [...], 'detected': 是否实际运行了检测}
+        需先调用 open()
+        """
+        self.start_time = time.time()
+        for target in (self._decode_worker, self._infer_worker, self._annotate_worker, self._encode_worker):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+        finished = False
+        try:
+            while True:
+                event = self._get(self.event_q)
+                if event is _END:
+                    finished = True
+                    break
+                self.frames_done += 1
+                yield event
+        finally:
+            # 消费方提前结束（如客户端断开）时停止所有阶段
+            if not finished:
+                self.stop()
+            for t in self._threads:
+                t.join()
+        if self.error is not None:
+            raise self.error
+
+    def summary(self):
+        """处理完成后的统计信息"""
+        elapsed = time.time() - self.start_time
+        summary = {
+            'total_frames': self.frames_done,
+            'fps': self.fps,
+            'duration': self.frames_done / self.fps if self.fps else 0,
+            'elapsed': round(elapsed, 3),
+            'processing_fps': round(self.frames_done / elapsed, 2) if elapsed > 0 else 0,
+        }
+        if self.sampler is not None:
+            summary['sampling'] = self.sampler.report()
+        return summary
@@ -4,25 +4,104 @@ WebSocket处理器 - 用于实时摄像头检测
 """
 
 import asyncio
+import os
+import sys
+import threading
 import websockets
 import json
-import cv2
-import numpy as np
+import time
 import base64
-from ultralytics import YOLO
+from concurrent.futures import ThreadPoolExecutor
+# 单独运行时也能导入上级目录的 Config 等模块
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 import Config
+import frame_protocol
+from detection_utils import parse_return_image, encode_result_image, parse_max_size, decode_image, scale_location
+from model_registry import get_model
+
+
+class ClientSession:
+    """单个WebSocket连接的状态"""
+    def __init__(self, websocket):
+        self.websocket = websocket
+        # json: 原有的 JSON + base64 模式; binary: 二进制帧模式
+        self.protocol = 'json'
+        self.codec = None
+        # 结果图片返回方式: false / thumbnail / full
+        self.return_image = 'full'
+        # 送入模型的图片最长边，None 表示不限制
+        self.max_size = Config.detect_max_size
+        # 本连接的检测结果额外推送到的房间，以及本连接订阅（观看）的房间
+        self.publish_room = None
+        self.subscribed_rooms = set()
+
+        # 单槽"最新帧"邮箱：推理跟不上摄像头时只保留最新一帧，旧帧直接丢弃
+        self._latest_frame = None
+        self._frame_ready = asyncio.Event()
+        self.worker = None
+
+        # 帧统计
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._total_latency_ms = 0.0
+
+    def put_frame(self, image_bytes, confidence, frame_id, return_image=None, max_size=None):
+        """
+        放入最新帧，覆盖尚未处理的旧帧
+        :param max_size: 送入模型的图片最长边，由调用方解析（含连接默认值），None 表示不限制
+        """
+        self.frames_received += 1
+        if self._latest_frame is not None:
+            self.frames_dropped += 1
+        self._latest_frame = (image_bytes, confidence, frame_id, return_image or self.return_image,
+                              max_size, time.perf_counter())
+        self._frame_ready.set()
+
+    async def next_frame(self):
+        """等待并取出最新帧"""
+        await self._frame_ready.wait()
+        self._frame_ready.clear()
+        frame, self._latest_frame = self._latest_frame, None
+        return frame
+
+    def record_latency(self, received_at):
+        """记录从收到帧到结果发出的端到端延迟"""
+        latency_ms = (time.perf_counter() - received_at) * 1000
+        self.frames_processed += 1
+        self.last_latency_ms = latency_ms
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        self._total_latency_ms += latency_ms
+
+    def stats(self):
+        return {
+            'framesReceived': self.frames_received,
+            'framesProcessed': self.frames_processed,
+            'framesDropped': self.frames_dropped,
+            'lastLatencyMs': round(self.last_latency_ms, 2),
+            'avgLatencyMs': round(self._total_latency_ms / self.frames_processed, 2) if self.frames_processed else 0,
+            'maxLatencyMs': round(self.max_latency_ms, 2)
+        }
+
 
 class CameraDetectionHandler:
     def __init__(self):
         self.model = None
         self.clients = set()
+        self.sessions = {}
+        # 房间名 -> 订阅该房间的连接
+        self.rooms = {}
+        # 模型非线程安全，所有推理在同一个工作线程中串行执行，不阻塞事件循环
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ws-inference')
         self.init_model()
     
     def init_model(self):
         """初始化模型"""
         try:
-            self.model = YOLO(Config.model_path, task='detect')
-            self.model(np.zeros((48, 48, 3)))  # 预加载
+            # 从进程内共享的注册表获取（已预热），与Flask接口在同一进程时共用该模型
+            self.model = get_model()
             print("WebSocket模型加载成功")
         except Exception as e:
             print(f"WebSocket模型加载失败: {e}")
@@ -30,91 +109,227 @@ class CameraDetectionHandler:
     async def register_client(self, websocket):
         """注册客户端"""
         self.clients.add(websocket)
+        session = ClientSession(websocket)
+        session.worker = asyncio.create_task(self.inference_worker(session))
+        self.sessions[websocket] = session
         print(f"客户端已连接，当前连接数: {len(self.clients)}")
     
     async def unregister_client(self, websocket):
         """注销客户端"""
         self.clients.discard(websocket)
+        session = self.sessions.pop(websocket, None)
+        if session is not None:
+            session.worker.cancel()
+            for room in list(session.subscribed_rooms):
+                self.unsubscribe(session, room)
+            print(f"客户端帧统计: {session.stats()}")
         print(f"客户端已断开，当前连接数: {len(self.clients)}")
     
-    async def broadcast_detection(self, image_data, confidence=0.5):
-        """广播检测结果"""
-        if not self.model or not self.clients:
-            return
-        
+    async def inference_worker(self, session):
+        """逐个处理连接邮箱中的最新帧"""
+        loop = asyncio.get_running_loop()
+        while True:
+            image_bytes, confidence, frame_id, return_image, max_size, received_at = await session.next_frame()
+            try:
+                result = await loop.run_in_executor(self.executor, self.detect_frame,
+                                                    image_bytes, confidence, return_image, max_size)
+            except Exception as e:
+                print(f"检测处理失败: {e}")
+                continue
+            if result is None:
+                continue
+            detections, jpeg_bytes = result
+            await self.deliver_detection(session, detections, jpeg_bytes, frame_id)
+            session.record_latency(received_at)
+    
+    def subscribe(self, session, room):
+        """以观察者身份订阅房间"""
+        self.rooms.setdefault(room, set()).add(session)
+        session.subscribed_rooms.add(room)
+    
+    def unsubscribe(self, session, room):
+        """退订房间"""
+        members = self.rooms.get(room)
+        if members is not None:
+            members.discard(session)
+            if not members:
+                del self.rooms[room]
+        session.subscribed_rooms.discard(room)
+    
+    async def negotiate(self, session, data):
+        """协商连接使用的协议，旧客户端不发送hello时保持JSON模式"""
+        if data.get('protocol') == 'binary':
+            session.protocol = 'binary'
+            session.codec = frame_protocol.negotiate_codec(data.get('codec'))
+        else:
+            session.protocol = 'json'
+            session.codec = None
         try:
-            # 解码图片
-            image_bytes = base64.b64decode(image_data)
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if image is None:
-                return
-            
-            # 执行检测
-            results = self.model(image)[0]
-            
-            # 过滤结果
-            if results.boxes is not None and len(results.boxes) > 0:
-                conf_mask = results.boxes.conf >= confidence
-                results.boxes = results.boxes[conf_mask]
+            session.return_image = parse_return_image(data.get('returnImage'), session.return_image)
+            session.max_size = parse_max_size(data.get('maxSize'), session.max_size)
+        except ValueError as e:
+            await session.websocket.send(json.dumps({'type': 'error', 'message': str(e)}))
+        await session.websocket.send(json.dumps({
+            'type': 'hello_ack',
+            'protocol': session.protocol,
+            'codec': session.codec,
+            'returnImage': session.return_image,
+            'maxSize': session.max_size,
+            'version': frame_protocol.PROTOCOL_VERSION,
+            # struct 编码只传类别ID，客户端据此映射类别名称
+            'class_names': Config.CH_names
+        }))
+    
+    def encode_response(self, session, frame_id, timestamp, detections, jpeg_bytes, cache):
+        """按连接协商的协议编码检测结果，同一协议的编码结果只生成一次"""
+        key = (session.protocol, session.codec)
+        if key not in cache:
+            if session.protocol == 'binary':
+                cache[key] = frame_protocol.encode_result(frame_id, timestamp, detections, session.codec, jpeg_bytes)
+            else:
+                cache[key] = json.dumps({
+                    'type': 'detection_result',
+                    'frameId': frame_id,
+                    'detections': detections,
+                    'image': base64.b64encode(jpeg_bytes).decode('utf-8') if jpeg_bytes is not None else None,
+                    'timestamp': timestamp
+                })
+        return cache[key]
+    
+    def detect_frame(self, image_bytes, confidence=0.5, return_image='full', max_size=None):
+        """
+        检测单帧（阻塞调用，在推理线程中执行）
+        :param image_bytes: 原始JPEG字节
+        :param return_image: 结果图片返回方式，false 时跳过绘制和编码
+        :param max_size: 送入模型的图片最长边，检测框坐标换算回原图
+        :return: (检测结果列表, 带检测框的JPEG字节或None)，无法处理时返回None
+        """
+        if not self.model:
+            return None
+        
+        # 解码图片，大图在解码时直接缩小到推理尺寸
+        image, scale = decode_image(image_bytes, max_size)
+        
+        if image is None:
+            return None
+        
+        # 执行检测
+        results = self.model(image)[0]
+        
+        # 过滤结果
+        if results.boxes is not None and len(results.boxes) > 0:
+            conf_mask = results.boxes.conf >= confidence
+            results.boxes = results.boxes[conf_mask]
+        
+        # 处理检测结果
+        detections = []
+        if results.boxes is not None and len(results.boxes) > 0:
+            location_list = [scale_location(location, scale) for location in results.boxes.xyxy.tolist()]
+            cls_list = results.boxes.cls.tolist()
+            conf_list = results.boxes.conf.tolist()
             
-            # 处理检测结果
-            detections = []
-            if results.boxes is not None and len(results.boxes) > 0:
-                location_list = results.boxes.xyxy.tolist()
-                cls_list = results.boxes.cls.tolist()
-                conf_list = results.boxes.conf.tolist()
-                
-                for i, (location, cls, conf) in enumerate(zip(location_list, cls_list, conf_list)):
-                    detection = {
-                        'index': i,
-                        'className': Config.CH_names[int(cls)],
-                        'confidence': round(conf * 100, 2),
-                        'coordinates': {
-                            'xmin': int(location[0]),
-                            'ymin': int(location[1]),
-                            'xmax': int(location[2]),
-                            'ymax': int(location[3])
-                        }
+            for i, (location, cls, conf) in enumerate(zip(location_list, cls_list, conf_list)):
+                detection = {
+                    'index': i,
+                    'classId': int(cls),
+                    'className': Config.CH_names[int(cls)],
+                    'confidence': round(conf * 100, 2),
+                    'coordinates': {
+                        'xmin': location[0],
+                        'ymin': location[1],
+                        'xmax': location[2],
+                        'ymax': location[3]
                     }
-                    detections.append(detection)
-            
-            # 生成带检测框的图片
-            result_image = results.plot()
-            _, buffer = cv2.imencode('.jpg', result_image)
-            result_image_base64 = base64.b64encode(buffer).decode('utf-8')
+                }
+                detections.append(detection)
+        
+        # 按需生成带检测框的图片
+        return detections, encode_result_image(results, return_image)
+    
+    async def deliver_detection(self, sender, detections, jpeg_bytes, frame_id=0):
+        """
+        投递检测结果：发送给帧的发送方，以及发送方发布房间的订阅者
+        """
+        try:
+            timestamp = int(time.time() * 1000)
             
-            # 准备响应数据
-            response = {
-                'type': 'detection_result',
-                'detections': detections,
-                'image': result_image_base64,
-                'timestamp': int(time.time() * 1000)
-            }
+            recipients = {sender}
+            if sender.publish_room is not None:
+                recipients |= self.rooms.get(sender.publish_room, set())
             
-            # 广播给所有客户端
-            if self.clients:
-                await asyncio.gather(
-                    *[client.send(json.dumps(response)) for client in self.clients],
-                    return_exceptions=True
-                )
+            # 按各连接的协议编码，同一协议只编码一次
+            cache = {}
+            sends = []
+            for session in recipients:
+                if session.websocket not in self.clients:
+                    continue
+                response = self.encode_response(session, frame_id, timestamp, detections, jpeg_bytes, cache)
+                sends.append(session.websocket.send(response))
+            if sends:
+                await asyncio.gather(*sends, return_exceptions=True)
                 
         except Exception as e:
-            print(f"检测处理失败: {e}")
+            print(f"检测结果发送失败: {e}")
     
-    async def handle_client(self, websocket, path):
+    async def handle_client(self, websocket, path=None):
         """处理客户端连接"""
         await self.register_client(websocket)
+        session = self.sessions[websocket]
         try:
             async for message in websocket:
+                if isinstance(message, bytes):
+                    # 二进制帧：头部 + 原始JPEG
+                    if session.protocol != 'binary':
+                        await websocket.send(json.dumps({'type': 'error', 'message': '请先发送hello协商二进制协议'}))
+                        continue
+                    try:
+                        frame_id, confidence, flags, max_size, jpeg_bytes = frame_protocol.decode_frame(message)
+                        # 帧头中的 0 表示使用连接的默认设置
+                        max_size = parse_max_size(max_size) if max_size else session.max_size
+                    except (frame_protocol.ProtocolError, ValueError) as e:
+                        await websocket.send(json.dumps({'type': 'error', 'message': str(e)}))
+                        continue
+                    session.put_frame(bytes(jpeg_bytes), confidence, frame_id,
+                                      frame_protocol.frame_return_image(flags), max_size)
+                    continue
+                
                 data = json.loads(message)
                 
-                if data.get('type') == 'camera_frame':
+                if data.get('type') == 'hello':
+                    await self.negotiate(session, data)
+                
+                elif data.get('type') == 'camera_frame':
                     # 处理摄像头帧
-                    image_data = data.get('image')
+                    image_bytes = base64.b64decode(data.get('image'))
                     confidence = data.get('confidence', 0.5)
-                    await self.broadcast_detection(image_data, confidence)
+                    try:
+                        return_image = parse_return_image(data.get('returnImage'), session.return_image)
+                        max_size = parse_max_size(data.get('maxSize'), session.max_size)
+                    except ValueError as e:
+                        await websocket.send(json.dumps({'type': 'error', 'message': str(e)}))
+                        continue
+                    session.put_frame(image_bytes, confidence, data.get('frameId', 0), return_image, max_size)
+                
+                elif data.get('type') == 'publish':
+                    # 本连接的检测结果同时推送到指定房间，room为空时取消发布
+                    session.publish_room = data.get('room') or None
+                    await websocket.send(json.dumps({'type': 'publish_ack', 'room': session.publish_room}))
+                
+                elif data.get('type') == 'subscribe':
+                    # 以观察者身份接收房间内的检测结果
+                    if not data.get('room'):
+                        await websocket.send(json.dumps({'type': 'error', 'message': '缺少房间名'}))
+                        continue
+                    self.subscribe(session, data.get('room'))
+                    await websocket.send(json.dumps({'type': 'subscribe_ack', 'room': data.get('room')}))
+                
+                elif data.get('type') == 'unsubscribe':
+                    self.unsubscribe(session, data.get('room'))
+                    await websocket.send(json.dumps({'type': 'unsubscribe_ack', 'room': data.get('room')}))
+                
+                elif data.get('type') == 'stats':
+                    # 查询本连接的帧统计
+                    await websocket.send(json.dumps({'type': 'stats', 'stats': session.stats()}))
                 
                 elif data.get('type') == 'ping':
                     # 心跳检测
@@ -126,14 +341,23 @@ class CameraDetectionHandler:
             await self.unregister_client(websocket)
 
 # 全局处理器实例
-detection_handler = CameraDetectionHandler()
+_detection_handler = None
+_handler_lock = threading.Lock()
+
+def get_detection_handler():
+    """首次使用时才创建处理器并加载模型，导入本模块不会加载模型"""
+    global _detection_handler
+    with _handler_lock:
+        if _detection_handler is None:
+            _detection_handler = CameraDetectionHandler()
+    return _detection_handler
 
 async def websocket_server():
     """启动WebSocket服务器"""
     print("WebSocket服务器启动中...")
-    async with websockets.serve(detection_handler.handle_client, "localhost", 8765):
+    handler = get_detection_handler()
+    async with websockets.serve(handler.handle_client, Config.websocket_host, Config.websocket_port):
         await asyncio.Future()  # 保持运行
 
 if __name__ == "__main__":
-    import time
     asyncio.run(websocket_server())
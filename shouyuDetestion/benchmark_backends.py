@@ -0,0 +1,124 @@
+# encoding:utf-8
+"""
+推理后端一致性检查与速度基准测试
+以 torch 后端的检测结果为基准，检查 onnx / openvino 后端的检测框是否一致，并对比单张延迟与批量吞吐
+用法: python benchmark_backends.py --backends torch onnx openvino --num-images 50
+一致性不满足阈值时返回非零退出码，可在导出模型后作为发布前检查
+"""
+import argparse
+import os
+import time
+import numpy as np
+import Config
+import detect_tools as tools
+from folder_detector import list_images
+from inference_backend import BACKENDS, OFFLINE_BACKENDS, load_detector
+
+
+def box_iou(boxes1, boxes2):
+    """两组 xyxy 框两两之间的 IoU，shape=(N, M)"""
+    lt = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    rb = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area1 = np.prod(boxes1[:, 2:] - boxes1[:, :2], axis=1)
+    area2 = np.prod(boxes2[:, 2:] - boxes2[:, :2], axis=1)
+    return inter / (area1[:, None] + area2[None, :] - inter + 1e-9)
+
+
+def compare_boxes(ref, other, conf, conf_tol, iou_thres):
+    """
+    比较两组检测结果 [x1, y1, x2, y2, conf, cls]
+    置信度接近阈值的框两边可能一个保留一个被过滤，只比较置信度不低于 conf + conf_tol 的框
+    :return: (需要匹配的框数, 匹配上的框数, 匹配框的最大置信度差)
+    """
+    ref = ref[ref[:, 4] >= conf + conf_tol]
+    if len(ref) == 0:
+        return 0, 0, 0.0
+    matched = 0
+    max_diff = 0.0
+    for cls in np.unique(ref[:, 5]):
+        a = ref[ref[:, 5] == cls]
+        b = other[other[:, 5] == cls]
+        if len(b) == 0:
+            continue
+        iou = box_iou(a[:, :4], b[:, :4])
+        best = iou.argmax(axis=1)
+        ok = iou[np.arange(len(a)), best] >= iou_thres
+        matched += int(ok.sum())
+        if ok.any():
+            max_diff = max(max_diff, float(np.abs(a[ok, 4] - b[best[ok], 4]).max()))
+    return len(ref), matched, max_diff
+
+
+def predict_boxes(model, images, conf):
+    return [results.boxes.data.cpu().numpy() for results in model(images, conf=conf, verbose=False)]
+
+
+def benchmark(model, images, batch_size, runs):
+    """返回 (单张推理延迟中位数 ms, 批量推理吞吐 张/秒)"""
+    latencies = []
+    for img in images[:runs]:
+        t1 = time.perf_counter()
+        model(img, verbose=False)
+        latencies.append((time.perf_counter() - t1) * 1000)
+    t1 = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        model(images[i:i + batch_size], verbose=False)
+    throughput = len(images) / (time.perf_counter() - t1)
+    return float(np.median(latencies)), throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description='推理后端一致性检查与速度基准测试')
+    parser.add_argument('--model', default=Config.model_path, help='.pt 权重路径')
+    # onnx_int8 等离线生成的后端需先运行 quantize_model.py，只在显式指定时对比
+    parser.add_argument('--backends', nargs='+', default=[b for b in BACKENDS if b not in OFFLINE_BACKENDS],
+                        choices=BACKENDS, help='对比的后端（onnx_int8 需显式指定）')
+    parser.add_argument('--images', default=os.path.join(os.path.dirname(Config.data_ymal_path), 'val', 'images'),
+                        help='测试图片文件夹')
+    parser.add_argument('--num-images', type=int, default=50, help='使用的图片数')
+    parser.add_argument('--batch-size', type=int, default=Config.batch_max_size, help='吞吐测试的批大小')
+    parser.add_argument('--runs', type=int, default=20, help='单张延迟测试次数')
+    parser.add_argument('--conf', type=float, default=0.25, help='置信度阈值')
+    parser.add_argument('--conf-tol', type=float, default=0.05, help='允许的置信度差')
+    parser.add_argument('--iou', type=float, default=0.9, help='检测框视为一致的最小IoU')
+    parser.add_argument('--min-match', type=float, default=0.98, help='要求一致的检测框比例')
+    args = parser.parse_args()
+
+    images = [img for img in map(tools.img_cvread, sorted(list_images(args.images))[:args.num_images])
+              if img is not None]
+    if not images:
+        raise SystemExit('没有可用的测试图片: {}'.format(args.images))
+
+    reference = None
+    failed = False
+    print('{:<10}{:>12}{:>14}{:>10}{:>12}'.format('backend', 'latency_ms', 'images/s', 'match', 'max_dconf'))
+    # torch 结果作为一致性基准
+    backends = ['torch'] + [b for b in args.backends if b != 'torch']
+    for backend in backends:
+        model = load_detector(args.model, backend)
+        model(images[0], verbose=False)  # 预热
+        boxes = predict_boxes(model, images, args.conf)
+        if reference is None:
+            reference = boxes
+            match_text, diff_text = '-', '-'
+        else:
+            total, matched, max_diff = 0, 0, 0.0
+            for ref, other in zip(reference, boxes):
+                n, m, d = compare_boxes(ref, other, args.conf, args.conf_tol, args.iou)
+                total, matched, max_diff = total + n, matched + m, max(max_diff, d)
+            ratio = matched / total if total else 1.0
+            failed |= ratio < args.min_match or max_diff > args.conf_tol
+            match_text, diff_text = '{:.2%}'.format(ratio), '{:.4f}'.format(max_diff)
+        if backend not in args.backends:
+            continue
+        latency, throughput = benchmark(model, images, args.batch_size, args.runs)
+        print('{:<10}{:>12.2f}{:>14.2f}{:>10}{:>12}'.format(backend, latency, throughput, match_text, diff_text))
+
+    if failed:
+        print('[WARN] 后端输出与 torch 不一致，超出阈值')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
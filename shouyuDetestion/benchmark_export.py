@@ -0,0 +1,48 @@
+# encoding:utf-8
+"""
+检测结果视频导出基准测试
+对比不同编码格式 / 推理批大小下的导出速度与原视频帧率
+用法: python benchmark_export.py --video TestFiles/xxx.mp4 --codecs XVID mp4v MJPG --batch-sizes 1 8
+"""
+import argparse
+import os
+import tempfile
+import Config
+from video_export import VideoExporter, CODECS
+from model_registry import get_model
+
+
+def result_filter(result, zhixindu):
+    conf_mask = result.boxes.conf >= zhixindu
+    result.boxes = result.boxes[conf_mask]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='视频导出基准测试')
+    parser.add_argument('--video', default=Config.test_video_path, help='测试视频')
+    parser.add_argument('--codecs', nargs='+', default=['XVID', 'mp4v', 'MJPG'], choices=sorted(CODECS),
+                        help='对比的编码格式')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8], help='对比的推理批大小，1 相当于逐帧推理')
+    parser.add_argument('--hw-accel', action='store_true', help='尝试硬件编码')
+    parser.add_argument('--conf', type=float, default=0.5, help='置信度阈值')
+    args = parser.parse_args()
+
+    model = get_model()
+
+    print('{:<8}{:>8}{:>10}{:>12}{:>12}{:>10}'.format('codec', 'batch', 'frames', 'source_fps', 'export_fps', 'x实时'))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for codec in args.codecs:
+            for batch_size in args.batch_sizes:
+                save_path = os.path.join(tmp_dir, 'export_{}_{}{}'.format(codec, batch_size, CODECS[codec]))
+                exporter = VideoExporter(model, args.video, save_path, result_filter, zhixindu=args.conf,
+                                         codec=codec, hw_accel=args.hw_accel, batch_size=batch_size)
+                exporter.run()
+                summary = exporter.summary()
+                print('{:<8}{:>8}{:>10}{:>12}{:>12}{:>10}'.format(
+                    codec, batch_size, summary['frames'], summary['source_fps'],
+                    summary['export_fps'], summary['realtime_factor']))
+
+
+if __name__ == '__main__':
+    main()
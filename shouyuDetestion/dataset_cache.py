@@ -0,0 +1,337 @@
+# encoding:utf-8
+"""
+训练数据集预处理缓存
+训练前扫描一次数据集：检查标注与图片是否对应，把图片按训练尺寸缩放后顺序写入一个可内存映射的缓存文件，
+并在清单文件中记录每张图片的哈希、文件信息与在缓存中的位置。再次训练时未变化的图片直接复用缓存，不再解码；
+训练时通过 CachedDetectionTrainer 从缓存读取图片，缓存文件由系统页缓存在各数据加载进程间共享
+用法: python dataset_cache.py --imgsz 640
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import cv2
+import numpy as np
+from ultralytics.data import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import colorstr
+from ultralytics.utils.torch_utils import de_parallel
+import Config
+import label_tools
+
+# 清单格式版本，格式变化时旧缓存全部重建
+MANIFEST_VERSION = 1
+
+
+def file_sha1(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def resize_long_side(img, imgsz):
+    """与 ultralytics 训练时加载图片的缩放方式一致：长边缩放到 imgsz，保持宽高比"""
+    h0, w0 = img.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w, h = (min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz))
+        img = cv2.resize(img, (w, h), interpolation=cv2.INTER_LINEAR)
+    return img
+
+
+def _load_resized(task):
+    """子进程中解码并缩放图片，返回 (原始高宽, 缩放后图片)"""
+    path, imgsz = task
+    # 与 ultralytics 相同的读取方式
+    img = cv2.imread(path)
+    if img is None:
+        return None, None
+    return img.shape[:2], np.ascontiguousarray(resize_long_side(img, imgsz))
+
+
+def cache_key(image_path):
+    """缓存中图片的键 <train|val>/<文件名>，不依赖 data.yaml 中的绝对路径"""
+    split = os.path.basename(os.path.dirname(os.path.dirname(image_path)))
+    return split + '/' + os.path.basename(image_path)
+
+
+def cache_paths(cache_dir, imgsz):
+    """(缓存文件路径, 清单文件路径)，不同训练尺寸各自一份"""
+    return (os.path.join(cache_dir, 'images_{}.bin'.format(imgsz)),
+            os.path.join(cache_dir, 'manifest_{}.json'.format(imgsz)))
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (ValueError, OSError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def _save_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _scan_images(dataset_dir):
+    """数据集中全部图片 {键: 路径}，按键排序"""
+    images = {}
+    for split in label_tools.SPLITS:
+        image_dir = os.path.join(dataset_dir, split, 'images')
+        if not os.path.isdir(image_dir):
+            continue
+        for file_name in sorted(os.listdir(image_dir)):
+            if os.path.splitext(file_name)[1][1:].lower() in label_tools.IMG_SUFFIX:
+                path = os.path.join(image_dir, file_name)
+                images[cache_key(path)] = path
+    return dict(sorted(images.items()))
+
+
+def prepare_dataset(dataset_dir, imgsz=640, cache_dir=None, workers=4):
+    """
+    检查标注并生成/更新图片缓存
+    :param dataset_dir: 数据集目录，包含 train / val 子目录
+    :param imgsz: 训练图片尺寸
+    :param cache_dir: 缓存目录，默认为数据集下的 cache 目录
+    :param workers: 进程数
+    :return: 统计信息 dict
+    """
+    start_time = time.time()
+    cache_dir = cache_dir or os.path.join(dataset_dir, 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    bin_path, manifest_path = cache_paths(cache_dir, imgsz)
+    old_manifest = load_manifest(manifest_path)
+    old_images = {}
+    if (old_manifest is not None and old_manifest.get('imgsz') == imgsz and os.path.exists(bin_path)
+            and os.path.getsize(bin_path) == old_manifest.get('bin_size')):
+        old_images = old_manifest['images']
+
+    # 图片哈希：文件大小与修改时间都未变时沿用清单中的哈希，不重新读取文件
+    images = {}
+    to_hash = []
+    for key, path in _scan_images(dataset_dir).items():
+        st = os.stat(path)
+        entry = {'path': path, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        old_entry = old_images.get(key)
+        if old_entry is not None and old_entry['size'] == st.st_size and old_entry['mtime_ns'] == st.st_mtime_ns:
+            entry['sha1'] = old_entry['sha1']
+        else:
+            to_hash.append(key)
+        images[key] = entry
+
+    label_tasks = label_tools.collect_tasks(dataset_dir, len(Config.names))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for key, digest in zip(to_hash, executor.map(file_sha1, [images[k]['path'] for k in to_hash])):
+            images[key]['sha1'] = digest
+        label_hashes = list(executor.map(file_sha1, [task[0] for task in label_tasks]))
+
+    # 哈希相同的图片复用旧缓存，其余重新解码；上次已确认无法读取且未变化的图片直接跳过，不触发缓存重建
+    reuse = set()
+    for key, entry in images.items():
+        old_entry = old_images.get(key)
+        if old_entry is None or old_entry['sha1'] != entry['sha1']:
+            continue
+        if 'offset' in old_entry:
+            reuse.add(key)
+        elif old_entry.get('unreadable'):
+            entry['unreadable'] = True
+    to_decode = [key for key in images if key not in reuse and not images[key].get('unreadable')]
+    old_cached = sum(1 for entry in old_images.values() if 'offset' in entry)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(label_tasks) // (workers * 8))
+        label_results = list(executor.map(label_tools.check_label_file, label_tasks, chunksize=chunksize))
+
+        if to_decode or len(reuse) != old_cached or not os.path.exists(bin_path):
+            _write_cache(bin_path, images, old_images, reuse, to_decode, imgsz, executor)
+        else:
+            for key in reuse:
+                images[key].update({k: old_images[key][k] for k in ('offset', 'shape', 'hw0')})
+
+    labels = {}
+    bad_labels = []
+    for (label_path, *_), digest, result in zip(label_tasks, label_hashes, label_results):
+        labels[os.path.relpath(label_path, dataset_dir).replace(os.sep, '/')] = {
+            'sha1': digest, 'boxes': result['boxes'], 'errors': result['errors']}
+        if result['errors']:
+            bad_labels.append(result)
+    unreadable = [entry['path'] for entry in images.values() if 'offset' not in entry]
+
+    _save_json(manifest_path, {
+        'version': MANIFEST_VERSION,
+        'imgsz': imgsz,
+        'dataset': os.path.abspath(dataset_dir),
+        'bin_size': os.path.getsize(bin_path),
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'images': images,
+        'labels': labels,
+    })
+    return {
+        'images': len(images),
+        'reused': len(reuse),
+        'decoded': len(to_decode),
+        'unreadable': unreadable,
+        'label_files': len(label_tasks),
+        'boxes': sum(result['boxes'] for result in label_results),
+        'bad_labels': bad_labels,
+        'cache_mb': round(os.path.getsize(bin_path) / (1 << 20), 1),
+        'elapsed': round(time.time() - start_time, 3),
+    }
+
+
+def _write_cache(bin_path, images, old_images, reuse, to_decode, imgsz, executor):
+    """
+    按顺序写入新的缓存文件：复用的图片从旧缓存复制，其余由进程池解码缩放
+    无法读取的图片在清单中标记 unreadable（连同哈希），文件不变时下次不再重新解码
+    """
+    old_cache = np.memmap(bin_path, dtype=np.uint8, mode='r') if reuse else None
+    decoded = executor.map(_load_resized, [(images[key]['path'], imgsz) for key in to_decode], chunksize=4)
+    to_decode_set = set(to_decode)
+    tmp_path = bin_path + '.tmp'
+    offset = 0
+    with open(tmp_path, 'wb') as f:
+        for key, entry in images.items():
+            if key in reuse:
+                old_entry = old_images[key]
+                size = int(np.prod(old_entry['shape']))
+                f.write(old_cache[old_entry['offset']:old_entry['offset'] + size])
+                shape, hw0 = old_entry['shape'], old_entry['hw0']
+            elif key in to_decode_set:
+                hw0, img = next(decoded)
+                if img is None:
+                    print('[INFO] 无法读取图片: {}'.format(entry['path']))
+                    entry['unreadable'] = True
+                    continue
+                f.write(img.data)
+                shape, size = list(img.shape), img.size
+            else:
+                # 上次已确认无法读取的图片
+                continue
+            entry.update({'offset': offset, 'shape': list(shape), 'hw0': list(hw0)})
+            offset += size
+    # Windows 下映射中的文件不能被替换，先释放旧缓存
+    del old_cache
+    os.replace(tmp_path, bin_path)
+
+
+class CachedYOLODataset(YOLODataset):
+    """优先从预处理缓存读取已缩放的图片；不在缓存中或清单生成后文件有变化的图片按原方式解码"""
+
+    def __init__(self, *args, cache_dir=None, **kwargs):
+        self._cache_bin = None
+        self._cache_images = {}
+        self._cache_array = None
+        if cache_dir is not None:
+            imgsz = kwargs.get('imgsz', 640)
+            bin_path, manifest_path = cache_paths(cache_dir, imgsz)
+            manifest = load_manifest(manifest_path)
+            if manifest is not None and manifest.get('imgsz') == imgsz and os.path.exists(bin_path):
+                self._cache_bin = bin_path
+                self._cache_images = manifest['images']
+        super().__init__(*args, **kwargs)
+
+    def __getstate__(self):
+        # 数据加载子进程中重新映射缓存文件，不随数据集对象复制
+        state = self.__dict__.copy()
+        state['_cache_array'] = None
+        return state
+
+    def _cached_image(self, image_path):
+        entry = self._cache_images.get(cache_key(image_path))
+        if entry is None or 'offset' not in entry:
+            return None
+        try:
+            st = os.stat(image_path)
+        except OSError:
+            return None
+        if st.st_size != entry['size'] or st.st_mtime_ns != entry['mtime_ns']:
+            return None
+        if self._cache_array is None:
+            self._cache_array = np.memmap(self._cache_bin, dtype=np.uint8, mode='r')
+        h, w, c = entry['shape']
+        start = entry['offset']
+        # 复制一份，数据增强会原地修改图片
+        img = np.array(self._cache_array[start:start + h * w * c]).reshape(h, w, c)
+        return img, tuple(entry['hw0'])
+
+    def load_image(self, i, rect_mode=True):
+        # 缓存中只有按长边缩放的图片
+        if self.ims[i] is not None or not rect_mode or self._cache_bin is None:
+            return super().load_image(i, rect_mode)
+        cached = self._cached_image(self.im_files[i])
+        if cached is None:
+            return super().load_image(i, rect_mode)
+        im, hw0 = cached
+        if self.augment:
+            # 与 BaseDataset.load_image 相同的马赛克增强缓冲
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, hw0, im.shape[:2]
+            self.buffer.append(i)
+            if len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+        return im, hw0, im.shape[:2]
+
+
+class CachedDetectionTrainer(DetectionTrainer):
+    """使用 CachedYOLODataset 的检测训练器，用法: model.train(..., trainer=CachedDetectionTrainer)"""
+
+    def build_dataset(self, img_path, mode='train', batch=None):
+        gs = max(int(de_parallel(self.model).stride.max() if self.model else 0), 32)
+        cfg = self.args
+        # 参数与 ultralytics.data.build_yolo_dataset 一致
+        return CachedYOLODataset(
+            img_path=img_path,
+            imgsz=cfg.imgsz,
+            batch_size=batch,
+            augment=mode == 'train',
+            hyp=cfg,
+            rect=cfg.rect or mode == 'val',
+            cache=cfg.cache or None,
+            single_cls=cfg.single_cls or False,
+            stride=int(gs),
+            pad=0.0 if mode == 'train' else 0.5,
+            prefix=colorstr(f'{mode}: '),
+            use_segments=cfg.task == 'segment',
+            use_keypoints=cfg.task == 'pose',
+            classes=cfg.classes,
+            data=self.data,
+            fraction=cfg.fraction if mode == 'train' else 1.0,
+            cache_dir=Config.dataset_cache_dir)
+
+
+def print_report(report, max_errors=20):
+    for result in report['bad_labels'][:max_errors]:
+        print('[WARN] {}: {}'.format(result['path'], '; '.join(result['errors'])))
+    for path in report['unreadable']:
+        print('[WARN] 无法读取图片: {}'.format(path))
+    print('[INFO] 图片: {}（复用缓存 {}，重新解码 {}），缓存 {} MB'.format(
+        report['images'], report['reused'], report['decoded'], report['cache_mb']))
+    print('[INFO] 标注文件: {}，检测框: {}，问题文件: {}，耗时 {}s'.format(
+        report['label_files'], report['boxes'], len(report['bad_labels']), report['elapsed']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='训练数据集预处理缓存')
+    parser.add_argument('--dataset', default=os.path.dirname(Config.data_ymal_path), help='数据集目录')
+    parser.add_argument('--imgsz', type=int, default=Config.train_imgsz, help='训练图片尺寸')
+    parser.add_argument('--cache-dir', default=Config.dataset_cache_dir, help='缓存目录')
+    parser.add_argument('--workers', type=int, default=Config.dataset_prepare_workers, help='进程数')
+    args = parser.parse_args()
+    print_report(prepare_dataset(args.dataset, args.imgsz, args.cache_dir, args.workers))
+
+
+if __name__ == '__main__':
+    main()
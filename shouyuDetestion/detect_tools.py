@@ -3,9 +3,10 @@ import cv2
 from PyQt5.QtGui import QPixmap, QImage
 import numpy as np
 from PIL import Image,ImageDraw,ImageFont
-import csv
-import os
+from functools import lru_cache
+import threading
 import Config
+from log_writer import DetectionLogWriter
 
 # fontC = ImageFont.truetype("Font/platech.ttf", 20, 0)
 
@@ -16,6 +17,72 @@ def cv_show(name,img):
 	cv2.destroyAllWindows()
 
 
+@lru_cache(maxsize=None)
+def get_font(font_path, size):
+    # 字体文件只加载一次
+    return ImageFont.truetype(font_path, size, encoding="utf-8")
+
+
+class GlyphAtlas:
+    """
+    文字字形缓存
+    每个标签文字只用PIL光栅化一次，保存为灰度透明度图，之后直接按颜色混合到numpy图像中，
+    不再对整张图片做 numpy -> PIL -> numpy 转换；透明度图与颜色无关，同一字体的所有颜色共用
+    """
+    def __init__(self, font):
+        self.font = font
+        self._glyphs = {}
+
+    def preload(self, texts):
+        for text in texts:
+            self.get(text)
+
+    def get(self, text):
+        """
+        :return: (透明度图, x偏移, y偏移)，偏移为字形相对 draw.text 绘制位置的偏移
+        """
+        glyph = self._glyphs.get(text)
+        if glyph is None:
+            left, top, right, bottom = ImageDraw.Draw(Image.new('L', (1, 1))).textbbox((0, 0), text, font=self.font)
+            mask = Image.new('L', (max(1, right - left), max(1, bottom - top)), 0)
+            ImageDraw.Draw(mask).text((-left, -top), text, 255, font=self.font)
+            glyph = (np.asarray(mask), left, top)
+            self._glyphs[text] = glyph
+        return glyph
+
+
+_atlases = {}
+
+
+def get_glyph_atlas(font):
+    """每个字体对象对应一个字形缓存，首次创建时预先光栅化所有类别名称"""
+    atlas = _atlases.get(id(font))
+    if atlas is None or atlas.font is not font:
+        atlas = GlyphAtlas(font)
+        atlas.preload(Config.CH_names)
+        _atlases[id(font)] = atlas
+    return atlas
+
+
+def blend_glyph(image, glyph, position, color):
+    """
+    把字形按颜色混合到图像中（原地修改）
+    :param position: 与 draw.text 相同的绘制位置
+    """
+    mask, left, top = glyph
+    x, y = position[0] + left, position[1] + top
+    h, w = mask.shape
+    # 裁剪超出图像的部分
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + w, image.shape[1]), min(y + h, image.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return image
+    alpha = mask[y0 - y:y1 - y, x0 - x:x1 - x, None].astype(np.float32) * (1.0 / 255)
+    roi = image[y0:y1, x0:x1]
+    roi[:] = (roi * (1.0 - alpha) + np.asarray(color, dtype=np.float32) * alpha).astype(np.uint8)
+    return image
+
+
 def drawRectBox(image, rect, addText, fontC, color):
     """
     绘制矩形框与结果
@@ -35,11 +102,25 @@ def drawRectBox(image, rect, addText, fontC, color):
     # 图片 添加的文字 位置 字体 字体大小 字体颜色 字体粗细
     # cv2.putText(image, addText, (int(rect[0])+2, int(rect[1])-3), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
 
-    img = Image.fromarray(image)
-    draw = ImageDraw.Draw(img)
-    draw.text((rect[0]+2, rect[1]-27), addText, (255, 255, 255), font=fontC)
-    imagex = np.array(img)
-    return imagex
+    # 使用缓存的字形直接混合，不再整图转换为PIL
+    glyph = get_glyph_atlas(fontC).get(addText)
+    return blend_glyph(image, glyph, (rect[0]+2, rect[1]-27), (255, 255, 255))
+
+
+def drawRectBoxes(image, locations, cls_list, fontC, colors):
+    """
+    一次绘制所有矩形框与类别名称（原地修改）
+    :param locations: 矩形框坐标列表
+    :param cls_list: 类别ID列表
+    :param colors: Colors 对象
+    """
+    atlas = get_glyph_atlas(fontC)
+    for rect, cls in zip(locations, cls_list):
+        color = colors(int(cls), True)
+        cv2.rectangle(image, (rect[0], rect[1]), (rect[2], rect[3]), color, 2)
+        cv2.rectangle(image, (rect[0] - 1, rect[1] - 25), (rect[0] + 60, rect[1]), color, -1, cv2.LINE_AA)
+        blend_glyph(image, atlas.get(Config.CH_names[int(cls)]), (rect[0]+2, rect[1]-27), (255, 255, 255))
+    return image
 
 
 def img_cvread(path):
@@ -60,12 +141,93 @@ def draw_boxes(img, boxes):
 
 
 
+# Qt 5.14 以上可直接显示BGR数据，无需颜色转换
+QIMAGE_BGR888 = getattr(QImage, 'Format_BGR888', None)
+
+
 def cvimg_to_qpiximg(cvimg):
+    height, width, depth = cvimg.shape
+    if QIMAGE_BGR888 is not None:
+        cvimg = np.ascontiguousarray(cvimg)
+        qimg = QImage(cvimg.data, width, height, width * depth, QIMAGE_BGR888)
+    else:
+        cvimg = cv2.cvtColor(cvimg, cv2.COLOR_BGR2RGB)
+        qimg = QImage(cvimg.data, width, height, width * depth, QImage.Format_RGB888)
+    qpix_img = QPixmap.fromImage(qimg)
+    return qpix_img
+
+
+def cvimg_to_qimage(cvimg):
+    # QPixmap只能在GUI线程创建，工作线程中先转换为QImage
     height, width, depth = cvimg.shape
     cvimg = cv2.cvtColor(cvimg, cv2.COLOR_BGR2RGB)
     qimg = QImage(cvimg.data, width, height, width * depth, QImage.Format_RGB888)
-    qpix_img = QPixmap(qimg)
-    return qpix_img
+    # 复制一份，避免numpy数组释放后QImage引用失效
+    return qimg.copy()
+
+
+def fit_size(shape, show_width, show_height):
+    """按显示区域等比缩放后的尺寸，只读取图像尺寸，不复制图像"""
+    img_height, img_width = shape[:2]
+    ratio = img_width / img_height
+    if ratio >= show_width / show_height:
+        return show_width, int(show_width / ratio)
+    return int(show_height * ratio), show_height
+
+
+class DisplayBuffer:
+    """
+    显示图像转换
+    缩放结果直接写入预分配的缓冲区（Qt支持BGR888时不做颜色转换），再把缓冲区包装为QImage，不额外复制；
+    缓冲区在 convert() 后处于占用状态，GUI 转换为 QPixmap 后（或该帧被新帧替换、未显示时）调用 release() 归还，
+    占用中的缓冲区不会被写入
+    """
+    def __init__(self, show_width, show_height, count=3):
+        self.show_width = show_width
+        self.show_height = show_height
+        self.count = count
+        self._size = None
+        # 可写入的缓冲区
+        self._free = []
+        # 令牌 -> 占用中的缓冲区（已交给GUI或等待GUI取走）
+        self._busy = {}
+        self._token = 0
+        # release() 在GUI线程调用
+        self._lock = threading.Lock()
+
+    def _acquire(self, width, height):
+        with self._lock:
+            if self._size != (width, height):
+                # 显示尺寸变化（切换视频源）时重新分配，占用中的旧缓冲区保留到归还
+                self._size = (width, height)
+                self._free = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(self.count)]
+            # GUI 积压导致没有空闲缓冲区时临时分配，不覆盖占用中的缓冲区
+            buf = self._free.pop() if self._free else np.empty((height, width, 3), dtype=np.uint8)
+            self._token += 1
+            self._busy[self._token] = buf
+            return self._token, buf
+
+    def release(self, token):
+        """归还 convert() 返回令牌对应的缓冲区"""
+        with self._lock:
+            buf = self._busy.pop(token, None)
+            if (buf is not None and buf.shape[:2] == (self._size[1], self._size[0])
+                    and len(self._free) < self.count):
+                self._free.append(buf)
+
+    def convert(self, img):
+        """
+        :return: (QImage, 显示宽度, 显示高度, 缓冲区令牌)
+        """
+        width, height = fit_size(img.shape, self.show_width, self.show_height)
+        token, buf = self._acquire(width, height)
+        if QIMAGE_BGR888 is not None:
+            cv2.resize(img, (width, height), dst=buf)
+            qimg = QImage(buf.data, width, height, width * 3, QIMAGE_BGR888)
+        else:
+            cv2.cvtColor(cv2.resize(img, (width, height)), cv2.COLOR_BGR2RGB, dst=buf)
+            qimg = QImage(buf.data, width, height, width * 3, QImage.Format_RGB888)
+        return qimg, width, height, token
 
 
 def save_video():
@@ -109,45 +271,38 @@ def save_video():
 
 # 封装函数:图片上显示中文
 def cv2AddChineseText(img, text, position, textColor=(0, 255, 0), textSize=50):
+    # 字体的格式（缓存，只加载一次）
+    fontStyle = get_font("simsun.ttc", textSize)
     if (isinstance(img, np.ndarray)):  # 判断是否OpenCV图片类型
-        img = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        # 使用缓存的字形直接混合到BGR图像中，textColor 为RGB
+        img = img.copy()
+        return blend_glyph(img, get_glyph_atlas(fontStyle).get(text), position, textColor[::-1])
     # 创建一个可以在给定图像上绘图的对象
     draw = ImageDraw.Draw(img)
-    # 字体的格式
-    fontStyle = ImageFont.truetype(
-        "simsun.ttc", textSize, encoding="utf-8")
     # 绘制文本
     draw.text(position, text, textColor, font=fontStyle)
     # 转换回OpenCV格式
     return cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
 
 
+_log_writers = {}
+
+
 def insert_rows(path, lines ,header):
     """
     将n行数据写入csv文件
+    同一路径复用保持打开的 DetectionLogWriter，序号由内存计数，不再每次读取整个文件
     :param path:
     :param lines:
     :return:
     """
-    no_header = False
-    if not os.path.exists(path):
-        no_header = True
-        start_num = 1
-    else:
-        start_num = len(open(path).readlines())
-
-    csv_head = header
-    with open(path, 'a', newline='') as f:
-        csv_write = csv.writer(f)
-        if no_header:
-            csv_write.writerow(csv_head)  # 写入表头
-
-        for each_list in lines:
-            # 添加序号
-            each_list = [start_num] + each_list
-            csv_write.writerow(each_list)
-            # 序号 + 1
-            start_num += 1
+    writer = _log_writers.get(path)
+    if writer is None:
+        writer = DetectionLogWriter(path, header)
+        _log_writers[path] = writer
+    writer.write_rows(lines)
+    # 保持原有行为：调用返回时数据已写入文件
+    writer.flush()
 
 class Colors:
     # 用于绘制不同颜色
@@ -173,28 +328,60 @@ class Colors:
         return tuple(int(h[1 + i:1 + i + 2], 16) for i in (0, 2, 4))
 
 
+def read_yolo_labels(yolo_file_path):
+    """
+    一次读取整个YOLO标注文件
+    :return: (类别数组 shape=(N,), 归一化坐标数组 shape=(N, 4) [x_, y_, w_, h_])
+    """
+    with open(yolo_file_path, 'r') as f:
+        values = np.array(f.read().split(), dtype=np.float64)
+    if values.size % 5:
+        raise ValueError('标注文件格式错误（每行应为5个数）: {}'.format(yolo_file_path))
+    data = values.reshape(-1, 5)
+    return data[:, 0].astype(np.int64), data[:, 1:]
+
+
+def write_yolo_labels(yolo_file_path, cls_array, yolo_array, decimals=6):
+    """把类别与归一化坐标数组写为YOLO标注文件，只在写文件时做一次格式化"""
+    cls_array = np.asarray(cls_array, dtype=np.int64).reshape(-1, 1)
+    yolo_array = np.asarray(yolo_array, dtype=np.float64).reshape(-1, 4)
+    fmt = ['%d'] + ['%.{}f'.format(decimals)] * 4
+    np.savetxt(yolo_file_path, np.hstack([cls_array, yolo_array]), fmt=fmt)
+
+
+def yolo_to_locations(w, h, yolo_array):
+    """
+    YOLO归一化坐标批量转两点坐标
+    :param yolo_array: shape=(N, 4) [x_, y_, w_, h_]
+    :return: int 数组 shape=(N, 4) [x1, y1, x2, y2]，与逐个 int() 一样向零取整
+    """
+    yolo_array = np.asarray(yolo_array, dtype=np.float64).reshape(-1, 4)
+    scale = np.array([w, h], dtype=np.float64)
+    center = scale * yolo_array[:, :2]
+    half = 0.5 * scale * yolo_array[:, 2:]
+    return np.hstack([center - half, center + half]).astype(np.int64)
+
+
+def locations_to_yolo(w, h, locations):
+    """
+    两点坐标批量转YOLO归一化坐标
+    :param locations: shape=(N, 4) [x1, y1, x2, y2]
+    :return: float 数组 shape=(N, 4) [x_, y_, w_, h_]
+    """
+    locations = np.asarray(locations, dtype=np.float64).reshape(-1, 4)
+    scale = np.array([w, h], dtype=np.float64)
+    center = (locations[:, :2] + locations[:, 2:]) / 2 / scale
+    size = (locations[:, 2:] - locations[:, :2]) / scale
+    return np.hstack([center, size])
+
+
 def yolo_to_location(w,h,yolo_data):
     # yolo文件转两点坐标，注意画图坐标要转换成int格式
-    x_, y_, w_, h_ = yolo_data
-    x1 = int(w * x_ - 0.5 * w * w_)
-    x2 = int(w * x_ + 0.5 * w * w_)
-    y1 = int(h * y_ - 0.5 * h * h_)
-    y2 = int(h * y_ + 0.5 * h * h_)
-    # cv2.rectangle(img, (int(x1), int(y1)), (int(x2), int(y2)), (255, 0, 0))
-    return [x1,y1,x2,y2]
+    return yolo_to_locations(w, h, yolo_data)[0].tolist()
 
 def location_to_yolo(w, h, locations):
-    # x1,y1左上角坐标，x2,y2右上角坐标
-    x1, y1, x2, y2 = locations
-    x_ = (x1 + x2) / 2 / w
-    x_ = float('%.5f' % x_)
-    y_ = (y1 + y2) / 2 / h
-    y_ = float('%.5f' % y_)
-    w_ = (x2 - x1) / w
-    w_ = float('%.5f' % w_)
-    h_ = (y2 - y1) / h
-    h_ = float('%.5f' % h_)
-    return [x_,y_,w_,h_]
+    # x1,y1左上角坐标，x2,y2右上角坐标，结果保留5位小数
+    return [round(v, 5) for v in locations_to_yolo(w, h, locations)[0].tolist()]
 
 def draw_yolo_data(img_path, yolo_file_path):
     # 读取yolo标注数据并显示
@@ -202,16 +389,11 @@ def draw_yolo_data(img_path, yolo_file_path):
     h, w, _ = img.shape
     print(img.shape)
     # yolo标注数据文件名为786_rgb_0616.txt
-    with open(yolo_file_path, 'r') as f:
-        data = f.readlines()
-        for each in data:
-            temp = each.split()
-            # ['1', '0.43906', '0.52083', '0.34687', '0.15']
-            # YOLO转换为两点坐标x1, x2, y1, y2
-            x_, y_, w_, h_ = eval(temp[1]), eval(temp[2]), eval(temp[3]), eval(temp[4])
-            x1, y1, x2, y2 = yolo_to_location(w,h,[x_, y_, w_, h_])
-            # 画图验证框是否正确
-            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255))
+    # 每行如 1 0.43906 0.52083 0.34687 0.15，整个文件一次转换为两点坐标x1, y1, x2, y2
+    _, yolo_array = read_yolo_labels(yolo_file_path)
+    for x1, y1, x2, y2 in yolo_to_locations(w, h, yolo_array).tolist():
+        # 画图验证框是否正确
+        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255))
 
     cv2.imshow('windows', img)
     cv2.waitKey(0)
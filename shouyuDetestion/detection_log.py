@@ -0,0 +1,119 @@
+# encoding:utf-8
+"""
+检测结果记录表格模型
+长时间视频/摄像头检测时表格行数不再无限增长：只在内存环形缓冲区中保留最近 capacity 条记录，
+新记录先暂存，由界面定时器统一批量插入；可选把全部记录追加写入CSV/Parquet文件保存完整历史
+"""
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+import Config
+from log_writer import DetectionLogWriter
+
+HEADERS = ['序号', '文件路径', '类别', '置信度', '坐标位置']
+# 居中显示的列: 序号、类别、置信度
+CENTER_COLUMNS = (0, 2, 3)
+
+
+class DetectionLogModel(QAbstractTableModel):
+    def __init__(self, capacity=5000, spill_path=None, spill_format='csv', parent=None):
+        """
+        :param capacity: 表格中保留的最大记录数，超出后丢弃最早的记录
+        :param spill_path: 完整历史的保存路径，为 None 时不写文件
+        :param spill_format: 完整历史的文件格式 csv / parquet
+        """
+        super(DetectionLogModel, self).__init__(parent)
+        self.capacity = max(1, int(capacity))
+        # 每条记录为 (序号, 路径, 类别ID, 置信度文本, 坐标) 元组，显示时再格式化
+        # 预分配的环形缓冲区，第 row 行位于 (_head + row) % capacity，按行读取为 O(1)
+        self._rows = [None] * self.capacity
+        self._head = 0
+        self._count = 0
+        self._pending = []
+        self._total = 0
+        self._spill_writer = None
+        if spill_path is not None:
+            # 每次界面刷新都会写入，无需再按行数凑批
+            self._spill_writer = DetectionLogWriter(spill_path, HEADERS, fmt=spill_format, encoding='utf-8')
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            seq, path, cls, conf, location = self._rows[(self._head + index.row()) % self.capacity]
+            column = index.column()
+            if column == 0:
+                return str(seq)
+            if column == 1:
+                return str(path)
+            if column == 2:
+                return str(Config.CH_names[cls])
+            if column == 3:
+                return str(conf)
+            return str(list(location))
+        if role == Qt.TextAlignmentRole and index.column() in CENTER_COLUMNS:
+            return int(Qt.AlignHCenter | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return None
+
+    def append(self, locations, clses, confs, path=None):
+        """暂存一帧/一张图片的检测结果，调用 flush() 后才显示"""
+        for location, cls, conf in zip(locations, clses, confs):
+            self._total += 1
+            self._pending.append((self._total, path, int(cls), conf, tuple(location)))
+
+    def flush(self):
+        """把暂存的记录批量插入表格，返回是否有新记录"""
+        if not self._pending:
+            return False
+        pending, self._pending = self._pending, []
+        self._spill(pending)
+
+        # 超过容量的部分直接丢弃，不进入表格
+        if len(pending) > self.capacity:
+            pending = pending[-self.capacity:]
+        overflow = self._count + len(pending) - self.capacity
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            self._head = (self._head + overflow) % self.capacity
+            self._count -= overflow
+            self.endRemoveRows()
+
+        start = self._count
+        self.beginInsertRows(QModelIndex(), start, start + len(pending) - 1)
+        for i, row in enumerate(pending):
+            self._rows[(self._head + start + i) % self.capacity] = row
+        self._count += len(pending)
+        self.endInsertRows()
+        return True
+
+    def clear(self):
+        """清空表格，序号重新从1开始"""
+        self.beginResetModel()
+        self._rows = [None] * self.capacity
+        self._head = 0
+        self._count = 0
+        self._pending = []
+        self._total = 0
+        self.endResetModel()
+
+    def _spill(self, rows):
+        if self._spill_writer is None:
+            return
+        # 历史文件的序号由写入器持续计数，不随表格清空重置
+        self._spill_writer.write_rows(
+            [path, Config.CH_names[cls], conf, list(location)] for _, path, cls, conf, location in rows)
+        self._spill_writer.flush()
+
+    def close(self):
+        """关闭历史记录文件"""
+        if self._spill_writer is not None:
+            self._spill_writer.close()
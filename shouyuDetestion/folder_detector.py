@@ -0,0 +1,150 @@
+# encoding:utf-8
+"""
+图片文件夹批量检测
+线程池并行解码图片（每张只解码一次），按批运行YOLO推理，检测结果按固定间隔汇总后发送给界面
+"""
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from PyQt5.QtCore import QThread, pyqtSignal
+import detect_tools as tools
+
+IMG_SUFFIX = ['jpg', 'png', 'jpeg', 'bmp']
+
+
+def list_images(directory):
+    """文件夹中的图片文件路径"""
+    paths = []
+    for file_name in os.listdir(directory):
+        full_path = os.path.join(directory, file_name)
+        if os.path.isfile(full_path) and file_name.split('.')[-1].lower() in IMG_SUFFIX:
+            paths.append(full_path)
+    return paths
+
+
+class FolderDetectThread(QThread):
+    """
+    文件夹检测线程
+    update_ui_signal(items, stats): items 为本次汇总的各图片检测结果，最后一张附带绘制好的显示图片；
+    stats 为进度与速度 {'done', 'total', 'elapsed', 'images_per_sec', 'finished'}
+    """
+    update_ui_signal = pyqtSignal(list, dict)
+
+    def __init__(self, directory, model, result_filter, conf_getter, show_size,
+                 batch_size=8, decode_workers=4, update_interval_ms=100):
+        """
+        :param directory: 图片文件夹
+        :param model: YOLO模型，线程运行期间只在本线程中使用
+        :param result_filter: 置信度过滤函数 (results, conf) -> results
+        :param conf_getter: 返回当前置信度阈值
+        :param show_size: 显示区域尺寸 (width, height)
+        :param batch_size: 单次推理的图片数
+        :param decode_workers: 解码图片的线程数
+        :param update_interval_ms: 向界面发送结果的最小间隔
+        """
+        super(FolderDetectThread, self).__init__()
+        self.directory = directory
+        self.model = model
+        self.result_filter = result_filter
+        self.conf_getter = conf_getter
+        self.show_size = show_size
+        self.batch_size = max(1, int(batch_size))
+        self.decode_workers = max(1, int(decode_workers))
+        self.update_interval = update_interval_ms / 1000.0
+        self.is_running = True
+
+    def stop(self):
+        self.is_running = False
+
+    def _decoded_images(self, paths, executor):
+        """按顺序产出 (路径, 图片)，最多提前解码两批，避免整个文件夹一次性读入内存"""
+        in_flight = deque()
+        path_iter = iter(paths)
+        for path in path_iter:
+            in_flight.append((path, executor.submit(tools.img_cvread, path)))
+            if len(in_flight) >= self.batch_size * 2:
+                break
+        while in_flight and self.is_running:
+            path, future = in_flight.popleft()
+            next_path = next(path_iter, None)
+            if next_path is not None:
+                in_flight.append((next_path, executor.submit(tools.img_cvread, next_path)))
+            yield path, future.result()
+
+    def _batches(self, paths, executor):
+        batch = []
+        for path, img in self._decoded_images(paths, executor):
+            if img is None:
+                print('[INFO] 无法读取图片: {}'.format(path))
+                continue
+            batch.append((path, img))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def run(self):
+        paths = list_images(self.directory)
+        total = len(paths)
+        done = 0
+        pending = []
+        start_time = time.time()
+        last_emit = start_time
+
+        with ThreadPoolExecutor(max_workers=self.decode_workers) as executor:
+            for batch in self._batches(paths, executor):
+                if not self.is_running:
+                    break
+                t1 = time.time()
+                results_list = self.model([img for _, img in batch])
+                infer_time = (time.time() - t1) / len(batch)
+                conf = self.conf_getter()
+                for (path, _), results in zip(batch, results_list):
+                    results = self.result_filter(results, conf)
+                    pending.append({
+                        'path': path,
+                        'results': results,
+                        'conf': conf,
+                        'infer_time': infer_time,
+                    })
+                done += len(batch)
+
+                now = time.time()
+                if now - last_emit >= self.update_interval:
+                    last_emit = now
+                    self._emit(pending, done, total, start_time, finished=False)
+                    pending = []
+
+        self._emit(pending, done, total, start_time, finished=True)
+
+    def _emit(self, items, done, total, start_time, finished):
+        """整理检测结果后发送给界面，只为最后一张图片绘制显示图"""
+        for item in items:
+            results = item['results']
+            item['location_list'] = [list(map(int, e)) for e in results.boxes.xyxy.tolist()]
+            item['cls_list'] = [int(i) for i in results.boxes.cls.tolist()]
+            item['conf_list'] = ['%.2f %%' % (each * 100) for each in results.boxes.conf.tolist()]
+            # 检测框原始数据 [x1, y1, x2, y2, conf, cls]，保存结果时无需重新推理
+            item['boxes'] = results.boxes.data.cpu().numpy()
+        if items:
+            last = items[-1]
+            draw_img = last['results'].plot()
+            img_width, img_height = tools.fit_size(draw_img.shape, *self.show_size)
+            last['draw_img'] = draw_img
+            last['qimg'] = tools.cvimg_to_qimage(cv2.resize(draw_img, (img_width, img_height)))
+            last['img_width'], last['img_height'] = img_width, img_height
+            # 只保留最后一张的完整结果（下拉框切换目标时使用），其余释放原图内存
+            for item in items[:-1]:
+                item.pop('results')
+        elapsed = time.time() - start_time
+        stats = {
+            'done': done,
+            'total': total,
+            'elapsed': round(elapsed, 3),
+            'images_per_sec': round(done / elapsed, 2) if elapsed > 0 else 0,
+            'finished': finished,
+        }
+        self.update_ui_signal.emit(items, stats)
@@ -0,0 +1,139 @@
+# encoding:utf-8
+"""
+视频抽帧检测
+手语视频相邻帧高度相似，只在画面发生明显变化的帧上运行检测，其余帧沿用上一次的检测框
+"""
+import cv2
+import Config
+
+# 抽帧模式: all 每帧检测; stride 固定间隔检测; adaptive 根据帧差自适应检测
+SAMPLE_MODES = ('all', 'stride', 'adaptive')
+
+
+class FrameSampler:
+    def __init__(self, mode='all', stride=3, threshold=0.08, max_skip=15, thumb_size=(64, 36)):
+        """
+        :param mode: 抽帧模式，见 SAMPLE_MODES
+        :param stride: stride 模式下每隔多少帧检测一次
+        :param threshold: adaptive 模式下触发检测的帧差阈值（0~1，缩略灰度图的平均绝对差）
+        :param max_skip: adaptive 模式下最多连续跳过的帧数
+        :param thumb_size: 计算帧差使用的缩略图尺寸
+        """
+        if mode not in SAMPLE_MODES:
+            raise ValueError('不支持的抽帧模式: {}'.format(mode))
+        self.mode = mode
+        self.stride = max(1, int(stride))
+        self.threshold = float(threshold)
+        self.max_skip = max(1, int(max_skip))
+        self.thumb_size = thumb_size
+
+        self.frames_total = 0
+        self.frames_detected = 0
+        self._since_detect = 0
+        self._key_thumb = None
+
+        # 与逐帧检测的对比统计
+        self._eval_frames = 0
+        self._eval_matched = 0
+        self._eval_propagated = 0
+        self._eval_actual = 0
+
+    @classmethod
+    def from_config(cls, mode=None, stride=None, threshold=None):
+        """使用 Config 中的默认参数创建，传入的参数优先"""
+        return cls(mode=Config.video_sample_mode if mode is None else mode,
+                   stride=Config.video_sample_stride if stride is None else stride,
+                   threshold=Config.video_sample_threshold if threshold is None else threshold,
+                   max_skip=Config.video_sample_max_skip)
+
+    def _thumb(self, frame):
+        small = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def should_detect(self, frame):
+        """判断当前帧是否需要运行检测，需按帧顺序调用"""
+        self.frames_total += 1
+        thumb = None
+        if self.mode == 'all' or self.frames_detected == 0:
+            detect = True
+        elif self.mode == 'stride':
+            detect = self._since_detect + 1 >= self.stride
+        else:
+            # 与上一个检测帧比较缩略灰度图的平均绝对差
+            thumb = self._thumb(frame)
+            detect = (self._since_detect + 1 >= self.max_skip or
+                      cv2.absdiff(thumb, self._key_thumb).mean() / 255.0 >= self.threshold)
+
+        if detect:
+            if self.mode == 'adaptive':
+                self._key_thumb = thumb if thumb is not None else self._thumb(frame)
+            self.frames_detected += 1
+            self._since_detect = 0
+        else:
+            self._since_detect += 1
+        return detect
+
+    def record_comparison(self, propagated_result, full_result, iou_threshold=0.5):
+        """
+        记录跳过帧上沿用的检测框与实际逐帧检测结果的差异
+        :param propagated_result: 沿用的检测结果
+        :param full_result: 对该帧实际运行检测的结果
+        """
+        prop_boxes = propagated_result.boxes.xyxy.tolist()
+        prop_cls = propagated_result.boxes.cls.tolist()
+        full_boxes = full_result.boxes.xyxy.tolist()
+        full_cls = full_result.boxes.cls.tolist()
+
+        matched = 0
+        used = set()
+        for box, cls in zip(full_boxes, full_cls):
+            best_iou, best_idx = 0.0, None
+            for idx, (p_box, p_cls) in enumerate(zip(prop_boxes, prop_cls)):
+                if idx in used or int(p_cls) != int(cls):
+                    continue
+                iou = box_iou(box, p_box)
+                if iou > best_iou:
+                    best_iou, best_idx = iou, idx
+            if best_idx is not None and best_iou >= iou_threshold:
+                used.add(best_idx)
+                matched += 1
+
+        self._eval_frames += 1
+        self._eval_matched += matched
+        self._eval_propagated += len(prop_boxes)
+        self._eval_actual += len(full_boxes)
+
+    def report(self):
+        """抽帧统计，若记录过对比数据则附带与逐帧检测的准确率差异"""
+        skipped = self.frames_total - self.frames_detected
+        report = {
+            'mode': self.mode,
+            'frames_total': self.frames_total,
+            'frames_detected': self.frames_detected,
+            'frames_skipped': skipped,
+            'skip_ratio': round(skipped / self.frames_total, 4) if self.frames_total else 0,
+        }
+        if self._eval_frames:
+            precision = self._eval_matched / self._eval_propagated if self._eval_propagated else 1.0
+            recall = self._eval_matched / self._eval_actual if self._eval_actual else 1.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            report['accuracy_vs_full'] = {
+                'frames_compared': self._eval_frames,
+                'precision': round(precision, 4),
+                'recall': round(recall, 4),
+                'f1': round(f1, 4),
+                # 相比逐帧检测的准确率损失
+                'f1_delta': round(f1 - 1.0, 4),
+            }
+        return report
+
+
+def box_iou(box1, box2):
+    """两个 [x1, y1, x2, y2] 框的交并比"""
+    ix1, iy1 = max(box1[0], box2[0]), max(box1[1], box2[1])
+    ix2, iy2 = min(box1[2], box2[2]), min(box1[3], box2[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    area1 = (box1[2] - box1[0]) * (box1[3] - box1[1])
+    area2 = (box2[2] - box2[0]) * (box2[3] - box2[1])
+    union = area1 + area2 - inter
+    return inter / union if union > 0 else 0.0
@@ -1,5 +1,5 @@
 #coding:utf-8
-from ultralytics import YOLO
+from model_registry import get_model
 import cv2
 import Config
 # 所需加载的模型目录
@@ -10,7 +10,7 @@ img_path = Config.test_image_path
 # 加载预训练模型
 # conf	0.25	object confidence threshold for detection
 # iou	0.7	intersection over union (IoU) threshold for NMS
-model = YOLO(path, task='detect')
+model = get_model(path)
 # model = YOLO(path, task='detect',conf=0.5)
 
 
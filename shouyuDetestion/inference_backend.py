@@ -0,0 +1,73 @@
+# encoding:utf-8
+"""
+检测模型推理后端
+torch 直接加载 .pt 权重；onnx（ONNX Runtime）与 openvino 加载由 .pt 导出的模型，适合只有CPU的部署环境；
+onnx_int8 加载 quantize_model.py 生成并通过精度检查的INT8量化模型。
+各后端都通过 ultralytics 的 YOLO 加载，返回的检测结果格式相同，调用方无需区分
+"""
+import os
+from ultralytics import YOLO
+import Config
+
+BACKENDS = ('torch', 'onnx', 'openvino', 'onnx_int8')
+# 需要校准与精度检查，不能在加载时自动生成的后端
+OFFLINE_BACKENDS = ('onnx_int8',)
+
+
+def backend_artifact_path(model_path, backend):
+    """后端对应的模型文件路径（与 ultralytics 导出时的命名一致）"""
+    if backend not in BACKENDS:
+        raise ValueError('不支持的推理后端: {}'.format(backend))
+    stem = os.path.splitext(model_path)[0]
+    if backend == 'onnx':
+        return stem + '.onnx'
+    if backend == 'openvino':
+        return stem + '_openvino_model'
+    if backend == 'onnx_int8':
+        return stem + '_int8.onnx'
+    return model_path
+
+
+def export_backend(model_path, backend, imgsz=640):
+    """
+    把 .pt 权重导出为指定后端的模型，返回导出路径
+    导出为动态输入尺寸，批量推理（微批处理、文件夹检测、视频导出）可以使用任意批大小
+    """
+    if backend == 'torch':
+        return model_path
+    if backend in OFFLINE_BACKENDS:
+        raise ValueError('{} 模型需要运行 quantize_model.py 生成'.format(backend))
+    model = YOLO(model_path, task='detect')
+    print('[INFO] 导出 {} 模型: {}'.format(backend, model_path))
+    return model.export(format=backend, imgsz=imgsz, dynamic=True)
+
+
+def _is_stale(artifact_path, model_path):
+    """导出的模型是否早于 .pt 权重（权重更新后需要重新导出）"""
+    if not os.path.exists(model_path):
+        return False
+    return os.path.getmtime(artifact_path) < os.path.getmtime(model_path)
+
+
+def load_detector(model_path=None, backend=None, export_missing=True, imgsz=640):
+    """
+    按配置的后端加载检测模型
+    :param model_path: .pt 权重路径，默认 Config.model_path
+    :param backend: torch / onnx / openvino / onnx_int8，默认 Config.inference_backend
+    :param export_missing: 导出的模型不存在或早于权重时是否自动导出
+    :param imgsz: 导出时的输入尺寸
+    :return: YOLO 模型
+    """
+    model_path = model_path or Config.model_path
+    backend = backend or Config.inference_backend
+    artifact_path = backend_artifact_path(model_path, backend)
+    if backend in OFFLINE_BACKENDS:
+        if not os.path.exists(artifact_path):
+            raise FileNotFoundError('{} 模型不存在，请先运行 quantize_model.py: {}'.format(backend, artifact_path))
+        if _is_stale(artifact_path, model_path):
+            print('[WARN] {} 模型早于权重文件，建议重新运行 quantize_model.py'.format(backend))
+    elif backend != 'torch' and (not os.path.exists(artifact_path) or _is_stale(artifact_path, model_path)):
+        if not export_missing:
+            raise FileNotFoundError('{} 模型不存在或已过期: {}'.format(backend, artifact_path))
+        artifact_path = export_backend(model_path, backend, imgsz)
+    return YOLO(artifact_path, task='detect')
@@ -0,0 +1,151 @@
+# encoding:utf-8
+"""
+YOLO数据集标注批量检查与转换
+多进程遍历 datasets/<项目名>_DATASET 下 train / val 的全部标注文件，每个文件整体读入后用NumPy数组一次完成检查与转换：
+类别是否越界、坐标是否在 [0, 1] 内、宽高是否为正、是否有重复框、是否有对应图片；可选导出两点像素坐标
+用法: python label_tools.py --dataset datasets/shouyushibie_DATASET --export-xyxy save_data/labels_xyxy
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+import Config
+import detect_tools as tools
+
+SPLITS = ('train', 'val')
+IMG_SUFFIX = ['jpg', 'png', 'jpeg', 'bmp']
+# labelImg 保存的类别名文件，不是标注文件
+CLASSES_FILE = 'classes.txt'
+# 坐标越界的容差，标注工具保存时可能有舍入误差
+EPS = 1e-6
+
+
+def find_image(image_dir, stem):
+    """标注文件对应的图片路径，不存在时返回 None"""
+    for suffix in IMG_SUFFIX:
+        for name in (stem + '.' + suffix, stem + '.' + suffix.upper()):
+            path = os.path.join(image_dir, name)
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def check_label_file(task):
+    """
+    检查（并转换）单个标注文件，在子进程中运行
+    :param task: (标注文件路径, 图片文件夹, 类别数, 两点坐标导出文件路径或None)
+    :return: {'path', 'boxes', 'errors'}
+    """
+    label_path, image_dir, nc, export_path = task
+    result = {'path': label_path, 'boxes': 0, 'errors': []}
+    errors = result['errors']
+    try:
+        cls_array, yolo_array = tools.read_yolo_labels(label_path)
+    except ValueError as e:
+        errors.append(str(e))
+        return result
+    result['boxes'] = len(cls_array)
+
+    bad_cls = (cls_array < 0) | (cls_array >= nc)
+    if bad_cls.any():
+        errors.append('类别越界: {}'.format(sorted(set(cls_array[bad_cls].tolist()))))
+    if ((yolo_array < -EPS) | (yolo_array > 1 + EPS)).any():
+        errors.append('坐标不在[0, 1]范围内')
+    if (yolo_array[:, 2:] <= 0).any():
+        errors.append('存在宽或高不为正的框')
+    # 框的边界超出图片
+    half = yolo_array[:, 2:] / 2
+    if ((yolo_array[:, :2] - half < -EPS) | (yolo_array[:, :2] + half > 1 + EPS)).any():
+        errors.append('存在超出图片边界的框')
+    if len(cls_array) > 1:
+        rows = np.hstack([cls_array.reshape(-1, 1), np.round(yolo_array, 6)])
+        duplicates = len(rows) - len(np.unique(rows, axis=0))
+        if duplicates:
+            errors.append('重复框 {} 个'.format(duplicates))
+
+    stem = os.path.splitext(os.path.basename(label_path))[0]
+    image_path = find_image(image_dir, stem)
+    if image_path is None:
+        errors.append('缺少对应图片')
+    elif export_path is not None:
+        # 只读取图片文件头获取尺寸，不解码整张图片
+        with Image.open(image_path) as img:
+            w, h = img.size
+        locations = tools.yolo_to_locations(w, h, yolo_array)
+        np.savetxt(export_path, np.hstack([cls_array.reshape(-1, 1), locations]), fmt='%d')
+    return result
+
+
+def collect_tasks(dataset_dir, nc, export_dir=None):
+    tasks = []
+    for split in SPLITS:
+        label_dir = os.path.join(dataset_dir, split, 'labels')
+        image_dir = os.path.join(dataset_dir, split, 'images')
+        if not os.path.isdir(label_dir):
+            print('[INFO] 跳过不存在的目录: {}'.format(label_dir))
+            continue
+        split_export = None
+        if export_dir is not None:
+            split_export = os.path.join(export_dir, split)
+            os.makedirs(split_export, exist_ok=True)
+        for file_name in sorted(os.listdir(label_dir)):
+            if not file_name.endswith('.txt') or file_name == CLASSES_FILE:
+                continue
+            export_path = os.path.join(split_export, file_name) if split_export is not None else None
+            tasks.append((os.path.join(label_dir, file_name), image_dir, nc, export_path))
+    return tasks
+
+
+def count_unlabeled_images(dataset_dir):
+    """没有标注文件的图片数（YOLO视为背景图片，仅提示）"""
+    count = 0
+    for split in SPLITS:
+        image_dir = os.path.join(dataset_dir, split, 'images')
+        label_dir = os.path.join(dataset_dir, split, 'labels')
+        if not os.path.isdir(image_dir):
+            continue
+        for file_name in os.listdir(image_dir):
+            stem, ext = os.path.splitext(file_name)
+            if ext[1:].lower() in IMG_SUFFIX and not os.path.exists(os.path.join(label_dir, stem + '.txt')):
+                count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='YOLO数据集标注检查与转换')
+    parser.add_argument('--dataset', default=os.path.join('datasets', Config.pro_name + '_DATASET'),
+                        help='数据集目录，包含 train / val 子目录')
+    parser.add_argument('--nc', type=int, default=len(Config.names), help='类别数')
+    parser.add_argument('--export-xyxy', default=None,
+                        help='导出两点像素坐标标注（每行: 类别 x1 y1 x2 y2）的目录，不指定时只检查')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='进程数')
+    parser.add_argument('--max-errors', type=int, default=20, help='最多打印的问题文件数')
+    args = parser.parse_args()
+
+    tasks = collect_tasks(args.dataset, args.nc, args.export_xyxy)
+    start_time = time.time()
+    total_boxes = 0
+    bad_files = []
+    # 单个文件很小，按块分发给子进程以减少进程间通信
+    chunksize = max(1, len(tasks) // (max(1, args.workers) * 8))
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for result in executor.map(check_label_file, tasks, chunksize=chunksize):
+            total_boxes += result['boxes']
+            if result['errors']:
+                bad_files.append(result)
+    elapsed = time.time() - start_time
+
+    for result in bad_files[:args.max_errors]:
+        print('[WARN] {}: {}'.format(result['path'], '; '.join(result['errors'])))
+    if len(bad_files) > args.max_errors:
+        print('[WARN] ... 另有 {} 个问题文件未列出'.format(len(bad_files) - args.max_errors))
+    print('[INFO] 标注文件: {}，检测框: {}，问题文件: {}，无标注图片: {}'.format(
+        len(tasks), total_boxes, len(bad_files), count_unlabeled_images(args.dataset)))
+    print('[INFO] 耗时 {:.3f}s，{:.0f} boxes/s'.format(elapsed, total_boxes / elapsed if elapsed > 0 else 0))
+    return 1 if bad_files else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
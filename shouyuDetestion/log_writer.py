@@ -0,0 +1,147 @@
+# encoding:utf-8
+"""
+检测记录追加写入
+文件句柄保持打开，序号计数保存在内存中，并在旁路索引文件（<文件名>.idx）中记录，重启后无需重新读取整个文件；
+记录先缓存，凑满一批后再写入。可选写为 Parquet 列式文件（需要安装 pyarrow）
+"""
+import csv
+import json
+import os
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+LOG_FORMATS = ('csv', 'parquet')
+# Parquet 列类型
+COLUMN_TYPES = ('string', 'float', 'int')
+
+
+class DetectionLogWriter:
+    def __init__(self, path, header, fmt='csv', flush_rows=100, encoding=None, column_types=None):
+        """
+        :param path: 记录文件路径
+        :param header: 表头，第一列为序号（序号自动生成）
+        :param fmt: csv 或 parquet
+        :param flush_rows: 缓存达到多少行时写入文件
+        :param encoding: CSV文件编码，默认使用系统编码（与原 insert_rows 一致）
+        :param column_types: Parquet 列类型 {列名: string / float / int}，默认序号为 int，其余为 string
+        """
+        if fmt not in LOG_FORMATS:
+            raise ValueError('不支持的记录格式: {}'.format(fmt))
+        if fmt == 'parquet' and pa is None:
+            raise ImportError('写入Parquet需要安装pyarrow')
+        self.path = path
+        self.header = list(header)
+        self.column_types = {name: 'string' for name in self.header[1:]}
+        self.column_types[self.header[0]] = 'int'
+        self.column_types.update(column_types or {})
+        for name, col_type in self.column_types.items():
+            if name not in self.header or col_type not in COLUMN_TYPES:
+                raise ValueError('不支持的列类型: {}={}'.format(name, col_type))
+        self._schema = None
+        self.fmt = fmt
+        self.flush_rows = max(1, int(flush_rows))
+        self.encoding = encoding
+        self.index_path = path + '.idx'
+        self._buffer = []
+        self._opened = False
+        self._file = None
+        self._writer = None
+        self.next_num = self._recover_counter()
+
+    def _recover_counter(self):
+        """从索引文件恢复下一个序号；索引与文件大小不一致时（如异常退出）才重新统计行数"""
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if self.fmt == 'parquet' or (os.path.exists(self.path) and
+                                             os.path.getsize(self.path) == index['size']):
+                    return index['next_num']
+            except (ValueError, KeyError, OSError):
+                pass
+        if self.fmt == 'csv' and os.path.exists(self.path):
+            with open(self.path, 'r', newline='', encoding=self.encoding) as f:
+                # 扣除表头
+                return max(1, sum(1 for _ in f))
+        return 1
+
+    def _save_index(self):
+        size = os.path.getsize(self.path) if self.fmt == 'csv' else 0
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'next_num': self.next_num, 'size': size}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _open(self):
+        save_dir = os.path.dirname(self.path)
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+        if self.fmt == 'csv':
+            no_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self._file = open(self.path, 'a', newline='', encoding=self.encoding)
+            self._writer = csv.writer(self._file)
+            if no_header:
+                self._writer.writerow(self.header)  # 写入表头
+        else:
+            # Parquet 文件不能追加，已存在时本次运行写入新文件
+            if os.path.exists(self.path):
+                name, ext = os.path.splitext(self.path)
+                self.path = '{}_{}{}'.format(name, time.strftime('%Y%m%d%H%M%S'), ext)
+        self._opened = True
+
+    def write_rows(self, lines):
+        """追加多行记录（不含序号），缓存满 flush_rows 行时写入"""
+        for each_list in lines:
+            self._buffer.append([self.next_num] + list(each_list))
+            self.next_num += 1
+        if len(self._buffer) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        if not self._opened:
+            self._open()
+        rows, self._buffer = self._buffer, []
+        if self.fmt == 'csv':
+            self._writer.writerows(rows)
+            self._file.flush()
+        else:
+            self._write_parquet(rows)
+        self._save_index()
+
+    def parquet_schema(self):
+        """按表头与列类型构造固定的 Parquet schema，不依赖第一批数据推断（整列为空时会被推断为 null 类型）"""
+        if self._schema is None:
+            arrow_types = {'string': pa.string(), 'float': pa.float64(), 'int': pa.int64()}
+            self._schema = pa.schema([(name, arrow_types[self.column_types[name]]) for name in self.header])
+        return self._schema
+
+    def _write_parquet(self, rows):
+        converters = {'string': str, 'float': float, 'int': int}
+        columns = {}
+        for i, name in enumerate(self.header):
+            convert = converters[self.column_types[name]]
+            # 列表等复杂类型转为字符串，None 保留为空值
+            columns[name] = [None if row[i] is None else convert(row[i]) for row in rows]
+        schema = self.parquet_schema()
+        table = pa.table(columns, schema=schema)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+        elif self._writer is not None:
+            self._writer.close()
+        self._opened = False
+        self._file = None
+        self._writer = None
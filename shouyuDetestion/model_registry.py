@@ -0,0 +1,127 @@
+# encoding:utf-8
+"""
+检测模型注册表
+同一进程中按 (模型路径, 推理后端) 共享已加载的模型：首次使用时才加载并预热，Flask 接口、WebSocket 服务与桌面程序
+在同一进程中时只加载一份权重。模型相对路径按 Config.py 所在目录解析，与启动目录无关；记录加载耗时与内存占用
+"""
+import os
+import threading
+import time
+import Config
+from inference_backend import load_detector
+from model_warmup import warmup_model, format_report
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 模型路径的基准目录（Config.py 所在目录）
+BASE_DIR = os.path.dirname(os.path.abspath(Config.__file__))
+
+
+def resolve_path(path):
+    """相对路径按 Config.py 所在目录解析"""
+    if os.path.isabs(path):
+        return path
+    return os.path.normpath(os.path.join(BASE_DIR, path))
+
+
+def _rss_mb():
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / (1 << 20)
+
+
+class SharedModel:
+    """
+    注册表中的模型，调用方式与 YOLO 模型相同
+    YOLO 模型非线程安全，多个服务共用时推理调用串行执行
+    """
+
+    def __init__(self, model, info):
+        self.model = model
+        self.info = info
+        self._lock = threading.RLock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            return self.model(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # names 等其他属性直接读取原模型
+        return getattr(self.model, name)
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_path=None, backend=None, warmup=True):
+        """
+        获取模型，未加载时加载并预热
+        :param model_path: .pt 权重路径，默认 Config.model_path
+        :param backend: 推理后端，默认 Config.inference_backend
+        :param warmup: 加载后是否预热
+        :return: SharedModel
+        """
+        path = resolve_path(model_path or Config.model_path)
+        backend = backend or Config.inference_backend
+        key = (path, backend)
+        # 加载耗时较长，整个加载过程持有锁，避免多个服务同时加载同一模型
+        with self._lock:
+            shared = self._models.get(key)
+            if shared is None:
+                shared = self._load(path, backend, warmup)
+                self._models[key] = shared
+        return shared
+
+    def _load(self, path, backend, warmup):
+        rss_before = _rss_mb()
+        t1 = time.time()
+        model = load_detector(path, backend)
+        load_time = time.time() - t1
+
+        warmup_time = None
+        warmup_report = None
+        if warmup:
+            # 使用实际的输入尺寸与批大小预热，而不是很小的占位图片
+            t1 = time.time()
+            warmup_report = warmup_model(model, Config.warmup_image_sizes, Config.warmup_batch_sizes,
+                                         Config.warmup_runs)
+            warmup_time = time.time() - t1
+            print('[INFO] 模型预热:\n{}'.format(format_report(warmup_report)))
+
+        rss_after = _rss_mb()
+        info = {
+            'path': path,
+            'backend': backend,
+            'load_time': round(load_time, 3),
+            'warmup_time': round(warmup_time, 3) if warmup_time is not None else None,
+            'warmup': warmup_report,
+            'memory_mb': round(rss_after - rss_before, 1) if rss_after is not None else None,
+            'loaded_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        print('[INFO] 模型已加载: {}'.format(info))
+        return SharedModel(model, info)
+
+    def loaded(self):
+        """已加载模型的信息列表"""
+        with self._lock:
+            return [shared.info for shared in self._models.values()]
+
+    def release(self, model_path=None, backend=None):
+        """从注册表移除模型，已持有引用的调用方不受影响"""
+        key = (resolve_path(model_path or Config.model_path), backend or Config.inference_backend)
+        with self._lock:
+            self._models.pop(key, None)
+
+
+# 进程内共享的注册表
+registry = ModelRegistry()
+
+
+def get_model(model_path=None, backend=None, warmup=True):
+    """从进程内共享的注册表获取模型"""
+    return registry.get(model_path, backend, warmup)
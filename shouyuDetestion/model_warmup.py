@@ -0,0 +1,47 @@
+# encoding:utf-8
+"""
+检测模型预热
+按实际使用的输入尺寸与批大小各运行几次模型，让首次真实请求之前完成计算图初始化、内存分配，
+以及 ONNX Runtime / OpenVINO 动态输入尺寸的编译；记录每种组合的首次延迟与稳定延迟
+"""
+import time
+import numpy as np
+
+
+def warmup_model(model, image_sizes, batch_sizes=(1,), runs=3):
+    """
+    :param model: YOLO模型
+    :param image_sizes: 输入图片尺寸 [(宽, 高), ...]
+    :param batch_sizes: 批大小列表
+    :param runs: 每种组合的运行次数，第一次为首次延迟，其余取中位数为稳定延迟
+    :return: 报告 [{'size': [宽, 高], 'batch', 'first_ms', 'steady_ms'}, ...]
+    """
+    runs = max(1, int(runs))
+    # 随机噪声图片会产生一些候选框，让后处理（NMS）也得到预热
+    rng = np.random.default_rng(0)
+    report = []
+    for width, height in image_sizes:
+        img = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        for batch in batch_sizes:
+            images = img if batch == 1 else [img] * batch
+            times = []
+            for _ in range(runs):
+                t1 = time.perf_counter()
+                model(images, verbose=False)
+                times.append((time.perf_counter() - t1) * 1000)
+            report.append({
+                'size': [width, height],
+                'batch': batch,
+                'first_ms': round(times[0], 1),
+                'steady_ms': round(float(np.median(times[1:])), 1) if runs > 1 else None,
+            })
+    return report
+
+
+def format_report(report):
+    """预热报告的文本形式，每种组合一行"""
+    lines = []
+    for item in report:
+        lines.append('{}x{} batch={}: 首次 {} ms, 稳定 {} ms'.format(
+            item['size'][0], item['size'][1], item['batch'], item['first_ms'], item['steady_ms']))
+    return '\n'.join(lines)
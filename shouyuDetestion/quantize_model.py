@@ -0,0 +1,198 @@
+# encoding:utf-8
+"""
+检测模型 INT8 训练后量化
+1. 由 .pt 权重导出 FP32 ONNX 模型
+2. 从训练集抽取图片做静态量化校准（ONNX Runtime quantize_static），生成 INT8 ONNX 模型
+3. 在验证集上分别评估 FP32 与 INT8 模型各类别的 mAP，总体 mAP50-95 下降超过阈值时不发布
+通过检查的模型保存为 <权重名>_int8.onnx，设置 Config.inference_backend = 'onnx_int8' 即可直接加载
+用法: python quantize_model.py --calib-images 200 --max-drop 0.01
+"""
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import time
+import numpy as np
+import onnx
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                      quantize_static)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from ultralytics import YOLO
+from ultralytics.data.augment import LetterBox
+import Config
+import detect_tools as tools
+from folder_detector import list_images
+from inference_backend import backend_artifact_path, load_detector
+
+
+def preprocess(img, imgsz):
+    """与 ultralytics 推理时相同的预处理：letterbox 补边、BGR 转 RGB、HWC 转 CHW、归一化到 [0, 1]"""
+    img = LetterBox((imgsz, imgsz), auto=False)(image=img)
+    img = img[..., ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(img, dtype=np.float32)[None] / 255.0
+
+
+class ImageCalibrationReader(CalibrationDataReader):
+    """逐张读取校准图片，避免全部预处理后占用内存"""
+
+    def __init__(self, image_paths, input_name, imgsz):
+        self.image_paths = image_paths
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._iter = iter(image_paths)
+
+    def get_next(self):
+        for path in self._iter:
+            img = tools.img_cvread(path)
+            if img is not None:
+                return {self.input_name: preprocess(img, self.imgsz)}
+        return None
+
+    def rewind(self):
+        self._iter = iter(self.image_paths)
+
+
+def detect_head_nodes(onnx_model):
+    """
+    检测头（最后一个模块，包括DFL与框解码）的节点名
+    这部分输出的数值范围差别很大，量化后框坐标误差明显，默认保留为FP32
+    """
+    pattern = re.compile(r'^/model\.(\d+)/')
+    indexes = [int(m.group(1)) for m in (pattern.match(node.name) for node in onnx_model.graph.node) if m]
+    if not indexes:
+        return []
+    prefix = '/model.{}/'.format(max(indexes))
+    return [node.name for node in onnx_model.graph.node if node.name.startswith(prefix)]
+
+
+def quantize(fp32_path, int8_path, calib_paths, imgsz, quantize_head=False):
+    onnx_model = onnx.load(fp32_path)
+    input_name = onnx_model.graph.input[0].name
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 量化前做形状推断与图优化（ONNX Runtime 推荐的预处理），节点名以预处理后的模型为准
+        prep_path = os.path.join(tmp_dir, 'prep.onnx')
+        quant_pre_process(fp32_path, prep_path)
+        exclude = [] if quantize_head else detect_head_nodes(onnx.load(prep_path))
+        quantize_static(prep_path, int8_path, ImageCalibrationReader(calib_paths, input_name, imgsz),
+                        quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        calibrate_method=CalibrationMethod.MinMax, nodes_to_exclude=exclude)
+    # ultralytics 从模型元数据读取类别名、步长、输入尺寸，量化后补回
+    int8_model = onnx.load(int8_path)
+    existing = {prop.key for prop in int8_model.metadata_props}
+    for prop in onnx_model.metadata_props:
+        if prop.key not in existing:
+            int8_model.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(int8_model, int8_path)
+    return len(exclude)
+
+
+def evaluate(model_path, imgsz):
+    """在验证集上评估，返回 (总体指标, {类别ID: {'map50', 'map'}})"""
+    model = YOLO(model_path, task='detect')
+    metrics = model.val(data=Config.data_ymal_path, imgsz=imgsz, batch=1, split='val', plots=False, verbose=False)
+    box = metrics.box
+    per_class = {int(c): {'map50': float(box.ap50[i]), 'map': float(box.ap[i])}
+                 for i, c in enumerate(metrics.ap_class_index)}
+    return {'map50': float(box.map50), 'map': float(box.map)}, per_class
+
+
+def print_comparison(fp32_overall, int8_overall, fp32_classes, int8_classes):
+    print('{:<6}{:<14}{:>10}{:>10}{:>10}'.format('id', 'name', 'fp32', 'int8', 'drop'))
+    for cls, name in sorted(Config.names.items()):
+        if cls not in fp32_classes:
+            # 验证集中没有该类别的标注，无法计算 mAP
+            print('{:<6}{:<14}{:>10}{:>10}{:>10}'.format(cls, name, 'n/a', 'n/a', 'n/a'))
+            continue
+        fp32_map = fp32_classes[cls]['map']
+        int8_map = int8_classes.get(cls, {'map': 0.0})['map']
+        print('{:<6}{:<14}{:>10.4f}{:>10.4f}{:>10.4f}'.format(cls, name, fp32_map, int8_map, fp32_map - int8_map))
+    print('{:<20}{:>10.4f}{:>10.4f}{:>10.4f}  (mAP50-95)'.format(
+        'all', fp32_overall['map'], int8_overall['map'], fp32_overall['map'] - int8_overall['map']))
+    print('{:<20}{:>10.4f}{:>10.4f}{:>10.4f}  (mAP50)'.format(
+        'all', fp32_overall['map50'], int8_overall['map50'], fp32_overall['map50'] - int8_overall['map50']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='检测模型INT8量化')
+    parser.add_argument('--model', default=Config.model_path, help='.pt 权重路径')
+    parser.add_argument('--calib-dir', default=os.path.join(os.path.dirname(Config.data_ymal_path), 'train', 'images'),
+                        help='校准图片文件夹')
+    parser.add_argument('--calib-images', type=int, default=Config.quant_calib_images, help='校准图片数')
+    parser.add_argument('--imgsz', type=int, default=640, help='输入尺寸')
+    parser.add_argument('--max-drop', type=float, default=Config.quant_max_map_drop,
+                        help='允许的总体 mAP50-95 下降，超过时不发布')
+    parser.add_argument('--max-class-drop', type=float, default=None, help='允许的单个类别 mAP50-95 下降（默认不检查）')
+    parser.add_argument('--quantize-head', action='store_true', help='检测头也量化（默认保留FP32）')
+    parser.add_argument('--keep-failed', action='store_true', help='未通过检查时保留量化模型以便分析')
+    parser.add_argument('--seed', type=int, default=0, help='抽取校准图片的随机种子')
+    args = parser.parse_args()
+
+    # FP32 ONNX 不存在或早于权重时先导出
+    load_detector(args.model, 'onnx', imgsz=args.imgsz)
+    fp32_path = backend_artifact_path(args.model, 'onnx')
+    int8_path = backend_artifact_path(args.model, 'onnx_int8')
+    candidate_path = os.path.splitext(int8_path)[0] + '_candidate.onnx'
+
+    calib_paths = sorted(list_images(args.calib_dir))
+    random.Random(args.seed).shuffle(calib_paths)
+    calib_paths = calib_paths[:args.calib_images]
+    if not calib_paths:
+        raise SystemExit('没有可用的校准图片: {}'.format(args.calib_dir))
+
+    evaluated = False
+    try:
+        t1 = time.time()
+        excluded = quantize(fp32_path, candidate_path, calib_paths, args.imgsz, args.quantize_head)
+        print('[INFO] 量化完成，校准图片 {} 张，保留FP32节点 {} 个，耗时 {:.1f}s'.format(
+            len(calib_paths), excluded, time.time() - t1))
+
+        fp32_overall, fp32_classes = evaluate(fp32_path, args.imgsz)
+        int8_overall, int8_classes = evaluate(candidate_path, args.imgsz)
+        evaluated = True
+    finally:
+        # 量化或评估出错时删除未完成的候选模型
+        if not evaluated and os.path.exists(candidate_path):
+            os.remove(candidate_path)
+    print_comparison(fp32_overall, int8_overall, fp32_classes, int8_classes)
+
+    drop = fp32_overall['map'] - int8_overall['map']
+    failures = []
+    if drop > args.max_drop:
+        failures.append('总体 mAP50-95 下降 {:.4f} > {}'.format(drop, args.max_drop))
+    if args.max_class_drop is not None:
+        for cls, fp32_metrics in fp32_classes.items():
+            class_drop = fp32_metrics['map'] - int8_classes.get(cls, {'map': 0.0})['map']
+            if class_drop > args.max_class_drop:
+                failures.append('类别 {} mAP50-95 下降 {:.4f} > {}'.format(
+                    Config.names.get(cls, cls), class_drop, args.max_class_drop))
+
+    if failures:
+        for failure in failures:
+            print('[WARN] {}'.format(failure))
+        if not args.keep_failed:
+            os.remove(candidate_path)
+        print('[INFO] 精度下降超过阈值，未发布INT8模型')
+        return 1
+
+    os.replace(candidate_path, int8_path)
+    report = {
+        'source': args.model,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'calib_images': len(calib_paths),
+        'quantize_head': args.quantize_head,
+        'fp32': fp32_overall,
+        'int8': int8_overall,
+        'per_class': {Config.names.get(cls, str(cls)): {'fp32': fp32_classes[cls], 'int8': int8_classes.get(cls)}
+                      for cls in sorted(fp32_classes)},
+    }
+    with open(os.path.splitext(int8_path)[0] + '.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print('[INFO] INT8模型已发布: {}'.format(int8_path))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,47 @@
+# encoding:utf-8
+"""
+检测结果缓存
+以 文件路径 + 修改时间 + 置信度阈值 为键保存检测框，文件夹检测后保存结果图片时直接复用，不再重复推理
+"""
+import os
+import threading
+
+
+class DetectionResultCache:
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(path, conf):
+        """缓存键，文件不存在时返回 None"""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        return os.path.abspath(path), mtime, round(float(conf), 4)
+
+    def put(self, path, conf, boxes):
+        """
+        :param boxes: 检测框数据 [x1, y1, x2, y2, conf, cls]
+        """
+        key = self.make_key(path, conf)
+        if key is None:
+            return
+        with self._lock:
+            self._cache[key] = boxes
+
+    def get(self, path, conf):
+        """获取缓存的检测框，文件已修改或阈值不同时返回 None"""
+        key = self.make_key(path, conf)
+        if key is None:
+            return None
+        with self._lock:
+            return self._cache.get(key)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
@@ -0,0 +1,215 @@
+# encoding:utf-8
+"""
+视频/摄像头实时检测流水线
+采集、推理、绘制分别运行在独立的 QThread 中，线程之间通过有界队列连接，
+GUI 线程只负责显示最新一帧的绘制结果
+"""
+import queue
+import threading
+import time
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+import detect_tools as tools
+
+# 队列结束标记
+_END = object()
+
+
+class _StageThread(QThread):
+    def __init__(self, stream):
+        super(_StageThread, self).__init__()
+        self.stream = stream
+
+    def _put(self, q, item):
+        """向有界队列放入数据，阻塞等待空位，停止时放弃"""
+        while not self.stream.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _put_latest(self, q, item):
+        """向有界队列放入数据，队列满时丢弃最旧的一帧（摄像头只关心最新画面）"""
+        while True:
+            try:
+                q.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    self.stream.frames_dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _get(self, q):
+        """从队列取数据，停止时返回结束标记"""
+        while not self.stream.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+
+class CaptureThread(_StageThread):
+    """采集线程：从 VideoCapture 读取帧"""
+    def run(self):
+        stream = self.stream
+        frame_idx = 0
+        while not stream.stop_event.is_set():
+            t1 = time.time()
+            ret, frame = stream.cap.read()
+            capture_time = time.time() - t1
+            if not ret:
+                break
+            frame_idx += 1
+            item = (frame_idx, frame, {'capture': capture_time})
+            if stream.drop_frames:
+                self._put_latest(stream.capture_q, item)
+            elif not self._put(stream.capture_q, item):
+                break
+        self._put(stream.capture_q, _END)
+
+
+class InferenceThread(_StageThread):
+    """推理线程：对帧运行检测并按当前置信度过滤"""
+    def run(self):
+        stream = self.stream
+        while True:
+            item = self._get(stream.capture_q)
+            if item is _END:
+                break
+            frame_idx, frame, timing = item
+            t1 = time.time()
+            results = stream.model(frame)[0]
+            timing['infer'] = time.time() - t1
+            results = stream.result_filter(results, stream.conf_getter())
+            if not self._put(stream.render_q, (frame_idx, results, timing)):
+                break
+        self._put(stream.render_q, _END)
+
+
+class RenderThread(_StageThread):
+    """绘制线程：绘制检测框，缩放后写入预分配的显示缓冲区"""
+    def run(self):
+        stream = self.stream
+        display = tools.DisplayBuffer(*stream.show_size)
+        while True:
+            item = self._get(stream.render_q)
+            if item is _END:
+                break
+            frame_idx, results, timing = item
+            t1 = time.time()
+            now_img = results.plot()
+            t2 = time.time()
+            qimg, img_width, img_height, token = display.convert(now_img)
+            timing['plot'] = t2 - t1
+            timing['display'] = time.time() - t2
+
+            location_list = [list(map(int, e)) for e in results.boxes.xyxy.tolist()]
+            info = {
+                'frame': frame_idx,
+                'location_list': location_list,
+                'cls_list': [int(i) for i in results.boxes.cls.tolist()],
+                'conf_list': ['%.2f %%' % (each * 100) for each in results.boxes.conf.tolist()],
+                'infer_time': timing['infer'],
+                'timing': timing,
+                'img_width': img_width,
+                'img_height': img_height,
+            }
+            stream.set_latest(qimg, info, lambda token=token: display.release(token))
+        if not stream.stop_event.is_set():
+            # 视频正常播放结束
+            stream.finished.emit()
+
+
+class DetectionStream(QObject):
+    """
+    实时检测流水线
+    frame_ready 信号表示有新的绘制结果，GUI 通过 take_latest() 取最新一帧，转换为 QPixmap 后调用 frame_displayed()
+    归还显示缓冲区；GUI 来不及显示时只保留最新一帧，不会积压
+    """
+    frame_ready = pyqtSignal()
+    finished = pyqtSignal()
+
+    def __init__(self, cap, model, result_filter, conf_getter, show_size, drop_frames=False, queue_size=2):
+        """
+        :param cap: 已打开的 cv2.VideoCapture
+        :param model: YOLO模型，流水线运行期间只在推理线程中使用
+        :param result_filter: 置信度过滤函数 (results, conf) -> results
+        :param conf_getter: 返回当前置信度阈值，界面修改后对后续帧立即生效
+        :param show_size: 显示区域尺寸 (width, height)
+        :param drop_frames: 队列满时是否丢弃旧帧，摄像头为 True，视频文件为 False（逐帧检测）
+        :param queue_size: 各阶段之间队列的容量
+        """
+        super(DetectionStream, self).__init__()
+        self.cap = cap
+        self.model = model
+        self.result_filter = result_filter
+        self.conf_getter = conf_getter
+        self.show_size = show_size
+        self.drop_frames = drop_frames
+
+        self.capture_q = queue.Queue(maxsize=queue_size)
+        self.render_q = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.frames_dropped = 0
+
+        self._lock = threading.Lock()
+        self._latest = None
+        self._pending = False
+        # GUI 已取走、尚未转换完成的帧的缓冲区归还函数
+        self._displaying = None
+        self._threads = [CaptureThread(self), InferenceThread(self), RenderThread(self)]
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        """停止所有线程并等待退出，之后才能在其他地方使用模型"""
+        self.stop_event.set()
+        for t in self._threads:
+            t.wait()
+        with self._lock:
+            self._latest = None
+            self._pending = False
+            self._displaying = None
+
+    def set_latest(self, qimg, info, release=None):
+        """
+        绘制线程写入最新一帧，GUI 尚未取走上一帧时不重复发信号
+        :param release: 该帧不再使用时归还显示缓冲区的函数
+        """
+        with self._lock:
+            if self._latest is not None and self._latest[2] is not None:
+                # 被替换、GUI 未取走的帧直接归还缓冲区
+                self._latest[2]()
+            self._latest = (qimg, info, release)
+            notify = not self._pending
+            self._pending = True
+        if notify:
+            self.frame_ready.emit()
+
+    def take_latest(self):
+        """GUI 线程取走最新一帧，没有新帧时返回 None"""
+        with self._lock:
+            latest = self._latest
+            self._latest = None
+            self._pending = False
+            if latest is None:
+                return None
+            previous = self._displaying
+            qimg, info, self._displaying = latest
+        if previous is not None:
+            # 上一帧未调用 frame_displayed() 时一并归还
+            previous()
+        return qimg, info
+
+    def frame_displayed(self):
+        """GUI 把 take_latest() 取到的图像转换为 QPixmap 后调用，之后绘制线程才会复用该缓冲区"""
+        with self._lock:
+            release, self._displaying = self._displaying, None
+        if release is not None:
+            release()
@@ -1,14 +1,19 @@
 #coding:utf-8
 from ultralytics import YOLO
+import os
 import Config
+from dataset_cache import prepare_dataset, print_report, CachedDetectionTrainer
 # 加载模型
 model = YOLO("yolov8n.pt")  # 加载预训练模型
 # Use the model
 if __name__ == '__main__':
+    # 检查标注并更新预处理图片缓存，未变化的图片不会重新解码
+    report = prepare_dataset(os.path.dirname(Config.data_ymal_path), Config.train_imgsz,
+                             Config.dataset_cache_dir, Config.dataset_prepare_workers)
+    print_report(report)
     # Use the model
-    results = model.train(data=Config.data_ymal_path, epochs=250, batch=8,cache=-1,project=Config.project_path)  # 训练模型
+    # 图片从内存映射的缓存文件读取，不再需要 cache=-1 把整个数据集解码进内存
+    results = model.train(data=Config.data_ymal_path, epochs=250, batch=8, imgsz=Config.train_imgsz, cache=False,
+                          project=Config.project_path, trainer=CachedDetectionTrainer)  # 训练模型
     # 将模型转为onnx格式
     # success = model.export(format='onnx')
-
-
-
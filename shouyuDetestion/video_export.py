@@ -0,0 +1,237 @@
+# encoding:utf-8
+"""
+检测结果视频导出
+读帧 -> 批量推理 -> 绘制写入 三个阶段分别运行在独立线程中，阶段之间通过有界队列连接；
+进度回调按固定间隔节流，输出编码格式可选
+"""
+import os
+import queue
+import threading
+import time
+import cv2
+import Config
+
+# 编码格式及对应的文件后缀
+CODECS = {
+    'XVID': '.avi',
+    'MJPG': '.avi',
+    'mp4v': '.mp4',
+    'avc1': '.mp4',
+    'H264': '.mp4',
+}
+
+# 队列结束标记
+_END = object()
+
+
+def create_video_writer(save_path, codec, fps, size, hw_accel=False):
+    """
+    创建 VideoWriter，hw_accel 为 True 时尝试使用硬件编码（需要 OpenCV 4.5.2 以上及 FFMPEG 后端），
+    不可用时退回软件编码
+    """
+    fourcc = cv2.VideoWriter_fourcc(*codec)
+    if hw_accel and hasattr(cv2, 'VIDEOWRITER_PROP_HW_ACCELERATION'):
+        params = [cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        out = cv2.VideoWriter(save_path, cv2.CAP_FFMPEG, fourcc, fps, size, params)
+        if out.isOpened():
+            return out
+        print('[INFO] 硬件编码不可用，使用软件编码')
+    return cv2.VideoWriter(save_path, fourcc, fps, size)
+
+
+class VideoExporter:
+    def __init__(self, model, video_path, save_path, result_filter, zhixindu=0.5, sampler=None,
+                 codec='XVID', hw_accel=False, batch_size=8, queue_size=32, progress_interval_ms=250):
+        """
+        :param model: YOLO模型
+        :param video_path: 输入视频路径
+        :param save_path: 输出视频路径
+        :param result_filter: 置信度过滤函数 (results, zhixindu) -> results
+        :param zhixindu: 置信度阈值
+        :param sampler: 抽帧器 FrameSampler，为 None 时每帧都检测
+        :param codec: 输出编码格式，见 CODECS
+        :param hw_accel: 是否尝试硬件编码
+        :param batch_size: 单次推理的最大帧数
+        :param queue_size: 各阶段之间队列的容量
+        :param progress_interval_ms: 进度回调的最小间隔
+        """
+        if codec not in CODECS:
+            raise ValueError('不支持的编码格式: {}'.format(codec))
+        self.model = model
+        self.video_path = video_path
+        self.save_path = save_path
+        self.result_filter = result_filter
+        self.zhixindu = zhixindu
+        self.sampler = sampler
+        self.codec = codec
+        self.hw_accel = hw_accel
+        self.batch_size = max(1, int(batch_size))
+        self.progress_interval = progress_interval_ms / 1000.0
+        self._last_result = None
+
+        self.read_q = queue.Queue(maxsize=queue_size)
+        self.write_q = queue.Queue(maxsize=queue_size)
+        self._stop_event = threading.Event()
+        self.error = None
+
+        self.fps = 0
+        self.total = 0
+        self.frames_written = 0
+        self.elapsed = 0
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _put(self, q, item):
+        while not self._stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, e):
+        if self.error is None:
+            self.error = e
+        self.stop()
+
+    def _reader(self, cap):
+        try:
+            while not self._stop_event.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if not self._put(self.read_q, frame):
+                    break
+        except Exception as e:
+            self._fail(e)
+        finally:
+            cap.release()
+            self._put(self.read_q, _END)
+
+    def _writer(self, out):
+        try:
+            while True:
+                item = self._get(self.write_q)
+                if item is _END:
+                    break
+                frame, results, detected = item
+                # 未检测的帧沿用上一次的检测框，画在当前帧上
+                out.write(results.plot() if detected else results.plot(img=frame))
+                self.frames_written += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            out.release()
+
+    def _infer(self, frames):
+        """对一批帧推理，返回 [(检测结果, 是否实际检测)]"""
+        if self.sampler is None:
+            return [(self.result_filter(results, self.zhixindu), True) for results in self.model(frames)]
+
+        flags = [self.sampler.should_detect(frame) for frame in frames]
+        evaluate = Config.video_sample_evaluate
+        to_run = [frame for frame, detect in zip(frames, flags) if detect or evaluate]
+        run_results = iter(self.model(to_run) if to_run else [])
+        outputs = []
+        for detect in flags:
+            if detect:
+                self._last_result = self.result_filter(next(run_results), self.zhixindu)
+            elif evaluate:
+                full_results = self.result_filter(next(run_results), self.zhixindu)
+                self.sampler.record_comparison(self._last_result, full_results)
+            outputs.append((self._last_result, detect))
+        return outputs
+
+    def run(self, progress_callback=None):
+        """
+        执行导出，阻塞直到完成或被停止
+        :param progress_callback: 进度回调 (已写入帧数, 总帧数)，最多每 progress_interval_ms 调用一次
+        :return: 是否完整导出
+        """
+        cap = cv2.VideoCapture(self.video_path)
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        out = create_video_writer(self.save_path, self.codec, self.fps, size, self.hw_accel)
+        print("[INFO] 视频总帧数：{}".format(self.total))
+
+        start_time = time.time()
+        threads = [threading.Thread(target=self._reader, args=(cap,), daemon=True),
+                   threading.Thread(target=self._writer, args=(out,), daemon=True)]
+        for t in threads:
+            t.start()
+
+        last_progress = 0
+        finished = False
+        try:
+            while not finished:
+                item = self._get(self.read_q)
+                if item is _END:
+                    break
+                # 凑一批已读取的帧，不等待未读取的帧
+                frames = [item]
+                while len(frames) < self.batch_size:
+                    try:
+                        item = self.read_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _END:
+                        finished = True
+                        break
+                    frames.append(item)
+
+                for frame, (results, detected) in zip(frames, self._infer(frames)):
+                    if not self._put(self.write_q, (frame, results, detected)):
+                        break
+
+                now = time.time()
+                if progress_callback is not None and now - last_progress >= self.progress_interval:
+                    last_progress = now
+                    # 总帧数为估计值，未结束前不让进度达到100%
+                    progress_callback(self.frames_written, max(self.total, self.frames_written + 1))
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.write_q, _END)
+            for t in threads:
+                t.join()
+        self.elapsed = time.time() - start_time
+
+        if self.sampler is not None:
+            print("[INFO] 抽帧统计：{}".format(self.sampler.report()))
+        if self.error is not None:
+            raise self.error
+        completed = not self._stop_event.is_set()
+        if completed and progress_callback is not None:
+            # 总帧数为估计值，结束时以实际写入帧数为准
+            progress_callback(self.frames_written, self.frames_written)
+        return completed
+
+    def summary(self):
+        """导出速度与原视频帧率的对比"""
+        export_fps = self.frames_written / self.elapsed if self.elapsed > 0 else 0
+        return {
+            'codec': self.codec,
+            'frames': self.frames_written,
+            'elapsed': round(self.elapsed, 3),
+            'source_fps': round(self.fps, 2),
+            'export_fps': round(export_fps, 2),
+            # 大于1表示导出快于实时播放
+            'realtime_factor': round(export_fps / self.fps, 2) if self.fps else 0,
+        }
+
+
+def export_save_path(video_path, codec):
+    """根据输入视频名和编码格式生成输出路径"""
+    name = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(Config.save_path, name + '_detect_result' + CODECS[codec])